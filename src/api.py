@@ -1,15 +1,161 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Query, Response
+from fastapi.responses import JSONResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
-import pandas as pd
-import joblib
-import redis
-import json
+from starlette.background import BackgroundTask
+import numpy as np
+import redis.asyncio as aioredis
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+import asyncio
 import os
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
 from pydantic import BaseModel
 from typing import Optional, List
-from datetime import datetime
+from datetime import datetime, timedelta
 
-app = FastAPI(title="Air Quality Health Alert API")
+try:
+    from src.cache import VersionedCache
+    from src.cache_codec import LATEST_TTL_SECONDS, LATEST_VERSION_KEY, decode_forecast, decode_latest, forecast_key, latest_key
+    from src.feature_builder import LAG_FEATURE_COLS, default_lags, health_risk_score
+    from src.feature_store import AsyncOnlineFeatureStore, history_buffers, lag_features
+    from src.forecasting import FORECAST_HORIZON, Forecaster, ForecastState
+    from src.live_updates import LiveBroker, format_event
+    from src.model_registry import MODEL_DIR, LoadedModel, load_horizon_models, manifest_path, read_manifest
+    from src.prediction_cache import PredictionCache
+    from src.rollups import HISTORY_MAX_POINTS, RESOLUTIONS, ROLLUP_FIELDS, read_history, rollups_exist
+    from src.metrics import API_REGISTRY, MetricsMiddleware, StatsCollector, time_stage
+    from src.settings import connect_database, get_settings
+except ImportError:
+    from cache import VersionedCache
+    from cache_codec import LATEST_TTL_SECONDS, LATEST_VERSION_KEY, decode_forecast, decode_latest, forecast_key, latest_key
+    from feature_builder import LAG_FEATURE_COLS, default_lags, health_risk_score
+    from feature_store import AsyncOnlineFeatureStore, history_buffers, lag_features
+    from forecasting import FORECAST_HORIZON, Forecaster, ForecastState
+    from live_updates import LiveBroker, format_event
+    from model_registry import MODEL_DIR, LoadedModel, load_horizon_models, manifest_path, read_manifest
+    from prediction_cache import PredictionCache
+    from rollups import HISTORY_MAX_POINTS, RESOLUTIONS, ROLLUP_FIELDS, read_history, rollups_exist
+    from metrics import API_REGISTRY, MetricsMiddleware, StatsCollector, time_stage
+    from settings import connect_database, get_settings
+
+# pandas, XGBoost, SQLAlchemy and the Parquet reader are imported only on the
+# code paths that use them, so a worker starts in a fraction of a second
+settings = get_settings()
+
+REDIS_URL = settings.redis_url or "redis://localhost:6379"
+# Requests wait for a free connection rather than failing once the pool is exhausted
+REDIS_MAX_CONNECTIONS = int(os.getenv("REDIS_MAX_CONNECTIONS", 64))
+REDIS_POOL_TIMEOUT = float(os.getenv("REDIS_POOL_TIMEOUT_SECONDS", 5))
+
+# Threads for CPU-bound feature building and inference; each booster call is
+# single-threaded, so one worker per core keeps the cores busy without oversubscribing
+INFERENCE_WORKERS = int(os.getenv("INFERENCE_WORKERS", os.cpu_count() or 1))
+
+# Inference backend: xgboost, onnx (onnxruntime) or treelite (compiled with
+# TL2cgen); falls back to xgboost when the backend's packages are missing
+INFERENCE_BACKEND = os.getenv("INFERENCE_BACKEND", "xgboost")
+
+# How often the model manifest is checked for a new version; 0 disables hot reload
+MODEL_RELOAD_SECONDS = float(os.getenv("MODEL_RELOAD_SECONDS", 10))
+
+# Rollup tables for /api/history live in this database
+DATABASE_URL = settings.database_url
+
+# Created by the lifespan handler
+redis_client = None
+inference_executor = None
+db_engine = None
+
+def create_redis_client():
+    """Async Redis client backed by a bounded, blocking connection pool"""
+    pool = aioredis.BlockingConnectionPool.from_url(
+        REDIS_URL, max_connections=REDIS_MAX_CONNECTIONS, timeout=REDIS_POOL_TIMEOUT
+    )
+    return aioredis.Redis.from_pool(pool)
+
+# In-process cache for /api/current; entries live as long as the Redis records
+# and are dropped as soon as the feature pipeline bumps the version key
+current_cache = VersionedCache(
+    None,
+    LATEST_VERSION_KEY,
+    check_interval=float(os.getenv("CURRENT_CACHE_VERSION_CHECK_SECONDS", 5)),
+    maxsize=int(os.getenv("CURRENT_CACHE_MAXSIZE", 1024)),
+    ttl=float(os.getenv("CURRENT_CACHE_TTL_SECONDS", LATEST_TTL_SECONDS))
+)
+
+async def load_latest(cities: List[str]) -> dict:
+    """Fetch and decode latest records from Redis with one MGET"""
+    with time_stage("redis"):
+        values = await redis_client.mget([latest_key(city) for city in cities])
+    return {city: decode_latest(data, city) for city, data in zip(cities, values)}
+
+# Online feature store for serve-time lag features
+feature_store = AsyncOnlineFeatureStore()
+
+# Cache of /api/predict results keyed on model version, time features, quantized
+# readings and lag features; a max size of 0 disables it. PREDICTION_CACHE_REDIS=1
+# adds a tier in Redis shared by all replicas.
+prediction_cache = PredictionCache(
+    maxsize=int(os.getenv("PREDICTION_CACHE_MAXSIZE", 10_000)),
+    ttl=float(os.getenv("PREDICTION_CACHE_TTL_SECONDS", 3600)),
+    quantum=float(os.getenv("PREDICTION_CACHE_QUANTUM", 0)),
+    redis_ttl=int(os.getenv("PREDICTION_CACHE_TTL_SECONDS", 3600))
+)
+PREDICTION_CACHE_REDIS = os.getenv("PREDICTION_CACHE_REDIS", "0") == "1"
+
+# Fan-out of the feature pipeline's updates to /api/stream clients; with Redis
+# the worker holds one pub/sub subscription whatever the number of clients
+live_broker = LiveBroker(max_subscribers=int(os.getenv("STREAM_MAX_SUBSCRIBERS", 10_000)))
+STREAM_HEARTBEAT_SECONDS = float(os.getenv("STREAM_HEARTBEAT_SECONDS", 15))
+
+# Cache counters are read from the caches' stats() at scrape time
+API_REGISTRY.register(StatsCollector("aqi_current_cache", "/api/current cache statistic", lambda: current_cache.stats()))
+API_REGISTRY.register(StatsCollector("aqi_prediction_cache", "/api/predict cache statistic", lambda: prediction_cache.stats()))
+API_REGISTRY.register(StatsCollector("aqi_stream", "/api/stream statistic", lambda: live_broker.stats()))
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Open the Redis pool and inference executor for the lifetime of the app"""
+    global redis_client, inference_executor, db_engine
+    try:
+        redis_client = create_redis_client()
+    except Exception as e:
+        print(f"Warning: Redis connection failed: {e}")
+        redis_client = None
+    current_cache.redis_client = redis_client
+    feature_store.redis_client = redis_client
+    prediction_cache.redis_client = redis_client if PREDICTION_CACHE_REDIS else None
+
+    if redis_client is None:
+        try:
+            feature_store.local.update(load_local_history())
+        except Exception as e:
+            print(f"Warning: Could not load local feature history: {e}")
+
+    db_engine = connect_database(settings, pool_pre_ping=True)
+
+    inference_executor = ThreadPoolExecutor(max_workers=INFERENCE_WORKERS, thread_name_prefix="inference")
+    # Requests get 503 until the model is in; the worker starts accepting connections right away
+    inference_executor.submit(load_initial_model)
+    watcher = asyncio.create_task(watch_model()) if MODEL_RELOAD_SECONDS > 0 else None
+    listener = asyncio.create_task(live_broker.listen(redis_client)) if redis_client is not None else None
+    try:
+        yield
+    finally:
+        for task in (watcher, listener):
+            if task is not None:
+                task.cancel()
+        inference_executor.shutdown(wait=True)
+        inference_executor = None
+        if db_engine is not None:
+            db_engine.dispose()
+            db_engine = None
+        if redis_client is not None:
+            await redis_client.aclose()
+            redis_client = None
+            prediction_cache.redis_client = None
+
+app = FastAPI(title="Air Quality Health Alert API", lifespan=lifespan)
 
 # Enable CORS for frontend
 app.add_middleware(
@@ -20,21 +166,73 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Initialize Redis
-try:
-    redis_client = redis.from_url(os.getenv("REDIS_URL", "redis://localhost:6379"))
-except Exception as e:
-    print(f"Warning: Redis connection failed: {e}")
-    redis_client = None
-
-# Load Model
-model_path = "models/saved_models/xgboost_aqi_model.pkl"
-model = None
-try:
-    if os.path.exists(model_path):
-        model = joblib.load(model_path)
-except Exception as e:
-    print(f"Warning: Could not load model: {e}")
+# Request latency per route; added last so it also times the CORS middleware
+app.add_middleware(MetricsMiddleware)
+
+# Load Model: the exported UBJSON booster named by the manifest, or a
+# pickled model from before manifests existed
+legacy_model_path = os.path.join(MODEL_DIR, "xgboost_aqi_model.pkl")
+serving = None
+manifest_mtime = None
+
+def set_model(new_model, manifest: Optional[dict] = None, source: Optional[str] = None):
+    """Install a model with its booster predictor and matching feature builder in one swap"""
+    global serving
+    serving = LoadedModel(new_model, manifest=manifest, source=source, backend=INFERENCE_BACKEND)
+    prediction_cache.clear()
+
+def load_model_from_manifest() -> bool:
+    """Load the model the manifest points to if it is not the one being served"""
+    global serving, manifest_mtime
+    mtime = os.stat(manifest_path(MODEL_DIR)).st_mtime_ns
+    if mtime == manifest_mtime:
+        return False
+    manifest = read_manifest(MODEL_DIR)
+    if serving is None or manifest['version'] != serving.version:
+        # Built completely before the swap; in-flight requests keep the old one
+        serving = LoadedModel.from_manifest(manifest, MODEL_DIR, backend=INFERENCE_BACKEND)
+        print(f"✅ Model {serving.version} loaded from {serving.source}")
+    manifest_mtime = mtime
+    return True
+
+async def watch_model():
+    """Poll the manifest and hot-swap new model versions"""
+    loop = asyncio.get_running_loop()
+    while True:
+        await asyncio.sleep(MODEL_RELOAD_SECONDS)
+        try:
+            if os.path.exists(manifest_path(MODEL_DIR)):
+                version = serving.version if serving else None
+                await loop.run_in_executor(inference_executor, load_model_from_manifest)
+                if serving is not None and serving.version != version:
+                    # Old entries can't be hit again (keys carry the version); free the memory
+                    prediction_cache.clear()
+        except Exception as e:
+            # Keep serving the current model
+            print(f"Warning: Could not reload model: {e}")
+
+def load_initial_model():
+    """Load the exported model, or a legacy pickle, unless one is installed already"""
+    if serving is not None:
+        return
+    try:
+        if os.path.exists(manifest_path(MODEL_DIR)):
+            load_model_from_manifest()
+        elif os.path.exists(legacy_model_path):
+            import joblib
+            set_model(joblib.load(legacy_model_path), source=legacy_model_path)
+    except Exception as e:
+        print(f"Warning: Could not load model: {e}")
+
+def load_local_history() -> dict:
+    """Feature store buffers from the processed features, for running without Redis"""
+    try:
+        from src.storage import PROCESSED_DATA_PATH, load_frame
+    except ImportError:
+        from storage import PROCESSED_DATA_PATH, load_frame
+    if not os.path.exists(PROCESSED_DATA_PATH):
+        return {}
+    return history_buffers(load_frame(PROCESSED_DATA_PATH))
 
 class PredictionRequest(BaseModel):
     pm2_5: float
@@ -47,85 +245,311 @@ class PredictionRequest(BaseModel):
     hour: int
     day_of_week: int
 
+class BatchPredictionRequest(BaseModel):
+    records: List[PredictionRequest]
+
+def response_value(value) -> float:
+    """A model output as a JSON number; float32 carries ~7 significant digits, so don't echo binary noise"""
+    return round(float(value), 4)
+
+def risk_level_for(aqi: float) -> str:
+    """Map a predicted AQI to a risk level"""
+    if aqi > 200: return "Critical"
+    if aqi > 150: return "High"
+    if aqi > 100: return "Moderate"
+    return "Low"
+
+async def run_inference(fn, *args):
+    """Run CPU-bound work on the inference executor, or inline outside the app lifespan"""
+    if inference_executor is None:
+        return fn(*args)
+    return await asyncio.get_running_loop().run_in_executor(inference_executor, fn, *args)
+
+def predict_one(predictor, feature_builder, request: PredictionRequest, lags: Optional[dict],
+                month: Optional[int] = None):
+    """Build one feature row and predict; returns (predicted AQI, health risk score)"""
+    with time_stage("feature_build"):
+        x = feature_builder.build(
+            request.pm2_5, request.pm10, request.no2, request.so2, request.o3, request.co,
+            request.hour, request.day_of_week, month, lags=lags
+        )
+    with time_stage("inference"):
+        prediction = predictor.predict_one(x)
+    # From the float64 readings rather than the model's float32 input row
+    return prediction, health_risk_score(request.pm2_5, request.pm10, request.no2, request.o3, request.so2)
+
+def predict_batch(predictor, feature_builder, records: List[PredictionRequest], buffers: dict):
+    """Build the feature matrix for a batch and predict; returns (predictions, health risk scores)"""
+    n = len(records)
+    with time_stage("feature_build"):
+        readings = {col: np.fromiter((getattr(r, col) for r in records), dtype=np.float64, count=n)
+                    for col in ('pm2_5', 'pm10', 'no2', 'so2', 'o3', 'co')}
+        
+        lags = {col: np.empty(n) for col in LAG_FEATURE_COLS}
+        for i, record in enumerate(records):
+            row_lags = lag_features(buffers[record.city], record.pm2_5) or default_lags(record.pm2_5)
+            for col in LAG_FEATURE_COLS:
+                lags[col][i] = row_lags[col]
+        
+        X = feature_builder.build_matrix(
+            **readings,
+            hour=np.fromiter((r.hour for r in records), dtype=np.int64, count=n),
+            day_of_week=np.fromiter((r.day_of_week for r in records), dtype=np.int64, count=n),
+            lags=lags
+        )
+    with time_stage("inference"):
+        predictions = predictor.predict(X)
+    # From the float64 readings rather than the model's float32 input matrix
+    return predictions, health_risk_score(readings['pm2_5'], readings['pm10'], readings['no2'], readings['o3'], readings['so2'])
+
 @app.get("/")
-def read_root():
+async def read_root():
     return {"status": "healthy", "service": "Air Quality Alert System"}
 
+@app.get("/api/current")
+async def get_current_aqi_many(cities: str):
+    """Get latest cached AQI for several comma-separated cities with one MGET"""
+    if not redis_client:
+        raise HTTPException(status_code=503, detail="Redis service unavailable")
+    
+    names = [city.strip() for city in cities.split(",") if city.strip()]
+    records = await current_cache.get_many(names, load_latest) if names else {}
+    
+    return {
+        "cities": {city: record for city, record in records.items() if record},
+        "missing": [city for city, record in records.items() if not record]
+    }
+
 @app.get("/api/current/{city}")
-def get_current_aqi(city: str):
+async def get_current_aqi(city: str):
     """Get latest cached AQI for a city"""
     if not redis_client:
         raise HTTPException(status_code=503, detail="Redis service unavailable")
         
-    data = redis_client.get(f"aqi:latest:{city}")
-    if not data:
+    record = (await current_cache.get_many([city], load_latest))[city]
+    if not record:
         raise HTTPException(status_code=404, detail=f"No data found for {city}")
         
-    return json.loads(data)
+    return record
+
+@app.get("/api/stream")
+async def stream_current_aqi(cities: Optional[str] = None):
+    """Server-Sent Events stream of latest AQI records for comma-separated cities (all when omitted).
+
+    Named cities get their cached record first, then every update the
+    feature pipeline publishes.
+    """
+    if live_broker.full:
+        raise HTTPException(status_code=503, detail="Too many stream subscribers")
+
+    names = [city.strip() for city in cities.split(",") if city.strip()] if cities else None
+    # Subscribe before returning, so concurrent connects can't all pass the check above
+    subscription = live_broker.subscribe(names)
+
+    async def events():
+        try:
+            if names and redis_client:
+                try:
+                    # Updates that arrived while this was loading are newer; keep those
+                    initial = await current_cache.get_many(names, load_latest)
+                    for city, record in initial.items():
+                        if record and city not in subscription.pending:
+                            subscription.push(city, format_event(record))
+                except Exception as e:
+                    print(f"Warning: Could not load initial stream records: {e}")
+            async for frame in subscription.frames(STREAM_HEARTBEAT_SECONDS):
+                yield frame
+        finally:
+            live_broker.unsubscribe(subscription)
+
+    # The background task releases the slot if the client left before the body started
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+                             background=BackgroundTask(live_broker.unsubscribe, subscription))
+
+@app.get("/api/history/{city}")
+async def get_history(city: str, resolution: str = "daily", start: Optional[datetime] = None,
+                      end: Optional[datetime] = None, fields: Optional[str] = None,
+                      points: int = Query(HISTORY_MAX_POINTS, ge=3, le=10_000)):
+    """Min/mean/max/p95 per bucket for a city from the rollup tables, downsampled to `points` with LTTB"""
+    if resolution not in RESOLUTIONS:
+        raise HTTPException(status_code=400, detail=f"resolution must be one of {', '.join(RESOLUTIONS)}")
+    names = [name.strip() for name in fields.split(",") if name.strip()] if fields else list(ROLLUP_FIELDS)
+    unknown = [name for name in names if name not in ROLLUP_FIELDS]
+    if unknown or not names:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+    if db_engine is None:
+        raise HTTPException(status_code=503, detail="Database unavailable")
+
+    with time_stage("history"):
+        try:
+            history = await run_inference(read_history, db_engine, city, resolution, start, end, names, points)
+        except Exception:
+            # The first pipeline run creates the tables; until then there is nothing to read
+            if not await run_inference(rollups_exist, db_engine, resolution):
+                raise HTTPException(status_code=503, detail="History is not available until the feature pipeline has run")
+            raise
+    if history is None:
+        raise HTTPException(status_code=404, detail=f"No history found for {city}")
+    # Already JSON-ready; skips re-encoding thousands of values
+    return JSONResponse(history)
+
+# Forecaster around the served model, rebuilt (with any per-horizon models) when the model changes
+forecaster = None
+
+def forecaster_for(current: LoadedModel) -> Forecaster:
+    global forecaster
+    if forecaster is None or forecaster.model is not current:
+        direct = load_horizon_models(MODEL_DIR, INFERENCE_BACKEND) if current.manifest else {}
+        forecaster = Forecaster(current, FORECAST_HORIZON, direct)
+    return forecaster
+
+def compute_forecast(current: LoadedModel, records: dict, buffers: dict, hours: int):
+    """Forecast cities without a usable precomputed forecast from their latest record and buffered hours"""
+    state = ForecastState.from_buffers(records, buffers)
+    with time_stage("inference"):
+        return state, forecaster_for(current).forecast(state, hours)
+
+@app.get("/api/forecast/{city}")
+async def get_forecast(city: str, hours: int = Query(FORECAST_HORIZON, ge=1, le=FORECAST_HORIZON)):
+    """Hourly AQI forecast for a city, precomputed by the feature pipeline or computed from its latest hours"""
+    current = serving
+    if current is None:
+        raise HTTPException(status_code=503, detail="Model not loaded")
+    if not redis_client:
+        raise HTTPException(status_code=503, detail="Redis service unavailable")
+
+    with time_stage("redis"):
+        record = decode_forecast(await redis_client.get(forecast_key(city)))
+    if record and record['model_version'] == current.version and len(record['values']) >= hours:
+        source = "precomputed"
+        issued_at, values = record['issued_at'], record['values'][:hours]
+    else:
+        # Missing, or made by a model that has since been replaced
+        latest = (await current_cache.get_many([city], load_latest))[city]
+        if not latest:
+            raise HTTPException(status_code=404, detail=f"No data found for {city}")
+        with time_stage("feature_store"):
+            buffers = await feature_store.get_many([city])
+        state, forecasts = await run_inference(compute_forecast, current, {city: latest}, buffers, hours)
+        source = "computed"
+        issued_at, values = state.issued_at[0].astype('datetime64[us]').item(), forecasts[0]
+
+    return {
+        "city": city,
+        "model_version": current.version,
+        "issued_at": issued_at.isoformat(sep=' '),
+        "source": source,
+        "forecast": [
+            {
+                "timestamp": (issued_at + timedelta(hours=h)).isoformat(sep=' '),
+                "hours_ahead": h,
+                "predicted_aqi": response_value(value),
+                "risk_level": risk_level_for(value)
+            }
+            for h, value in enumerate(values.tolist(), start=1)
+        ]
+    }
+
+@app.get("/api/model")
+async def model_info():
+    """Version, load time and feature order of the model being served"""
+    if serving is None:
+        raise HTTPException(status_code=503, detail="Model not loaded")
+    return serving.info()
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus metrics: request and stage latency histograms and cache counters"""
+    return Response(generate_latest(API_REGISTRY), media_type=CONTENT_TYPE_LATEST)
+
+@app.get("/api/cache/stats")
+async def cache_stats():
+    """Hit/miss counters of the in-process /api/current cache"""
+    return current_cache.stats()
+
+@app.get("/api/predict/cache/stats")
+async def prediction_cache_stats():
+    """Hit rate and estimated time saved by the /api/predict result cache"""
+    return prediction_cache.stats()
 
 @app.post("/api/predict")
-def predict_health_risk(request: PredictionRequest):
+async def predict_health_risk(request: PredictionRequest):
     """Predict future AQI and health risk"""
-    if not model:
+    current = serving
+    if current is None:
         raise HTTPException(status_code=503, detail="Model not loaded")
     
-    # Prepare input vector (simplified for demo)
-    # In production, you'd need to reconstruct all lag features or fetch them from a feature store
     try:
-        # Mocking complex features for simplicity
-        input_data = pd.DataFrame([{
-            'pm2_5': request.pm2_5,
-            'pm10': request.pm10,
-            'no2': request.no2,
-            'so2': request.so2,
-            'o3': request.o3,
-            'co': request.co,
-            'hour': request.hour,
-            'day_of_week': request.day_of_week,
-            'month': datetime.now().month,
-            'is_weekend': 1 if request.day_of_week >= 5 else 0,
-            'is_rush_hour': 1 if request.hour in [7, 8, 9, 17, 18, 19] else 0,
-            'pm_ratio': request.pm2_5 / (request.pm10 + 1),
-            'health_risk_score': 0, # Placeholder
-            'pm2_5_lag_1h': request.pm2_5, # Placeholder
-            'pm2_5_lag_24h': request.pm2_5, # Placeholder
-            'pm2_5_rolling_mean_24h': request.pm2_5, # Placeholder
-            'aqi_lag_1h': 50, # Placeholder
-            'aqi_lag_24h': 50 # Placeholder
-        }])
+        with time_stage("feature_store"):
+            buffer = (await feature_store.get_many([request.city]))[request.city]
+        if prediction_cache.enabled:
+            request = prediction_cache.quantize(request)
+        lags = lag_features(buffer, request.pm2_5)
+        # Requests carry no month; resolve it once so the cache key and the features agree
+        month = datetime.now().month
         
-        # Calculate health risk score dynamically
-        input_data['health_risk_score'] = (
-            (request.pm2_5 / 150 * 40) +
-            (request.pm10 / 250 * 30) +
-            (request.no2 / 200 * 15) +
-            (request.o3 / 180 * 10) +
-            (request.so2 / 100 * 5)
-        ).clip(0, 100)
+        # The feature builder's buffer is per thread, so build and predict run together
+        def compute():
+            return run_inference(predict_one, current.predictor, current.feature_builder, request, lags, month)
         
-        prediction = model.predict(input_data)[0]
+        if prediction_cache.enabled:
+            key = prediction_cache.key(current.version, request, lags, month)
+            prediction, health_risk_score = await prediction_cache.get(key, compute)
+        else:
+            prediction, health_risk_score = await compute()
         
-        risk_level = "Low"
-        if prediction > 100: risk_level = "Moderate"
-        if prediction > 150: risk_level = "High"
-        if prediction > 200: risk_level = "Critical" # fixed typo: Citical -> Critical
+        return {
+            "predicted_aqi": response_value(prediction),
+            "risk_level": risk_level_for(prediction),
+            "health_risk_score": response_value(health_risk_score)
+        }
+        
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/api/predict/batch")
+async def predict_health_risk_batch(request: BatchPredictionRequest):
+    """Predict AQI and health risk for many stations with one model call"""
+    current = serving
+    if current is None:
+        raise HTTPException(status_code=503, detail="Model not loaded")
+    
+    records = request.records
+    if not records:
+        return {"predictions": []}
+    
+    try:
+        # One feature store round trip for all cities in the batch
+        with time_stage("feature_store"):
+            buffers = await feature_store.get_many(list({r.city for r in records}))
+        predictions, scores = await run_inference(
+            predict_batch, current.predictor, current.feature_builder, records, buffers
+        )
         
         return {
-            "predicted_aqi": float(prediction),
-            "risk_level": risk_level,
-            "health_risk_score": float(input_data['health_risk_score'].iloc[0])
+            "predictions": [
+                {
+                    "city": record.city,
+                    "predicted_aqi": response_value(prediction),
+                    "risk_level": risk_level_for(prediction),
+                    "health_risk_score": response_value(score)
+                }
+                for record, prediction, score in zip(records, predictions, scores)
+            ]
         }
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/health")
-def health_check():
+async def health_check():
     return {
         "status": "ok",
-        "database": "connected" if os.getenv("DATABASE_URL") else "not_configured",
+        "database": "connected" if db_engine else ("unavailable" if DATABASE_URL else "not_configured"),
         "redis": "connected" if redis_client else "unavailable",
-        "model": "loaded" if model else "not_loaded"
+        "model": "loaded" if serving else "not_loaded",
+        "model_version": serving.version if serving else None
     }
 
 if __name__ == "__main__":
@@ -0,0 +1,1887 @@
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+
+
+def _make_model(feature_cols, n_rows: int = 2000, seed: int = 42):
+    """Fit a small XGBoost model on random data for benchmarking"""
+    import xgboost as xgb
+    import pandas as pd
+
+    rng = np.random.default_rng(seed)
+    X = pd.DataFrame(rng.uniform(0, 200, size=(n_rows, len(feature_cols))), columns=feature_cols)
+    y = rng.uniform(0, 300, size=n_rows)
+
+    model = xgb.XGBRegressor(
+        objective='reg:squarederror', n_estimators=100, learning_rate=0.1, max_depth=6, random_state=42
+    )
+    model.fit(X, y)
+    return model
+
+
+def _load_api():
+    """Import the API with a model installed"""
+    import api
+    from feature_builder import FEATURE_COLS
+
+    # Outside the lifespan there is no Redis client: lag features come from
+    # local buffers and inference runs inline
+    if api.serving is None:
+        api.set_model(_make_model(FEATURE_COLS))
+    return api
+
+
+def _make_requests(api, n: int, seed: int = 42):
+    """Create N synthetic prediction requests"""
+    rng = np.random.default_rng(seed)
+    return [
+        api.PredictionRequest(
+            pm2_5=float(rng.uniform(5, 200)),
+            pm10=float(rng.uniform(10, 300)),
+            no2=float(rng.uniform(0, 60)),
+            so2=float(rng.uniform(0, 30)),
+            o3=float(rng.uniform(0, 120)),
+            co=float(rng.uniform(100, 400)),
+            city=f"Station_{i:04d}",
+            hour=int(rng.integers(0, 24)),
+            day_of_week=int(rng.integers(0, 7))
+        )
+        for i in range(n)
+    ]
+
+
+def _make_raw_data(n_hours: int, n_cities: int = 5, seed: int = 42):
+    """Hourly synthetic raw observations for several cities"""
+    import pandas as pd
+
+    rng = np.random.default_rng(seed)
+    n = n_hours * n_cities
+    timestamps = pd.date_range("2024-01-01", periods=n_hours, freq="h")
+    return pd.DataFrame({
+        'timestamp': np.tile(timestamps, n_cities),
+        'city': np.repeat([f"City_{i:03d}" for i in range(n_cities)], n_hours),
+        'aqi': rng.integers(1, 6, n),
+        'co': rng.uniform(100, 300, n),
+        'no': rng.uniform(0, 1, n),
+        'no2': rng.uniform(0, 50, n),
+        'o3': rng.uniform(0, 100, n),
+        'so2': rng.uniform(0, 20, n),
+        'pm2_5': rng.uniform(5, 200, n),
+        'pm10': rng.uniform(10, 300, n),
+        'nh3': rng.uniform(0, 10, n)
+    })
+
+
+class _MockOpenWeatherHandler(BaseHTTPRequestHandler):
+    """OpenWeatherMap-style air pollution responses after a fixed latency.
+
+    `failures` maps a `lat` query value to how many 503s to answer before succeeding.
+    """
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    latency = 0.02
+    failures = {}
+
+    def do_GET(self):
+        time.sleep(self.latency)
+        lat = parse_qs(urlsplit(self.path).query).get('lat', [''])[0]
+        if self.failures.get(lat, 0) > 0:
+            self.failures[lat] -= 1
+            self._send(503, b'{"message": "service unavailable"}')
+            return
+        body = json.dumps({"list": [{
+            "dt": int(time.time()),
+            "main": {"aqi": 3},
+            "components": {
+                "co": 250.0, "no": 0.5, "no2": 20.0, "o3": 60.0, "so2": 8.0,
+                "pm2_5": 55.0, "pm10": 80.0, "nh3": 4.0
+            }
+        }]}).encode()
+        self._send(200, body)
+
+    def _send(self, status: int, body: bytes):
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class _MockServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128
+
+
+def _serve_mock_openweather(port_conn, latency: float, failures: dict):
+    _MockOpenWeatherHandler.latency = latency
+    _MockOpenWeatherHandler.failures = dict(failures)
+    server = _MockServer(("127.0.0.1", 0), _MockOpenWeatherHandler)
+    port_conn.send(server.server_port)
+    server.serve_forever()
+
+
+def start_mock_openweather_server(latency: float = 0.02, failures: dict = None):
+    """Run a mock OpenWeatherMap server in a separate process.
+
+    Running it out of process keeps its threads from competing with the
+    client for the GIL. `failures` maps a latitude, as the client sends it,
+    to a number of 503s answered first. Returns (process, base_url);
+    terminate the process when done.
+    """
+    parent_conn, child_conn = multiprocessing.Pipe()
+    process = multiprocessing.Process(target=_serve_mock_openweather, args=(child_conn, latency, failures or {}),
+                                      daemon=True)
+    process.start()
+    port = parent_conn.recv()
+    return process, f"http://127.0.0.1:{port}/"
+
+
+def bench_collection(n: int = 500, latency: float = 0.05):
+    """Sequential vs concurrent collection of N synthetic stations from a mock server"""
+    from data_collection import AirQualityDataCollector
+
+    server, base_url = start_mock_openweather_server(latency)
+    stations = {f"Station_{i:04d}": {"lat": 30 + i * 1e-3, "lon": 70 + i * 1e-3} for i in range(n)}
+
+    try:
+        # No politeness pause so only the fetch strategy is compared
+        collector = AirQualityDataCollector(base_url=base_url, request_interval=0)
+        collector.cities = stations
+        start = time.perf_counter()
+        sequential = collector.collect_all_cities()
+        sequential_time = time.perf_counter() - start
+
+        collector = AirQualityDataCollector(base_url=base_url, rate_limit=1000, max_concurrency=20)
+        collector.cities = stations
+        start = time.perf_counter()
+        concurrent = collector.collect_all_cities_concurrent()
+        concurrent_time = time.perf_counter() - start
+    finally:
+        server.terminate()
+
+    print(f"Sequential: {len(sequential)} stations in {sequential_time:.2f}s")
+    print(f"Concurrent: {len(concurrent)} stations in {concurrent_time:.2f}s")
+    print(f"Speedup: {sequential_time / concurrent_time:.1f}x")
+
+    return {"n": n, "sequential_seconds": sequential_time, "concurrent_seconds": concurrent_time}
+
+
+def bench_batch_predict(n: int = 1000):
+    """Compare N single /api/predict calls with one /api/predict/batch call"""
+    api = _load_api()
+    records = _make_requests(api, n)
+
+    async def run():
+        start = time.perf_counter()
+        for record in records:
+            await api.predict_health_risk(record)
+        single_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        await api.predict_health_risk_batch(api.BatchPredictionRequest(records=records))
+        return single_time, time.perf_counter() - start
+
+    single_time, batch_time = asyncio.run(run())
+
+    print(f"Single calls: {n} requests in {single_time:.3f}s ({single_time / n * 1000:.3f} ms/request)")
+    print(f"Batch call:   {n} requests in {batch_time:.3f}s ({batch_time / n * 1000:.3f} ms/request)")
+    print(f"Speedup: {single_time / batch_time:.1f}x")
+
+    return {"n": n, "single_seconds": single_time, "batch_seconds": batch_time}
+
+
+def bench_single_predict(n: int = 1000):
+    """Latency percentiles of the single-row /api/predict path"""
+    api = _load_api()
+    records = _make_requests(api, n)
+
+    async def run():
+        # Warm up the booster and the per-thread feature buffer
+        for record in records[:10]:
+            await api.predict_health_risk(record)
+
+        latencies = np.empty(n)
+        for i, record in enumerate(records):
+            start = time.perf_counter()
+            await api.predict_health_risk(record)
+            latencies[i] = time.perf_counter() - start
+        return latencies
+
+    latencies = asyncio.run(run())
+
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) * 1000
+    print(f"Single predict: n={n} p50={p50:.3f} ms p95={p95:.3f} ms p99={p99:.3f} ms")
+
+    return {"n": n, "p50_ms": p50, "p95_ms": p95, "p99_ms": p99}
+
+
+def bench_backends(n: int = 2000, batch_sizes=(100, 1000, 10000)):
+    """Build time and latency of the xgboost, onnx and treelite inference backends.
+
+    Backends whose packages are not installed are skipped; parity with
+    XGBoost is checked in tests/test_inference.py.
+    """
+    import tempfile
+    from feature_builder import FEATURE_COLS
+    from inference import make_predictor
+
+    model = _make_model(FEATURE_COLS, n_rows=5000)
+    rng = np.random.default_rng(0)
+    X = rng.uniform(0, 200, size=(max(batch_sizes), len(FEATURE_COLS))).astype(np.float32)
+    X[::7, FEATURE_COLS.index('aqi_lag_24h')] = np.nan
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for backend in ('xgboost', 'onnx', 'treelite'):
+            start = time.perf_counter()
+            predictor = make_predictor(model, backend, cache_prefix=os.path.join(tmp, "model"))
+            build_ms = (time.perf_counter() - start) * 1000
+            if predictor.backend != backend:
+                print(f"{backend:9s} skipped (not installed)")
+                continue
+
+            rows = [X[i:i + 1] for i in range(n)]
+            for x in rows[:50]:
+                predictor.predict_one(x)
+            latencies = np.empty(n)
+            for i, x in enumerate(rows):
+                start = time.perf_counter()
+                predictor.predict_one(x)
+                latencies[i] = time.perf_counter() - start
+            p50, p99 = np.percentile(latencies, [50, 99]) * 1e6
+
+            batch = {}
+            for size in batch_sizes:
+                best = min(_timed(predictor.predict, X[:size]) for _ in range(5))
+                batch[size] = best / size * 1e6
+            print(f"{backend:9s} build {build_ms:7.0f} ms  single p50 {p50:6.1f} us  p99 {p99:6.1f} us  "
+                  + "  ".join(f"batch {size}: {us:5.2f} us/row" for size, us in batch.items()))
+            results[backend] = {"build_ms": build_ms, "single_p50_us": p50, "single_p99_us": p99,
+                                "batch_us_per_row": batch}
+
+    return results
+
+
+def _timed(fn, *args) -> float:
+    start = time.perf_counter()
+    fn(*args)
+    return time.perf_counter() - start
+
+
+def bench_prediction_cache(n: int = 5000, n_cities: int = 50, distinct: int = 5, quantum: float = 1.0):
+    """Single /api/predict latency without the result cache, with the local LRU and with the Redis tier.
+
+    Requests repeat `distinct` readings per city. Cached answers must equal
+    uncached ones; with a quantum they must equal an uncached prediction
+    for the snapped readings.
+    """
+    import fakeredis
+    from prediction_cache import PredictionCache
+
+    api = _load_api()
+    rng = np.random.default_rng(7)
+    pool = [
+        record.model_copy(update={"city": f"City_{i % n_cities:03d}"})
+        for i, record in enumerate(_make_requests(api, n_cities * distinct))
+    ]
+    records = [pool[i] for i in rng.integers(len(pool), size=n)]
+    # Nearly identical readings: the same pool with sub-quantum noise
+    noisy = [r.model_copy(update={"pm2_5": r.pm2_5 + rng.uniform(-0.2, 0.2) * quantum}) for r in records]
+
+    async def run(requests):
+        responses, latencies = [], np.empty(len(requests))
+        for i, record in enumerate(requests):
+            start = time.perf_counter()
+            responses.append(await api.predict_health_risk(record))
+            latencies[i] = time.perf_counter() - start
+        return responses, latencies
+
+    def report(label, latencies, cache):
+        p50, p99 = np.percentile(latencies, [50, 99]) * 1e6
+        hit_rate = cache.stats()['hit_rate'] if cache.enabled else 0.0
+        print(f"{label:22s} mean {latencies.mean() * 1e6:7.1f} us  p50 {p50:7.1f} us  p99 {p99:7.1f} us  "
+              f"hit rate {hit_rate:5.1%}")
+        return {"mean_us": latencies.mean() * 1e6, "p50_us": p50, "p99_us": p99, "hit_rate": hit_rate}
+
+    results = {}
+    api.prediction_cache = PredictionCache(maxsize=0)
+    asyncio.run(run(records[:50]))  # warm up
+    reference, latencies = asyncio.run(run(records))
+    results["disabled"] = report("no cache", latencies, api.prediction_cache)
+
+    api.prediction_cache = PredictionCache(maxsize=10_000)
+    cached, latencies = asyncio.run(run(records))
+    assert cached == reference, "cached predictions differ from uncached ones"
+    results["local"] = report("local LRU", latencies, api.prediction_cache)
+
+    # A second replica with a cold local tier reads what the first one shared
+    redis_client = fakeredis.FakeAsyncRedis()
+    api.prediction_cache = PredictionCache(maxsize=10_000, redis_client=redis_client)
+    asyncio.run(run(pool))
+    api.prediction_cache = PredictionCache(maxsize=10_000, redis_client=redis_client)
+    shared, latencies = asyncio.run(run(records))
+    assert shared == reference, "shared-tier predictions differ from uncached ones"
+    results["redis_cold_local"] = report("redis tier, cold LRU", latencies, api.prediction_cache)
+    shared, latencies = asyncio.run(run(records))
+    results["redis_warm_local"] = report("redis tier, warm LRU", latencies, api.prediction_cache)
+
+    api.prediction_cache = PredictionCache(maxsize=10_000, quantum=quantum)
+    quantized, latencies = asyncio.run(run(noisy))
+    results["quantized"] = report(f"quantum {quantum:g} (noisy)", latencies, api.prediction_cache)
+    api.prediction_cache, cache = PredictionCache(maxsize=0), api.prediction_cache
+    snapped, _ = asyncio.run(run([cache.quantize(r) for r in noisy]))
+    assert quantized == snapped, "quantized cache differs from predictions on snapped readings"
+
+    print(f"✅ Cached predictions match; local LRU stats: {cache.stats()}")
+    return results
+
+
+def bench_metrics(n: int = 2000):
+    """Latency cost of the metrics middleware and stage timers.
+
+    The /metrics output and job exports are checked in tests/test_api.py
+    and tests/test_monitoring.py.
+    """
+    import httpx
+    from prometheus_client.parser import text_string_to_metric_families
+    from prediction_cache import PredictionCache
+
+    api = _load_api()
+    # Every request does the full work, so runs with and without the middleware compare
+    api.prediction_cache = PredictionCache(maxsize=0)
+    records = [record.model_dump() for record in _make_requests(api, n)]
+
+    async def run(app, paths):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://metrics") as client:
+            for method, path, body in paths[:50]:
+                await client.request(method, path, json=body)
+            latencies = np.empty(len(paths))
+            for i, (method, path, body) in enumerate(paths):
+                start = time.perf_counter()
+                response = await client.request(method, path, json=body)
+                latencies[i] = time.perf_counter() - start
+                assert response.status_code in (200, 404), response.text
+            return (await client.get("/metrics")).text, latencies
+
+    requests = [("POST", "/api/predict", record) for record in records]
+    requests += [("GET", "/api/model", None), ("GET", "/api/missing/route", None)] * (n // 10)
+
+    # Baseline: the same predictions without the middleware
+    with_metrics = api.app.user_middleware
+    api.app.user_middleware = [m for m in with_metrics if m.cls is not api.MetricsMiddleware]
+    api.app.middleware_stack = api.app.build_middleware_stack()
+    _, bare_latencies = asyncio.run(run(api.app, requests[:n]))
+    api.app.user_middleware = with_metrics
+    api.app.middleware_stack = api.app.build_middleware_stack()
+
+    text, latencies = asyncio.run(run(api.app, requests))
+
+    families = {family.name: family for family in text_string_to_metric_families(text)}
+    counts = {
+        (s.labels['route'], s.labels['status']): s.value
+        for s in families['aqi_api_request_seconds'].samples if s.name.endswith('_count')
+    }
+    stages = {s.labels['stage'] for s in families['aqi_api_stage_seconds'].samples}
+    print(f"/metrics: {len(families)} families, routes {sorted(counts)}, stages {sorted(stages)}")
+
+    overhead = (np.median(latencies[:n]) - np.median(bare_latencies)) * 1e6
+    print(f"/api/predict p50 {np.median(latencies[:n]) * 1e6:.0f} us with metrics, "
+          f"{np.median(bare_latencies) * 1e6:.0f} us without ({overhead:+.0f} us)")
+
+    # The end-to-end difference is within run-to-run noise; time the pieces directly
+    from metrics import REQUEST_LATENCY, time_stage
+    reps = 100_000
+    start = time.perf_counter()
+    for _ in range(reps):
+        with time_stage("bench"):
+            pass
+    stage_us = (time.perf_counter() - start) / reps * 1e6
+    start = time.perf_counter()
+    for _ in range(reps):
+        REQUEST_LATENCY.labels("GET", "/bench", "200").observe(0.001)
+    request_us = (time.perf_counter() - start) / reps * 1e6
+    print(f"Stage timer {stage_us:.2f} us, route histogram {request_us:.2f} us per observation")
+
+    return {"n": n, "families": len(families), "middleware_overhead_us": overhead,
+            "stage_timer_us": stage_us, "request_histogram_us": request_us}
+
+
+def bench_drift(n: int = 1_000_000, batch: int = 100, batches: int = 24):
+    """Reference profile build, then per-batch drift scoring vs re-reading and sampling the reference.
+
+    Checks that reference batches raise no alarm and that a shifted pm2_5
+    is flagged.
+    """
+    import tempfile
+    from drift import DRIFT_FEATURES, DriftMonitor, ReferenceProfile
+    from storage import iter_chunks, load_frame
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "features")
+        _features_dataset(path, n)
+
+        start = time.perf_counter()
+        profile = ReferenceProfile.build(lambda: iter_chunks(path, columns=DRIFT_FEATURES))
+        build_s = time.perf_counter() - start
+        profile_path = os.path.join(tmp, "profile.json")
+        profile.save(profile_path)
+        start = time.perf_counter()
+        profile = ReferenceProfile.load(profile_path)
+        load_ms = (time.perf_counter() - start) * 1000
+        print(f"Profile of {profile.rows} rows built in {build_s:.2f}s, "
+              f"{os.path.getsize(profile_path) / 1024:.0f} KB, loads in {load_ms:.1f} ms")
+
+        # What each check used to do before rendering the report
+        start = time.perf_counter()
+        reference = load_frame(path, columns=DRIFT_FEATURES)
+        reference.sample(n=1000)
+        print(f"Re-reading and sampling the reference: {time.perf_counter() - start:.2f}s")
+
+    rng = np.random.default_rng(0)
+    current = reference.iloc[rng.permutation(len(reference))[:batch * batches]].reset_index(drop=True)
+    shifted = current.assign(pm2_5=current['pm2_5'] * 1.5 + 10)
+    del reference
+
+    for name, data, expect in (("reference", current, False), ("shifted pm2_5", shifted, True)):
+        monitor = DriftMonitor(profile)
+        update_ms, score_ms = [], []
+        for i in range(batches):
+            start = time.perf_counter()
+            monitor.update(data.iloc[i * batch:(i + 1) * batch])
+            update_ms.append((time.perf_counter() - start) * 1000)
+            start = time.perf_counter()
+            scores = monitor.scores()
+            score_ms.append((time.perf_counter() - start) * 1000)
+        drifted = monitor.drifted(scores)
+        print(f"{name}: update {np.median(update_ms):.2f} ms, score {np.median(score_ms):.2f} ms per batch; "
+              f"pm2_5 PSI {scores['pm2_5']['psi']:.3f}, KS {scores['pm2_5']['ks']:.3f}; drifted {drifted}")
+        assert bool(drifted) == expect, drifted
+        if expect:
+            assert 'pm2_5' in drifted
+
+    return {"n": profile.rows, "build_seconds": build_s, "score_ms": float(np.median(score_ms))}
+
+
+def _stream_scope(cities: str) -> dict:
+    return {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+        "scheme": "http", "path": "/api/stream", "raw_path": b"/api/stream", "root_path": "",
+        "query_string": f"cities={cities}".encode(), "headers": [],
+        "server": ("bench", 80), "client": ("bench", 1)
+    }
+
+
+def bench_stream(n: int = 10_000, n_cities: int = 50, rounds: int = 20, slow_share: float = 0.1):
+    """Concurrent /api/stream subscribers one worker holds, fan-out latency, and slow-client backpressure.
+
+    Subscribers are driven through the ASGI app in-process (no sockets),
+    so the numbers are the worker's own cost per connection and update.
+    A share of clients take 0.5 s per frame. They must get only the newest
+    record per city and must not delay the others. Finally an update goes
+    end to end: FeatureEngineer.save_to_redis publishes on fakeredis and the
+    broker's listener relays it to a subscriber.
+    """
+    import resource
+    import pandas as pd
+    import fakeredis
+
+    api = _load_api()
+    api.live_broker.max_subscribers = n
+    broker = api.live_broker
+    cities = [f"City_{i:03d}" for i in range(n_cities)]
+
+    async def run():
+        received = np.zeros(n, dtype=np.int64)
+        last_frame = [b""] * n
+        done = asyncio.Event()
+        waiting = [0]
+        disconnect = asyncio.Event()
+        slow = set(range(0, n, int(1 / slow_share))) if slow_share else set()
+
+        def client(i):
+            async def receive():
+                await disconnect.wait()
+                return {"type": "http.disconnect"}
+
+            async def send(message):
+                if message["type"] != "http.response.body" or not message.get("body"):
+                    return
+                if i in slow:
+                    await asyncio.sleep(0.5)
+                received[i] += 1
+                last_frame[i] = message["body"]
+                if i not in slow:
+                    waiting[0] -= 1
+                    if waiting[0] == 0:
+                        done.set()
+
+            return api.app(_stream_scope(cities[i % n_cities]), receive, send)
+
+        before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        start = time.perf_counter()
+        tasks = [asyncio.create_task(client(i)) for i in range(n)]
+        while broker.subscribers < n:
+            await asyncio.sleep(0.01)
+        connect_s = time.perf_counter() - start
+        rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - before
+        print(f"{n} subscribers connected in {connect_s:.2f}s, ~{rss_kb / n:.1f} KB each "
+              f"(peak RSS +{rss_kb / 1024:.0f} MB)")
+
+        fanout, publish = [], []
+        for r in range(rounds):
+            done.clear()
+            waiting[0] = n - len(slow)
+            start = time.perf_counter()
+            for city in cities:
+                broker.publish({"city": city, "timestamp": f"round {r}", "aqi": r})
+            publish.append(time.perf_counter() - start)
+            await done.wait()
+            fanout.append(time.perf_counter() - start)
+
+        # Slow clients drain what is left: the frame being written, then the newest one
+        await asyncio.sleep(1.2)
+        fast = [i for i in range(n) if i not in slow]
+        assert (received[fast] == rounds).all(), np.unique(received[fast])
+        if slow:
+            slow_idx = sorted(slow)
+            assert (received[slow_idx] < rounds).all()
+            assert all(f'"aqi": {rounds - 1}'.encode() in last_frame[i] for i in slow_idx)
+        print(f"Fan-out of {n_cities} city updates to {n} subscribers: publish "
+              f"{np.median(publish) * 1000:.1f} ms, all fast clients served p50 {np.median(fanout) * 1000:.0f} ms, "
+              f"max {max(fanout) * 1000:.0f} ms")
+        if slow:
+            print(f"{len(slow)} slow clients: {received[sorted(slow)].mean():.1f} of {rounds} frames on average, "
+                  f"always the newest; {broker.stats()['replaced']} stale frames replaced")
+
+        disconnect.set()
+        await asyncio.gather(*tasks)
+        assert broker.subscribers == 0, broker.subscribers
+        return connect_s, float(np.median(fanout))
+
+    connect_s, fanout_s = asyncio.run(run())
+
+    async def end_to_end():
+        from feature_engineering import FeatureEngineer
+        server = fakeredis.FakeServer()
+        listener = asyncio.create_task(broker.listen(fakeredis.FakeAsyncRedis(server=server)))
+        await asyncio.sleep(0.05)
+        subscription = broker.subscribe(["Lahore"])
+        engineer = FeatureEngineer.__new__(FeatureEngineer)
+        engineer.redis_client = fakeredis.FakeRedis(server=server)
+        features = pd.DataFrame({"city": ["Lahore", "Karachi"], "timestamp": pd.Timestamp("2024-06-01 12:00"),
+                                 "aqi": [4, 3], "pm2_5": [88.0, 40.0]})
+        engineer.save_to_redis(features)
+        frame = await asyncio.wait_for(anext(subscription.frames(heartbeat=5)), 5)
+        listener.cancel()
+        broker.unsubscribe(subscription)
+        assert b'"city": "Lahore"' in frame and b'"pm2_5": 88.0' in frame, frame
+        print(f"End to end via pub/sub: {frame.decode().splitlines()[1][:80]}...")
+
+    asyncio.run(end_to_end())
+    return {"n": n, "connect_seconds": connect_s, "fanout_p50_seconds": fanout_s}
+
+
+def _naive_forecast(model, df, horizon: int):
+    """Per-city, per-step single-row recursive forecast from a features frame, for comparison"""
+    import pandas as pd
+
+    builder, predictor = model.feature_builder, model.predictor
+    out = {}
+    for city, group in df.sort_values('timestamp').groupby('city'):
+        last = group.iloc[-1]
+        t0 = last['timestamp']
+        by_hour = {ts.floor('h'): row for ts, row in zip(group['timestamp'], group[['pm2_5', 'aqi']].to_numpy())}
+        hours = [t0.floor('h') - pd.Timedelta(hours=24 - j) for j in range(25)]
+        pm2_5 = [by_hour[h][0] if h in by_hour else np.nan for h in hours] + [last['pm2_5']] * horizon
+        aqi = [by_hour[h][1] if h in by_hour else np.nan for h in hours]
+        for k in range(horizon):
+            t = t0 + pd.Timedelta(hours=k)
+            window = np.array(pm2_5[k + 1:k + 25])
+            lags = {
+                'pm2_5_lag_1h': pm2_5[23 + k], 'pm2_5_lag_24h': pm2_5[k],
+                'pm2_5_rolling_mean_24h': np.nanmean(window) if (~np.isnan(window)).any() else np.nan,
+                'aqi_lag_1h': aqi[23 + k], 'aqi_lag_24h': aqi[k]
+            }
+            x = builder.build(last['pm2_5'], last['pm10'], last['no2'], last['so2'], last['o3'], last['co'],
+                              t.hour, t.dayofweek, t.month, lags=lags)
+            aqi.append(predictor.predict_one(x))
+        out[city] = np.array(aqi[25:], dtype=np.float32)
+    return out
+
+
+def bench_forecast(n: int = 1000, horizon: int = 48, reps: int = 5):
+    """Multi-horizon forecasts for N cities: batched recursive engine vs per-city, per-step predictions.
+
+    Then the pipeline's precompute into (fake) Redis and /api/forecast for
+    precomputed and on-demand forecasts. Forecast parity is checked in
+    tests/test_forecasting.py.
+    """
+    import fakeredis
+    import httpx
+    import feature_engineering
+    from feature_engineering import FeatureEngineer
+    from feature_store import OnlineFeatureStore
+    from forecasting import Forecaster, ForecastState
+    from cache_codec import forecast_key
+
+    api = _load_api()
+    model = api.serving
+    engineer = FeatureEngineer()
+    raw = _make_raw_data(72, n)
+    # Missed collection runs leave NaN hours in the lags
+    raw = raw[np.random.default_rng(0).random(len(raw)) > 0.05]
+    df = engineer.process_features(raw)
+    print(f"{n} cities, {len(df)} feature rows, {horizon}h horizon")
+
+    forecaster = Forecaster(model, horizon)
+    start = time.perf_counter()
+    state = ForecastState.from_features(df)
+    state_s = time.perf_counter() - start
+    times = []
+    for _ in range(reps):
+        start = time.perf_counter()
+        forecaster.forecast(state)
+        times.append(time.perf_counter() - start)
+    batched_s = float(np.median(times))
+
+    sample = state.cities[:min(n, 200)]
+    start = time.perf_counter()
+    _naive_forecast(model, df[df['city'].isin(sample)], horizon)
+    naive_s = (time.perf_counter() - start) * n / len(sample)
+    print(f"State from features: {state_s * 1000:.0f} ms")
+    print(f"Batched recursive: {batched_s * 1000:.1f} ms ({horizon} predictions of {n} rows)")
+    print(f"Per-city loop:     {naive_s * 1000:.0f} ms (extrapolated from {len(sample)} cities)")
+    print(f"Speedup: {naive_s / batched_s:.0f}x")
+
+    # Pipeline precompute: forecast every city and write them in one pipelined round trip
+    server = fakeredis.FakeServer()
+    engineer.redis_client = fakeredis.FakeRedis(server=server)
+    counter = _RoundTripCounter(engineer.redis_client)
+    feature_engineering.load_forecaster = lambda: forecaster
+    start = time.perf_counter()
+    engineer.save_forecasts(df)
+    precompute_s = time.perf_counter() - start
+    round_trips = counter.count
+    print(f"Precompute stage: {precompute_s * 1000:.0f} ms for {n} cities, {round_trips} Redis round trip")
+
+    engineer.save_to_redis(df)
+    OnlineFeatureStore(engineer.redis_client).write_history(df)
+    api.redis_client = fakeredis.FakeAsyncRedis(server=server)
+    api.current_cache.redis_client = api.redis_client
+    api.feature_store.redis_client = api.redis_client
+
+    async def run():
+        transport = httpx.ASGITransport(app=api.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://forecast") as client:
+            results = {}
+            for source, city in (("precomputed", state.cities[0]), ("computed", state.cities[1])):
+                if source == "computed":
+                    await api.redis_client.delete(forecast_key(city))
+                latencies = []
+                for _ in range(50):
+                    begin = time.perf_counter()
+                    response = await client.get(f"/api/forecast/{city}?hours=24")
+                    latencies.append(time.perf_counter() - begin)
+                body = response.json()
+                assert response.status_code == 200 and body['source'] == source, response.text
+                assert len(body['forecast']) == 24
+                results[source] = (float(np.median(latencies)), body)
+            assert (await client.get("/api/forecast/Nowhere")).status_code == 404
+            assert (await client.get(f"/api/forecast/{state.cities[0]}?hours={horizon + 1}")).status_code == 422
+            return results
+
+    try:
+        results = asyncio.run(run())
+    finally:
+        api.redis_client = api.current_cache.redis_client = api.feature_store.redis_client = None
+    for source, (latency, _) in results.items():
+        print(f"/api/forecast {source:>11}: {latency * 1000:.2f} ms p50")
+
+    return {"n": n, "horizon": horizon, "batched_ms": batched_s * 1000, "naive_ms": naive_s * 1000,
+            "precompute_ms": precompute_s * 1000,
+            **{f"api_{source}_ms": latency * 1000 for source, (latency, _) in results.items()}}
+
+
+def bench_history(n: int = 24 * 365 * 20, reps: int = 50):
+    """/api/history over a year from rollup tables vs aggregating feature rows.
+
+    Rollups go to DATABASE_URL or a SQLite file.
+    """
+    import tempfile
+    import httpx
+    import pandas as pd
+    from sqlalchemy import create_engine
+    from rollups import RESOLUTIONS, ROLLUP_FIELDS, compute_rollups, write_rollups
+    from storage import load_frame
+
+    api = _load_api()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "features")
+        _features_dataset(path, n)
+        df = load_frame(path, columns=['city', 'timestamp', *ROLLUP_FIELDS])
+        city = df['city'].iloc[0]
+        print(f"{len(df)} feature rows, {df['city'].nunique()} cities")
+
+        start = time.perf_counter()
+        for resolution in RESOLUTIONS:
+            compute_rollups(df, resolution)
+        print(f"Rollups of all rows computed in {time.perf_counter() - start:.2f}s")
+
+        engine = create_engine(os.getenv("DATABASE_URL") or f"sqlite:///{tmp}/history.db")
+        start = time.perf_counter()
+        counts = write_rollups(engine, df)
+        print(f"Rollups written in {time.perf_counter() - start:.1f}s: {counts} ({engine.dialect.name})")
+        api.db_engine = engine
+
+        year_start = df['timestamp'].max() - pd.Timedelta(days=365)
+
+        async def run():
+            transport = httpx.ASGITransport(app=api.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://history") as client:
+                results = {}
+                for resolution in RESOLUTIONS:
+                    url = f"/api/history/{city}?resolution={resolution}&start={year_start.isoformat()}"
+                    await client.get(url)
+                    latencies = []
+                    for _ in range(reps):
+                        begin = time.perf_counter()
+                        response = await client.get(url)
+                        latencies.append(time.perf_counter() - begin)
+                    body = response.json()
+                    assert response.status_code == 200, response.text
+                    assert len(body['timestamp']) <= 1000 and body['timestamp'][0] >= year_start.floor('D').isoformat()
+                    results[resolution] = (float(np.median(latencies)), body)
+                assert (await client.get(f"/api/history/{city}?resolution=monthly")).status_code == 400
+                assert (await client.get("/api/history/Nowhere")).status_code == 404
+                return results
+
+        results = asyncio.run(run())
+        for resolution, (latency, body) in results.items():
+            print(f"{resolution:>7}: {body['rows']} buckets -> {len(body['timestamp'])} points "
+                  f"(downsampled: {body['downsampled']}) in {latency * 1000:.1f} ms")
+
+        # What a chart needed before: the city's feature rows, aggregated per request
+        begin = time.perf_counter()
+        rows = load_frame(path, columns=['city', 'timestamp', *ROLLUP_FIELDS], cities=[city], start=year_start)
+        compute_rollups(rows, 'daily')
+        print(f"Daily history from feature rows (Parquet, one city): {(time.perf_counter() - begin) * 1000:.0f} ms")
+        api.db_engine = None
+        engine.dispose()
+
+    return {"n": len(df), **{f"{resolution}_ms": latency * 1000 for resolution, (latency, _) in results.items()}}
+
+
+# Entry points whose cold import time is reported; their budgets are checked in tests/test_import_time.py
+IMPORT_ENTRY_POINTS = ("api", "data_collection", "feature_engineering", "model_training", "monitoring")
+
+
+def _import_time(module: str):
+    """Cumulative `python -X importtime` time of a module in a fresh interpreter and its slowest direct imports"""
+    import subprocess
+    import sys
+
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"], capture_output=True,
+                            text=True, cwd=os.path.dirname(os.path.abspath(__file__)), check=True)
+    total, children = None, []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        if name.strip() == module and not name.startswith("  ", 1):
+            total = int(cumulative) / 1000
+        elif name.startswith("   ") and not name.startswith("     "):
+            children.append((int(cumulative) / 1000, name.strip()))
+    return total, sorted(children, reverse=True)[:3]
+
+
+def bench_import_time(n: int = 3):
+    """Cold import time of the API and batch entry points (median of N fresh interpreters) and what dominates it"""
+    results = {}
+    for module in IMPORT_ENTRY_POINTS:
+        runs = [_import_time(module) for _ in range(n)]
+        median = float(np.median([total for total, _ in runs]))
+        results[module] = median
+        print(f"{module:>20}: {median:7.0f} ms  slowest: " + ", ".join(f"{name} {ms:.0f}" for ms, name in runs[-1][1]))
+    return {"n": n, **{f"{module}_ms": ms for module, ms in results.items()}}
+
+
+def bench_incremental(n: int = 24 * 90):
+    """Full feature recompute vs an incremental run over the last hour (parity: tests/test_feature_engineering.py)"""
+    from feature_engineering import FeatureEngineer
+
+    engineer = FeatureEngineer()
+    raw = _make_raw_data(n)
+    # Missed collection runs: time-based lags must still line up
+    raw = raw[np.random.default_rng(0).random(len(raw)) > 0.05]
+    cutoff = raw['timestamp'].max()
+    previous = raw[raw['timestamp'] < cutoff]
+
+    start = time.perf_counter()
+    engineer.process_features(raw)
+    full_time = time.perf_counter() - start
+
+    state = previous.groupby('city')['timestamp'].max().to_dict()
+
+    start = time.perf_counter()
+    batch = engineer.process_new_features(raw, state)
+    incremental_time = time.perf_counter() - start
+
+    print(f"Full recompute: {len(raw)} rows in {full_time:.3f}s")
+    print(f"Incremental:    {int(batch['is_new'].sum())} new rows in {incremental_time:.3f}s")
+    print(f"Speedup: {full_time / incremental_time:.1f}x")
+
+    return {"n": len(raw), "full_seconds": full_time, "incremental_seconds": incremental_time}
+
+
+def _legacy_lag_features(df):
+    """The original groupby shift/rolling implementation, for comparison"""
+    df = df.copy()
+    df = df.sort_values(['city', 'timestamp'])
+    for col in ['pm2_5', 'pm10', 'aqi']:
+        df[f'{col}_lag_1h'] = df.groupby('city')[col].shift(1)
+        df[f'{col}_lag_24h'] = df.groupby('city')[col].shift(24)
+        df[f'{col}_rolling_mean_24h'] = df.groupby('city')[col].rolling(24, min_periods=1).mean().reset_index(0, drop=True)
+    return df
+
+
+def _lag_input(n: int, n_cities: int = 1000, missing: float = 0.01, seed: int = 42):
+    """Lag source columns for about N rows in collection order (all cities for one hour, then the next).
+
+    A `missing` fraction of city-hours is dropped to simulate missed collection runs.
+    """
+    import pandas as pd
+
+    rng = np.random.default_rng(seed)
+    n_hours = n // n_cities
+    n = n_hours * n_cities
+    df = pd.DataFrame({
+        'timestamp': np.repeat(pd.date_range("2020-01-01", periods=n_hours, freq="h").to_numpy(), n_cities),
+        'city': np.tile(np.array([f"Station_{i:05d}" for i in range(n_cities)], dtype=object), n_hours),
+        'pm2_5': rng.uniform(5, 200, n),
+        'pm10': rng.uniform(10, 300, n),
+        'aqi': rng.integers(1, 6, n)
+    })
+    return df[rng.random(n) >= missing].reset_index(drop=True) if missing else df
+
+
+def _timed_lag_features(conn, n: int, engine: str, freq):
+    """Compute lag features in a fresh process and report time and peak RSS growth over the input"""
+    import resource
+    from feature_store import LAG_SOURCE_COLS
+    from lag_engine import add_lag_features
+
+    df = _lag_input(n)
+    before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    if engine == "pandas":
+        out = _legacy_lag_features(df)
+    else:
+        if engine == "numba":
+            # Compile outside the timed region
+            add_lag_features(df.head(100).copy(), LAG_SOURCE_COLS, freq=freq, use_numba=True)
+            before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            start = time.perf_counter()
+        out = add_lag_features(df, LAG_SOURCE_COLS, freq=freq, use_numba=(engine == "numba"))
+    elapsed = time.perf_counter() - start
+    after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    conn.send((elapsed, len(out), (after - before) / 1024))
+
+
+def bench_lag_features(n: int = 10_000_000):
+    """groupby shift/rolling vs the lag engine (positional and hourly-grid) on N unsorted rows: time and peak memory.
+
+    Parity with groupby is checked in tests/test_lag_engine.py.
+    """
+    from lag_engine import HAS_NUMBA
+
+    runs = [("pandas", None), ("numpy", None), ("numpy", "1h")]
+    if HAS_NUMBA:
+        runs += [("numba", None), ("numba", "1h")]
+    results = {}
+    for engine, freq in runs:
+        parent_conn, child_conn = multiprocessing.Pipe()
+        process = multiprocessing.Process(target=_timed_lag_features, args=(child_conn, n, engine, freq))
+        process.start()
+        elapsed, rows, peak_mb = parent_conn.recv()
+        process.join()
+        label = f"{engine}-{'time' if freq else 'rows'}"
+        results[label] = {"seconds": elapsed, "peak_rss_mb": peak_mb}
+        print(f"{label:11s} {rows:>10d} rows in {elapsed:7.2f}s, peak RSS +{peak_mb:.0f} MB")
+
+    best = runs[-1][0]
+    print(f"Speedup: {results['pandas-rows']['seconds'] / results[f'{best}-time']['seconds']:.1f}x "
+          f"({best} hourly grid vs pandas groupby by row)")
+    return results
+
+
+def _timed_load(conn, path: str, filters: dict):
+    """Load a frame in a fresh process and report time, rows and peak RSS growth"""
+    import resource
+    from storage import load_frame
+
+    before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    df = load_frame(path, **filters)
+    elapsed = time.perf_counter() - start
+    after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    conn.send((elapsed, len(df), (after - before) / 1024))
+
+
+def _measure_load(path: str, **filters):
+    parent_conn, child_conn = multiprocessing.Pipe()
+    process = multiprocessing.Process(target=_timed_load, args=(child_conn, path, filters))
+    process.start()
+    result = parent_conn.recv()
+    process.join()
+    return result
+
+
+def bench_storage(n: int = 1_000_000, n_cities: int = 100):
+    """CSV vs partitioned Parquet load time and peak memory, full scan and last 48h for one city"""
+    import tempfile
+    from storage import save_frame
+
+    raw = _make_raw_data(n // n_cities, n_cities)
+    city = raw['city'].iloc[0]
+    recent = {"cities": [city], "start": raw['timestamp'].max() - np.timedelta64(48, 'h')}
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_path = os.path.join(tmp, "aqi_data.csv")
+        dataset_path = os.path.join(tmp, "aqi_data")
+        save_frame(raw, csv_path)
+        save_frame(raw, dataset_path)
+        del raw
+
+        for fmt, path in (("csv", csv_path), ("parquet", dataset_path)):
+            for query, filters in (("full", {}), ("city_48h", recent)):
+                elapsed, rows, peak_mb = _measure_load(path, **filters)
+                results[f"{fmt}_{query}"] = {"seconds": elapsed, "rows": rows, "peak_rss_mb": peak_mb}
+                print(f"{fmt:8s} {query:9s} {rows:>10d} rows in {elapsed:7.3f}s, peak RSS +{peak_mb:.0f} MB")
+
+    return results
+
+
+def _legacy_generate(days: int, n_stations: int = 5):
+    """The original row-by-row generator loop, for comparison"""
+    import pandas as pd
+    from datetime import datetime, timedelta
+
+    rows = []
+    for i in range(n_stations):
+        for day in range(days):
+            for hour in range(24):
+                timestamp = datetime.now() - timedelta(days=days - day, hours=24 - hour)
+                rush_hour_factor = 1.3 if hour in [7, 8, 9, 17, 18, 19] else 1.0
+                weekday_factor = 1.2 if timestamp.weekday() < 5 else 0.8
+                pm25 = max(5, 70 * rush_hour_factor * weekday_factor + np.random.normal(0, 25))
+                pm10 = pm25 * 1.5 + np.random.normal(0, 10)
+                rows.append({
+                    'timestamp': timestamp, 'city': f"Station_{i:05d}",
+                    'aqi': min(5, max(1, int(pm25 / 30) + 1)),
+                    'co': max(0, 200 + np.random.normal(0, 50)),
+                    'no': max(0, 0.5 + np.random.normal(0, 0.2)),
+                    'no2': max(0, 20 + np.random.normal(0, 10)),
+                    'o3': max(0, 50 + np.random.normal(0, 20)),
+                    'so2': max(0, 10 + np.random.normal(0, 5)),
+                    'pm2_5': pm25, 'pm10': max(0, pm10),
+                    'nh3': max(0, 5 + np.random.normal(0, 2))
+                })
+    return pd.DataFrame(rows)
+
+
+def _timed_generate(conn, path: str, n_stations: int, days: int):
+    """Stream generated data to disk in a fresh process and report time and peak RSS growth"""
+    import resource
+    import contextlib
+    import io
+    from generate_sample_data import save_historical_data
+
+    before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        rows = save_historical_data(path, days=days, n_stations=n_stations, end="2024-12-31 23:00")
+    elapsed = time.perf_counter() - start
+    after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    conn.send((elapsed, rows, (after - before) / 1024))
+
+
+def bench_generate(n: int = 10_000_000, days: int = 365):
+    """Row-by-row vs vectorized synthetic data generation; N rows streamed to Parquet and CSV"""
+    import tempfile
+    from generate_sample_data import generate_chunks
+
+    start = time.perf_counter()
+    legacy = _legacy_generate(30)
+    legacy_rate = len(legacy) / (time.perf_counter() - start)
+    print(f"Row-by-row:  {len(legacy):>10d} rows at {legacy_rate:12,.0f} rows/s")
+
+    start = time.perf_counter()
+    rows = sum(len(chunk) for chunk in generate_chunks(n // (days * 24) or 1, days, end="2024-12-31 23:00"))
+    vector_rate = rows / (time.perf_counter() - start)
+    print(f"Vectorized:  {rows:>10d} rows at {vector_rate:12,.0f} rows/s (in memory, {vector_rate / legacy_rate:.0f}x)")
+
+    results = {"legacy_rows_per_second": legacy_rate, "vectorized_rows_per_second": vector_rate}
+    n_stations = max(1, n // (days * 24))
+    with tempfile.TemporaryDirectory() as tmp:
+        for fmt, path in (("parquet", os.path.join(tmp, "aqi_data")), ("csv", os.path.join(tmp, "aqi_data.csv"))):
+            parent_conn, child_conn = multiprocessing.Pipe()
+            process = multiprocessing.Process(target=_timed_generate, args=(child_conn, path, n_stations, days))
+            process.start()
+            elapsed, rows, peak_mb = parent_conn.recv()
+            process.join()
+            print(f"Vectorized → {fmt:7s} {rows:>10d} rows at {rows / elapsed:12,.0f} rows/s "
+                  f"({elapsed:.1f}s, peak RSS +{peak_mb:.0f} MB)")
+            results[f"{fmt}_rows_per_second"] = rows / elapsed
+            results[f"{fmt}_peak_rss_mb"] = peak_mb
+
+    return results
+
+
+def bench_model_reload(n: int = 2000, swaps: int = 10, concurrency: int = 16):
+    """Pickle vs UBJSON model load time, and throughput while models are hot reloaded.
+
+    Models are re-exported while requests are in flight. Picking up a new
+    export is checked in tests/test_inference.py.
+    """
+    import tempfile
+    import joblib
+    import httpx
+
+    tmp = tempfile.mkdtemp()
+    os.environ["MODEL_DIR"] = tmp
+    os.environ.setdefault("MODEL_RELOAD_SECONDS", "0.05")
+    from feature_builder import FEATURE_COLS
+    from model_registry import LoadedModel, export_model, read_manifest
+
+    models = [_make_model(FEATURE_COLS, n_rows=5000, seed=seed) for seed in (1, 2)]
+    pickle_path = os.path.join(tmp, "model.pkl")
+    joblib.dump(models[0], pickle_path)
+    manifest = export_model(models[0], tmp, FEATURE_COLS)
+
+    def best_of(fn, repeat=20):
+        times = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            fn()
+            times.append(time.perf_counter() - start)
+        return min(times) * 1000
+
+    pickle_ms = best_of(lambda: LoadedModel(joblib.load(pickle_path)))
+    ubj_ms = best_of(lambda: LoadedModel.from_manifest(read_manifest(tmp), tmp))
+    ubj_path = os.path.join(tmp, manifest['booster'])
+    print(f"pickle: {pickle_ms:6.1f} ms, {os.path.getsize(pickle_path) / 1024:6.0f} KB")
+    print(f"ubj:    {ubj_ms:6.1f} ms, {os.path.getsize(ubj_path) / 1024:6.0f} KB")
+
+    import fakeredis
+    import api
+    # Normally run in the background by the lifespan handler
+    api.load_initial_model()
+    api.create_redis_client = lambda: fakeredis.FakeAsyncRedis()
+    requests = [("POST", "/api/predict", record.model_dump()) for record in _make_requests(api, n)]
+    requests += [("GET", "/api/model", None)] * (n // 10)
+
+    async def run():
+        seen = set()
+        done = asyncio.Event()
+
+        async def swap():
+            for i in range(swaps):
+                await asyncio.sleep(0.1)
+                version = export_model(models[(i + 1) % 2], tmp, FEATURE_COLS)['version']
+                seen.add(version)
+            done.set()
+
+        lifespan = api.lifespan(api.app)
+        await lifespan.__aenter__()
+        try:
+            transport = httpx.ASGITransport(app=api.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://reload") as client:
+                swapper = asyncio.create_task(swap())
+                total, elapsed = 0, 0.0
+                while not done.is_set():
+                    latencies, wall = await _run_load(client, requests, concurrency)
+                    total += len(latencies)
+                    elapsed += wall
+                await swapper
+                await asyncio.sleep(0.2)
+                final = (await client.get("/api/model")).json()['version']
+        finally:
+            await lifespan.__aexit__(None, None, None)
+        return total, elapsed, final, seen
+
+    total, elapsed, final, seen = asyncio.run(run())
+    print(f"✅ {total} requests during {swaps} model swaps, none failed "
+          f"({total / elapsed:.0f} req/s); serving {final}")
+    return {"pickle_load_ms": pickle_ms, "ubj_load_ms": ubj_ms, "requests": total, "swaps": swaps}
+
+
+def _features_dataset(path: str, n: int, days: int = 365):
+    """Write processed features for about n rows to a Parquet dataset, a few stations at a time"""
+    import contextlib
+    import io
+    from feature_engineering import FeatureEngineer
+    from generate_sample_data import generate_chunks
+    from storage import save_frame
+
+    engineer = FeatureEngineer()
+    n_stations = max(1, n // (days * 24))
+    with contextlib.redirect_stdout(io.StringIO()):
+        for i, chunk in enumerate(generate_chunks(n_stations, days, end="2024-12-31 23:00", chunk_rows=250_000)):
+            # Drop ~1% of observations so lags and targets see gaps
+            keep = np.random.default_rng(i).random(len(chunk)) > 0.01
+            save_frame(engineer.process_features(chunk[keep]), path, append=(i > 0))
+
+
+def _timed_training(conn, path: str, mode: str, chunk_rows: int):
+    """Train in a fresh process; reports time, peak RSS growth and holdout RMSE"""
+    import resource
+    import xgboost as xgb
+    from feature_builder import FEATURE_COLS
+    from lag_engine import sort_groups
+    from model_training import MODEL_PARAMS, train_streaming_booster
+    from param_search import time_split
+    from storage import load_frame
+    from training_data import add_target
+
+    before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    if mode == "in-memory":
+        train, test = time_split(add_target(sort_groups(load_frame(path))))
+        model = xgb.XGBRegressor(**MODEL_PARAMS, tree_method='hist')
+        model.fit(train[FEATURE_COLS].to_numpy(dtype=np.float32), train['target_aqi'].to_numpy(dtype=np.float32))
+        y_test, y_pred = test['target_aqi'].to_numpy(dtype=np.float32), model.predict(test[FEATURE_COLS].to_numpy(dtype=np.float32))
+        del train, test
+    else:
+        _, y_test, y_pred = train_streaming_booster(
+            path, chunk_rows=chunk_rows, external_memory=(mode == "external-memory")
+        )
+    elapsed = time.perf_counter() - start
+    after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    rmse = float(np.sqrt(np.mean((np.asarray(y_test, dtype=np.float64) - y_pred) ** 2)))
+    conn.send((elapsed, (after - before) / 1024, rmse, len(y_test)))
+
+
+def bench_train_streaming(n: int = 2_000_000, chunk_rows: int = 200_000):
+    """In-memory vs streamed (QuantileDMatrix, external memory) training on N feature rows.
+
+    Each mode trains in its own process so peak RSS is measured separately;
+    all hold out the same last 20% of time, so their RMSE is comparable (accuracy
+    parity is checked in tests/test_model_training.py).
+    """
+    import tempfile
+
+    results = {"n": n, "chunk_rows": chunk_rows}
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "aqi_features")
+        _features_dataset(path, n)
+
+        for mode in ("in-memory", "quantile", "external-memory"):
+            parent_conn, child_conn = multiprocessing.Pipe()
+            process = multiprocessing.Process(target=_timed_training, args=(child_conn, path, mode, chunk_rows))
+            process.start()
+            elapsed, peak_mb, rmse, n_test = parent_conn.recv()
+            process.join()
+            print(f"{mode:16s} {elapsed:7.1f}s  peak RSS +{peak_mb:6.0f} MB  RMSE {rmse:.4f} ({n_test} test rows)")
+            results[mode] = {"seconds": elapsed, "peak_rss_mb": peak_mb, "rmse": rmse, "test_rows": n_test}
+
+    return results
+
+
+def bench_param_search(n: int = 200_000, trials: int = 8, levels=(1, 2, 4, 8)):
+    """Wall time of the rolling-origin hyperparameter search with 1, 2, 4 and 8 worker processes.
+
+    Workers split the CPUs between them (nthread = cpus // workers). That
+    the worker count does not change the trial results is checked in
+    tests/test_model_training.py.
+    """
+    import contextlib
+    import io
+    from feature_engineering import FeatureEngineer
+    from generate_sample_data import generate_historical_data
+    from param_search import search, time_split
+    from training_data import add_target
+
+    days = 180
+    raw = generate_historical_data(days, max(1, n // (days * 24)), end="2024-12-31 23:00")
+    with contextlib.redirect_stdout(io.StringIO()):
+        df = add_target(FeatureEngineer().process_features(raw))
+    train, _ = time_split(df)
+    print(f"{len(train)} training rows, {trials} trials, 3 folds, {os.cpu_count()} CPUs")
+
+    results, base = [], None
+    for workers in levels:
+        start = time.perf_counter()
+        trials_run = search(train, trials, workers)
+        elapsed = time.perf_counter() - start
+        if base is None:
+            base = elapsed
+        print(f"workers={workers}: {elapsed:7.1f}s  speedup {base / elapsed:4.2f}x  "
+              f"best cv_rmse {trials_run[0]['cv_rmse']:.4f}")
+        results.append({"workers": workers, "seconds": elapsed, "speedup": base / elapsed})
+
+    return {"n": len(train), "trials": trials, "cpus": os.cpu_count(), "levels": results}
+
+
+def bench_db_writer(n: int = 100_000):
+    """Rows/sec of the upsert writer vs DataFrame.to_sql (DATABASE_URL or a SQLite file).
+
+    Idempotence of re-runs is checked in tests/test_db_writer.py.
+    """
+    import tempfile
+    from sqlalchemy import create_engine, text
+    from db_writer import FeatureTableWriter
+    from feature_engineering import FeatureEngineer
+
+    df = FeatureEngineer().process_features(_make_raw_data(n // 5 + 24))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(os.getenv("DATABASE_URL") or f"sqlite:///{tmp}/bench.db")
+
+        start = time.perf_counter()
+        df.to_sql("bench_to_sql", engine, if_exists='replace', index=False)
+        to_sql_time = time.perf_counter() - start
+
+        with engine.begin() as conn:
+            conn.execute(text('DROP TABLE IF EXISTS bench_upsert'))
+        writer = FeatureTableWriter(engine, "bench_upsert")
+
+        start = time.perf_counter()
+        writer.write(df)
+        insert_time = time.perf_counter() - start
+
+        # Second run exercises the ON CONFLICT update path
+        start = time.perf_counter()
+        writer.write(df)
+        upsert_time = time.perf_counter() - start
+
+        engine.dispose()
+
+    print(f"Backend: {engine.dialect.name}")
+    print(f"to_sql(replace):    {len(df) / to_sql_time:>10,.0f} rows/s")
+    print(f"writer (insert):    {len(df) / insert_time:>10,.0f} rows/s")
+    print(f"writer (upsert):    {len(df) / upsert_time:>10,.0f} rows/s")
+
+    return {
+        "n": len(df),
+        "to_sql_rows_per_second": len(df) / to_sql_time,
+        "insert_rows_per_second": len(df) / insert_time,
+        "upsert_rows_per_second": len(df) / upsert_time
+    }
+
+
+class _RoundTripCounter:
+    """Counts Redis round trips: each command or pipeline execute is one"""
+
+    def __init__(self, client):
+        self.count = 0
+        execute_command = client.execute_command
+        make_pipeline = client.pipeline
+
+        def counted_execute_command(*args, **kwargs):
+            self.count += 1
+            return execute_command(*args, **kwargs)
+
+        def counted_pipeline(*args, **kwargs):
+            pipe = make_pipeline(*args, **kwargs)
+            execute = pipe.execute
+
+            def counted_execute(*a, **kw):
+                self.count += 1
+                return execute(*a, **kw)
+
+            pipe.execute = counted_execute
+            return pipe
+
+        client.execute_command = counted_execute_command
+        client.pipeline = counted_pipeline
+
+
+def _redis_client():
+    """Local redis-server from REDIS_URL when reachable, otherwise fakeredis"""
+    import redis
+
+    try:
+        client = redis.from_url(os.getenv("REDIS_URL", "redis://localhost:6379"))
+        client.ping()
+        return client
+    except redis.RedisError:
+        import fakeredis
+        return fakeredis.FakeRedis()
+
+
+def bench_redis_cache(n: int = 500):
+    """Latest-AQI cache writes for N cities: per-row JSON setex vs pipelined binary records"""
+    from feature_engineering import FeatureEngineer
+    from cache_codec import decode_latest
+
+    df = FeatureEngineer().process_features(_make_raw_data(48, n))
+    latest = df.groupby('city').tail(1)
+    keys = [f"aqi:latest:{city}" for city in latest['city']]
+    client = _redis_client()
+
+    # Previous implementation: iterrows + JSON + one SETEX per city
+    counter = _RoundTripCounter(client)
+    start = time.perf_counter()
+    for _, row in latest.iterrows():
+        value = row.to_dict()
+        value['timestamp'] = str(value['timestamp'])
+        client.set(f"aqi:latest:{row['city']}", json.dumps(value, default=str), ex=3600)
+    json_time = time.perf_counter() - start
+    json_trips = counter.count
+    json_bytes = sum(len(v) for v in client.mget(keys)) / len(keys)
+
+    engineer = FeatureEngineer()
+    engineer.redis_client = client
+    counter.count = 0
+    start = time.perf_counter()
+    engineer.save_to_redis(df)
+    binary_time = time.perf_counter() - start
+    binary_trips = counter.count
+    values = client.mget(keys)
+    binary_bytes = sum(len(v) for v in values) / len(keys)
+
+    start = time.perf_counter()
+    decoded = [decode_latest(v, city) for v, city in zip(values, latest['city'])]
+    decode_time = time.perf_counter() - start
+    assert len(decoded) == len(keys)
+
+    print(f"JSON per city:   {json_trips:>5d} round trips, {json_bytes:6.0f} bytes/city, {json_time * 1000:7.1f} ms")
+    print(f"Binary pipeline: {binary_trips:>5d} round trips, {binary_bytes:6.0f} bytes/city, {binary_time * 1000:7.1f} ms")
+    print(f"Decode: {decode_time / len(keys) * 1e6:.1f} us/city")
+
+    return {
+        "n": len(keys),
+        "json_round_trips": json_trips, "json_bytes_per_city": json_bytes,
+        "binary_round_trips": binary_trips, "binary_bytes_per_city": binary_bytes
+    }
+
+
+async def _run_load(client, requests, concurrency: int):
+    """Issue (method, path, json) requests from `concurrency` workers; returns latencies and wall time"""
+    latencies = np.empty(len(requests))
+    pending = iter(range(len(requests)))
+
+    async def worker():
+        for i in pending:
+            method, path, body = requests[i]
+            start = time.perf_counter()
+            response = await client.request(method, path, json=body)
+            latencies[i] = time.perf_counter() - start
+            if response.status_code != 200:
+                raise RuntimeError(f"{method} {path} returned {response.status_code}: {response.text}")
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies, time.perf_counter() - start
+
+
+def bench_api_load(n: int = 2000, n_cities: int = 50, levels=(1, 8, 32, 128)):
+    """Throughput and tail latency of the async API at several concurrency levels.
+
+    Requests alternate between /api/current/{city} and /api/predict. By default
+    the app runs in process against an in-memory stand-in Redis; set
+    LOAD_TEST_URL to drive an already running (and seeded) server instead.
+    """
+    import httpx
+
+    api = _load_api()
+    url = os.getenv("LOAD_TEST_URL")
+    cities = [f"City_{i:03d}" for i in range(n_cities)]
+
+    if url is None:
+        import fakeredis
+        import redis.asyncio as redis_asyncio
+        from feature_engineering import FeatureEngineer
+        from feature_store import OnlineFeatureStore
+
+        # Seed latest records and feature buffers through the pipeline's own writers
+        server = fakeredis.FakeServer()
+        engineer = FeatureEngineer()
+        engineer.redis_client = fakeredis.FakeRedis(server=server)
+        df = engineer.process_features(_make_raw_data(48, n_cities))
+        engineer.save_to_redis(df)
+        OnlineFeatureStore(engineer.redis_client).write_history(df)
+        # Same bounded, blocking pool as create_redis_client
+        api.create_redis_client = lambda: fakeredis.FakeAsyncRedis(
+            server=server, connection_pool_class=redis_asyncio.BlockingConnectionPool,
+            max_connections=api.REDIS_MAX_CONNECTIONS, timeout=api.REDIS_POOL_TIMEOUT
+        )
+
+    rng = np.random.default_rng(42)
+    predictions = _make_requests(api, n)
+    requests = []
+    for i, record in enumerate(predictions):
+        city = cities[rng.integers(n_cities)]
+        if i % 2:
+            requests.append(("GET", f"/api/current/{city}", None))
+        else:
+            requests.append(("POST", "/api/predict", record.model_copy(update={"city": city}).model_dump()))
+
+    async def run():
+        results = []
+        if url is None:
+            transport = httpx.ASGITransport(app=api.app)
+            lifespan = api.lifespan(api.app)
+            base_url = "http://loadtest"
+        else:
+            transport = None
+            lifespan = None
+            base_url = url
+
+        if lifespan is not None:
+            await lifespan.__aenter__()
+        try:
+            limits = httpx.Limits(max_connections=max(levels))
+            async with httpx.AsyncClient(transport=transport, base_url=base_url, limits=limits) as client:
+                await _run_load(client, requests[:min(50, n)], 4)  # warm up
+                for concurrency in levels:
+                    latencies, elapsed = await _run_load(client, requests, concurrency)
+                    p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) * 1000
+                    print(
+                        f"concurrency={concurrency:>4d}: {n / elapsed:8.0f} req/s  "
+                        f"p50={p50:7.2f} ms  p95={p95:7.2f} ms  p99={p99:7.2f} ms"
+                    )
+                    results.append({
+                        "concurrency": concurrency, "requests_per_second": n / elapsed,
+                        "p50_ms": p50, "p95_ms": p95, "p99_ms": p99
+                    })
+        finally:
+            if lifespan is not None:
+                await lifespan.__aexit__(None, None, None)
+        return results
+
+    print(f"Load test: {n} requests per level against {url or 'in-process app with stand-in Redis'}")
+    results = asyncio.run(run())
+    if url is None:
+        print(f"Current cache: {api.current_cache.stats()}")
+    return {"n": n, "levels": results}
+
+
+# End-to-end suite: every pipeline stage on generated data at several scales,
+# each stage in a fresh process so its peak memory is its own
+SUITE_SCALES = "1k,100k"
+SUITE_BASELINE_PATH = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "benchmarks",
+                                                    "baseline.json"))
+SUITE_END = "2024-12-31 23:00"
+SUITE_STAGES = ("generate", "collection", "features", "postgres", "redis", "train", "api_predict", "drift")
+
+# Metrics compared with the baseline, and whether higher values are better
+SUITE_COMPARED = {
+    "rows_per_second": True,
+    "requests_per_second": True,
+    "p50_ms": False,
+    "p95_ms": False,
+    "peak_rss_mb": False,
+}
+# Differences smaller than these are noise whatever the ratio (tiny stages at small scales)
+SUITE_NOISE_FLOOR = {"p50_ms": 0.5, "p95_ms": 1.0, "peak_rss_mb": 32}
+
+
+def _parse_scale(scale: str) -> int:
+    """'1k' -> 1000, '10m' -> 10_000_000"""
+    scale = scale.strip().lower()
+    factor = {"k": 1_000, "m": 1_000_000}.get(scale[-1:], 1)
+    return int(float(scale.rstrip("km")) * factor)
+
+
+def _suite_shape(rows: int) -> dict:
+    """Stations and days of hourly data giving about `rows` rows; more rows mean more stations"""
+    stations = min(max(rows // 1000, 5), 10_000)
+    days = max(1, -(-rows // (stations * 24)))
+    return {"stations": stations, "days": days}
+
+
+def _suite_paths(workdir: str) -> dict:
+    return {name: os.path.join(workdir, name) for name in ("raw", "features", "models", "mlruns")}
+
+
+def _throughput(rows: int, seconds: float) -> dict:
+    return {"rows": rows, "seconds": seconds, "rows_per_second": rows / seconds}
+
+
+def _percentiles(latencies) -> dict:
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) * 1000
+    return {"p50_ms": p50, "p95_ms": p95, "p99_ms": p99}
+
+
+def _suite_generate(workdir: str, shape: dict) -> dict:
+    from generate_sample_data import save_historical_data
+
+    start = time.perf_counter()
+    rows = save_historical_data(_suite_paths(workdir)["raw"], days=shape["days"], n_stations=shape["stations"],
+                                end=SUITE_END)
+    return _throughput(rows, time.perf_counter() - start)
+
+
+def _suite_collection(workdir: str, shape: dict) -> dict:
+    """collect_all_cities_concurrent (the collector's default path) for every station against a mock API"""
+    from data_collection import AirQualityDataCollector
+
+    server, base_url = start_mock_openweather_server(latency=0.02)
+    try:
+        collector = AirQualityDataCollector(base_url=base_url, rate_limit=1000, max_concurrency=50)
+        collector.cities = {f"Station_{i:05d}": {"lat": 30 + i * 1e-3, "lon": 70 + i * 1e-3}
+                            for i in range(shape["stations"])}
+        start = time.perf_counter()
+        df = collector.collect_all_cities_concurrent()
+        elapsed = time.perf_counter() - start
+    finally:
+        server.terminate()
+    assert len(df) == shape["stations"], f"collected {len(df)} of {shape['stations']} stations"
+    return _throughput(len(df), elapsed)
+
+
+def _suite_features(workdir: str, shape: dict) -> dict:
+    from feature_engineering import FeatureEngineer
+    from storage import load_frame, save_frame
+
+    paths = _suite_paths(workdir)
+    raw = load_frame(paths["raw"])
+    start = time.perf_counter()
+    features = FeatureEngineer().process_features(raw)
+    elapsed = time.perf_counter() - start
+    save_frame(features, paths["features"])
+    return _throughput(len(raw), elapsed)
+
+
+def _suite_postgres(workdir: str, shape: dict) -> dict:
+    """save_to_postgres into DATABASE_URL, or a SQLite file"""
+    from sqlalchemy import create_engine, text
+    from feature_engineering import FeatureEngineer
+    from storage import load_frame
+
+    df = load_frame(_suite_paths(workdir)["features"])
+    engine = create_engine(os.getenv("DATABASE_URL") or f"sqlite:///{workdir}/features.db")
+    with engine.begin() as conn:
+        conn.execute(text('DROP TABLE IF EXISTS bench_suite_features'))
+    engineer = FeatureEngineer()
+    engineer.db_engine = engine
+
+    start = time.perf_counter()
+    engineer.save_to_postgres(df, table_name="bench_suite_features")
+    elapsed = time.perf_counter() - start
+
+    with engine.connect() as conn:
+        count = conn.execute(text('SELECT COUNT(*) FROM bench_suite_features')).scalar()
+    engine.dispose()
+    assert count == len(df), f"expected {len(df)} rows in the database, found {count}"
+    return _throughput(len(df), elapsed)
+
+
+def _suite_redis(workdir: str, shape: dict) -> dict:
+    """save_to_redis and the feature store refresh, on REDIS_URL or fakeredis"""
+    from feature_engineering import FeatureEngineer
+    from storage import load_frame
+
+    df = load_frame(_suite_paths(workdir)["features"]).sort_values(['city', 'timestamp'], ignore_index=True)
+    engineer = FeatureEngineer()
+    engineer.redis_client = _redis_client()
+
+    start = time.perf_counter()
+    engineer.save_to_redis(df)
+    engineer.save_to_feature_store(df)
+    return _throughput(len(df), time.perf_counter() - start)
+
+
+def _suite_train(workdir: str, shape: dict) -> dict:
+    """prepare_data and train_model, logging to a local MLflow file store and exporting to the work directory"""
+    os.environ["MLFLOW_ALLOW_FILE_STORE"] = "true"
+    import model_training
+    from model_training import ModelTrainer
+
+    paths = _suite_paths(workdir)
+    model_training.MODEL_DIR = paths["models"]
+    trainer = ModelTrainer()
+    trainer.tracking_uri = f"file://{paths['mlruns']}"
+    trainer.mlflow  # connect to the tracking store outside the timed section
+    df = trainer.load_features(paths["features"])
+
+    start = time.perf_counter()
+    X_train, X_test, y_train, y_test = trainer.prepare_data(df)
+    trainer.train_model(X_train, y_train, X_test, y_test)
+    return _throughput(len(X_train), time.perf_counter() - start)
+
+
+def _suite_api_predict(workdir: str, shape: dict, n: int = 1000, concurrency: int = 16) -> dict:
+    """/api/predict through the app and its lifespan: sequential latency, then throughput at `concurrency`"""
+    import fakeredis
+    import httpx
+    import pandas as pd
+    import api
+    from feature_engineering import FeatureEngineer
+    from model_registry import LoadedModel, read_manifest
+    from storage import load_frame
+
+    paths = _suite_paths(workdir)
+    api.serving = LoadedModel.from_manifest(read_manifest(paths["models"]), paths["models"])
+    # Every request is distinct; the result cache would otherwise answer the second pass
+    api.prediction_cache.maxsize = 0
+
+    recent = load_frame(paths["features"], start=pd.Timestamp(SUITE_END) - pd.Timedelta(hours=48))
+    recent = recent.sort_values(['city', 'timestamp'], ignore_index=True)
+    server = fakeredis.FakeServer()
+    engineer = FeatureEngineer()
+    engineer.redis_client = fakeredis.FakeRedis(server=server)
+    engineer.save_to_redis(recent)
+    engineer.save_to_feature_store(recent)
+    api.create_redis_client = lambda: fakeredis.FakeAsyncRedis(server=server)
+
+    cities = recent['city'].unique()
+    def requests(seed):
+        return [("POST", "/api/predict", record.model_copy(update={"city": cities[i % len(cities)]}).model_dump())
+                for i, record in enumerate(_make_requests(api, n, seed))]
+    sequential, concurrent = requests(1), requests(2)
+
+    async def run():
+        lifespan = api.lifespan(api.app)
+        await lifespan.__aenter__()
+        try:
+            transport = httpx.ASGITransport(app=api.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://suite") as client:
+                await _run_load(client, requests(3)[:50], 1)  # warm up
+                latencies, _ = await _run_load(client, sequential, 1)
+                _, elapsed = await _run_load(client, concurrent, concurrency)
+        finally:
+            await lifespan.__aexit__(None, None, None)
+        return latencies, elapsed
+
+    latencies, elapsed = asyncio.run(run())
+    return {"requests": n, **_percentiles(latencies), "requests_per_second": n / elapsed, "concurrency": concurrency}
+
+
+def _suite_drift(workdir: str, shape: dict, batch: int = 100, batches: int = 50) -> dict:
+    """ModelMonitor: reference profile build over all features, then check_drift latency per batch"""
+    import pandas as pd
+    from monitoring import ModelMonitor
+    from storage import load_frame
+
+    features = _suite_paths(workdir)["features"]
+    monitor = ModelMonitor()
+    monitor.reference_data_path = features
+    monitor.profile_path = os.path.join(workdir, "reference_profile.json")
+
+    start = time.perf_counter()
+    profile = monitor.build_reference_profile()
+    result = _throughput(profile.rows, time.perf_counter() - start)
+
+    recent = load_frame(features, start=pd.Timestamp(SUITE_END) - pd.Timedelta(days=7))
+    rows = np.random.default_rng(0).integers(0, len(recent), size=(batches, batch))
+    latencies = []
+    for sample in rows:
+        current = recent.iloc[sample]
+        begin = time.perf_counter()
+        monitor.check_drift(current, report=False)
+        latencies.append(time.perf_counter() - begin)
+    return {**result, **_percentiles(latencies)}
+
+
+def _suite_child(conn, stage: str, workdir: str, shape: dict):
+    """Run one stage in this fresh process and send back its metrics with peak RSS growth"""
+    import contextlib
+    import io
+    import resource
+    import traceback
+
+    # Stages that write reports or metrics files do so in the work directory
+    os.chdir(workdir)
+    try:
+        before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        with contextlib.redirect_stdout(io.StringIO()):
+            result = globals()[f"_suite_{stage}"](workdir, shape)
+        result["peak_rss_mb"] = (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - before) / 1024
+        conn.send(result)
+    except BaseException as e:
+        conn.send({"error": f"{type(e).__name__}: {e}", "traceback": traceback.format_exc()})
+
+
+def _run_suite_stage(stage: str, workdir: str, shape: dict) -> dict:
+    parent_conn, child_conn = multiprocessing.Pipe()
+    process = multiprocessing.Process(target=_suite_child, args=(child_conn, stage, workdir, shape))
+    process.start()
+    result = parent_conn.recv() if parent_conn.poll(None) else {"error": "no result"}
+    process.join()
+    if "error" in result:
+        print(result.pop("traceback", ""))
+        raise RuntimeError(f"Stage {stage} failed: {result['error']}")
+    return result
+
+
+def _suite_machine() -> dict:
+    """What the suite's numbers depend on: CPU, memory, Python and the database stand-in"""
+    import platform
+
+    cpu = platform.processor() or platform.machine()
+    try:
+        with open("/proc/cpuinfo") as f:
+            cpu = next(line.split(":", 1)[1].strip() for line in f if line.startswith("model name"))
+    except (OSError, StopIteration):
+        pass
+    return {
+        "system": platform.system(),
+        "cpu": cpu,
+        "cpus": os.cpu_count(),
+        "memory_gb": round(os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES") / 2 ** 30),
+        "python": ".".join(platform.python_version_tuple()[:2]),
+        # The dialect of DATABASE_URL, or the SQLite stand-in
+        "database": (os.getenv("DATABASE_URL") or "sqlite").split(":", 1)[0].split("+", 1)[0]
+    }
+
+
+def machine_key(machine: dict) -> str:
+    """Baseline entry a machine's results are stored under and compared with"""
+    return (f"{machine['system']} {machine['cpu']} x{machine['cpus']}, {machine['memory_gb']} GB, "
+            f"Python {machine['python']}, {machine['database']}")
+
+
+def compare_to_baseline(results: dict, baseline: dict, tolerance: float) -> list:
+    """Regressions of `results` against `baseline`: compared metrics worse by more than `tolerance` (a ratio)
+    and by more than their noise floor"""
+    regressions = []
+    for scale, stages in results["scales"].items():
+        for stage, metrics in stages.items():
+            reference = baseline.get("scales", {}).get(scale, {}).get(stage, {})
+            for metric, higher_is_better in SUITE_COMPARED.items():
+                if metric not in metrics or metric not in reference:
+                    continue
+                old, new = reference[metric], metrics[metric]
+                change = (old - new) / old if higher_is_better else (new - old) / max(old, 1e-9)
+                if change > tolerance and abs(new - old) > SUITE_NOISE_FLOOR.get(metric, 0):
+                    regressions.append(f"{scale} {stage} {metric}: {old:.4g} -> {new:.4g} ({change:+.0%} worse)")
+    return regressions
+
+
+def bench_suite(n: int = None, scales: str = SUITE_SCALES, output: str = None, baseline: str = SUITE_BASELINE_PATH,
+                update_baseline: bool = False, tolerance: float = 0.3):
+    """Every pipeline stage on generated data at each scale (rows, e.g. 1k,100k,10m), compared with a baseline.
+
+    Stages: generate (data generator), collection (mock OpenWeatherMap
+    server), features (process_features), postgres (save_to_postgres into
+    DATABASE_URL or SQLite), redis (save_to_redis and the feature store, on
+    REDIS_URL or fakeredis), train (prepare_data + train_model with a local
+    MLflow store), api_predict (/api/predict through the app) and drift
+    (ModelMonitor profile build and check_drift). Each stage runs in its
+    own process. Throughput, latency percentiles and peak RSS growth are
+    written as JSON.
+
+    The baseline file holds one entry per machine (see machine_key), and
+    results are only compared with the entry recorded on the same kind of
+    machine: any compared metric more than `tolerance` worse fails the
+    run. Without an entry for this machine the comparison is skipped.
+    --update-baseline stores the results as this machine's baseline instead.
+    """
+    import tempfile
+    from datetime import datetime, timezone
+
+    scale_names = [str(n)] if n else [scale.strip() for scale in scales.split(",") if scale.strip()]
+    results = {
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "machine": _suite_machine(),
+        "scales": {}
+    }
+    key = machine_key(results["machine"])
+
+    for scale in scale_names:
+        shape = _suite_shape(_parse_scale(scale))
+        print(f"\n== {scale}: {shape['stations']} stations x {shape['days']} days ==")
+        stages = results["scales"][scale] = {}
+        with tempfile.TemporaryDirectory() as workdir:
+            for stage in SUITE_STAGES:
+                metrics = stages[stage] = _run_suite_stage(stage, workdir, shape)
+                rate = (f"{metrics['rows_per_second']:>12,.0f} rows/s" if "rows_per_second" in metrics
+                        else f"{metrics['requests_per_second']:>10,.0f} req/s")
+                latency = (f"  p50 {metrics['p50_ms']:.2f} ms  p95 {metrics['p95_ms']:.2f} ms"
+                           if "p50_ms" in metrics else "")
+                print(f"{stage:>12}: {rate}{latency}  peak RSS +{metrics['peak_rss_mb']:.0f} MB")
+
+    output = output or os.path.join("reports", f"benchmark_suite_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"\n✅ Results saved to: {output}")
+
+    stored = {"machines": {}}
+    if os.path.exists(baseline):
+        with open(baseline) as f:
+            stored = json.load(f)
+    reference = stored["machines"].get(key)
+
+    if update_baseline:
+        entry = stored["machines"].setdefault(key, {"scales": {}})
+        # Scales not run this time keep their previous numbers
+        entry.update({name: value for name, value in results.items() if name != "scales"})
+        entry["scales"].update(results["scales"])
+        os.makedirs(os.path.dirname(baseline), exist_ok=True)
+        with open(baseline, "w") as f:
+            json.dump(stored, f, indent=2)
+        print(f"✅ Baseline for {key} updated: {baseline}")
+    elif reference is None:
+        print(f"Warning: No baseline for {key} in {baseline}; comparison skipped "
+              f"(run with --update-baseline to record one)")
+    else:
+        regressions = compare_to_baseline(results, reference, tolerance)
+        if regressions:
+            print(f"\n❌ {len(regressions)} regressions against {baseline} (tolerance {tolerance:.0%}):")
+            for regression in regressions:
+                print(f"  {regression}")
+            raise AssertionError(f"{len(regressions)} benchmark regressions")
+        print(f"✅ No regressions against the {key} baseline (tolerance {tolerance:.0%})")
+
+    return results
+
+
+BENCHMARKS = {
+    "api_load": bench_api_load,
+    "backends": bench_backends,
+    "batch_predict": bench_batch_predict,
+    "collection": bench_collection,
+    "db_writer": bench_db_writer,
+    "drift": bench_drift,
+    "forecast": bench_forecast,
+    "generate": bench_generate,
+    "history": bench_history,
+    "import_time": bench_import_time,
+    "incremental": bench_incremental,
+    "lag_features": bench_lag_features,
+    "metrics": bench_metrics,
+    "model_reload": bench_model_reload,
+    "param_search": bench_param_search,
+    "prediction_cache": bench_prediction_cache,
+    "redis_cache": bench_redis_cache,
+    "single_predict": bench_single_predict,
+    "storage": bench_storage,
+    "stream": bench_stream,
+    "suite": bench_suite,
+    "train_streaming": bench_train_streaming,
+}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run performance benchmarks")
+    parser.add_argument("benchmark", choices=sorted(BENCHMARKS))
+    parser.add_argument("-n", type=int, help="Number of records (benchmark-specific default)")
+    suite = parser.add_argument_group("suite")
+    suite.add_argument("--scales", help=f"Comma-separated dataset sizes (default {SUITE_SCALES})")
+    suite.add_argument("--output", help="Results JSON path (default reports/benchmark_suite_<time>.json)")
+    suite.add_argument("--baseline", help="Baseline JSON to compare with (default benchmarks/baseline.json)")
+    suite.add_argument("--update-baseline", action="store_true", help="Store the results as the baseline")
+    suite.add_argument("--tolerance", type=float, help="Allowed slowdown as a ratio (default 0.3)")
+    args = parser.parse_args()
+
+    kwargs = {"n": args.n} if args.n else {}
+    if args.benchmark == "suite":
+        options = {"scales": args.scales, "output": args.output, "baseline": args.baseline,
+                   "update_baseline": args.update_baseline, "tolerance": args.tolerance}
+        kwargs.update({key: value for key, value in options.items() if value not in (None, False)})
+    BENCHMARKS[args.benchmark](**kwargs)
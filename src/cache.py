@@ -0,0 +1,173 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Iterable, List
+
+
+def _consume(flight: asyncio.Future):
+    """Mark a failed flight's exception as retrieved when nobody waited on it"""
+    if not flight.cancelled():
+        flight.exception()
+
+
+class TTLCache:
+    """Bounded in-process LRU cache with per-entry TTL and request coalescing.
+
+    Concurrent misses for the same key share a single loader call. The cache
+    belongs to one event loop, so bookkeeping needs no locks.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 300.0, clock: Callable[[], float] = time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.clock = clock
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._flights: Dict[Hashable, asyncio.Future] = {}
+        # Bumped by clear() so loads that started before it are not cached
+        self._generation = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+
+    def _lookup(self, key: Hashable, now: float):
+        """Return (True, value) on a fresh hit"""
+        entry = self._data.get(key)
+        if entry is None:
+            return False, None
+        expires_at, value = entry
+        if expires_at <= now:
+            del self._data[key]
+            return False, None
+        self._data.move_to_end(key)
+        return True, value
+
+    def _store(self, key: Hashable, value: Any, now: float):
+        """Insert a value and evict least recently used entries"""
+        self._data[key] = (now + self.ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    async def get(self, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> Any:
+        """Return the cached value for key, awaiting loader once on a miss"""
+        async def load(keys):
+            return {keys[0]: await loader()}
+        return (await self.get_many([key], load))[key]
+
+    async def get_many(self, keys: Iterable[Hashable],
+                       loader: Callable[[List[Hashable]], Awaitable[Dict[Hashable, Any]]]) -> Dict[Hashable, Any]:
+        """Return values for several keys; all misses not already in flight go to one loader call"""
+        results = {}
+        leading: Dict[Hashable, asyncio.Future] = {}
+        waiting: Dict[Hashable, asyncio.Future] = {}
+        loop = asyncio.get_running_loop()
+
+        now = self.clock()
+        for key in dict.fromkeys(keys):
+            hit, value = self._lookup(key, now)
+            if hit:
+                self.hits += 1
+                results[key] = value
+            elif key in self._flights:
+                self.coalesced += 1
+                waiting[key] = self._flights[key]
+            else:
+                self.misses += 1
+                flight = leading[key] = self._flights[key] = loop.create_future()
+                flight.add_done_callback(_consume)
+        generation = self._generation
+
+        if leading:
+            try:
+                loaded = await loader(list(leading))
+            except BaseException as e:
+                # Waiters see the same failure; cancellation of the leader cancels them too
+                for key, flight in leading.items():
+                    del self._flights[key]
+                    if isinstance(e, asyncio.CancelledError):
+                        flight.cancel()
+                    else:
+                        flight.set_exception(e)
+                raise
+
+            now = self.clock()
+            for key, flight in leading.items():
+                value = loaded.get(key)
+                if generation == self._generation:
+                    self._store(key, value, now)
+                del self._flights[key]
+                flight.set_result(value)
+                results[key] = value
+
+        for key, flight in waiting.items():
+            # Shielded so a cancelled waiter does not cancel the shared load
+            results[key] = await asyncio.shield(flight)
+
+        return results
+
+    def clear(self):
+        """Drop every cached entry (in-flight loads still complete)"""
+        self._data.clear()
+        self._generation += 1
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses + self.coalesced
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "evictions": self.evictions,
+            "hit_rate": (self.hits + self.coalesced) / lookups if lookups else 0.0
+        }
+
+
+class VersionedCache(TTLCache):
+    """TTLCache that is cleared whenever a version key in Redis changes.
+
+    The version key is read at most once per `check_interval` seconds, so
+    invalidation costs one extra round trip per interval rather than per request.
+    Expects a redis.asyncio client.
+    """
+
+    def __init__(self, redis_client, version_key: str, check_interval: float = 5.0, **kwargs):
+        super().__init__(**kwargs)
+        self.redis_client = redis_client
+        self.version_key = version_key
+        self.check_interval = check_interval
+        self.version = None
+        self.invalidations = 0
+        self._next_check = 0.0
+
+    async def check_version(self):
+        """Clear the cache if the version key changed since the last check"""
+        now = self.clock()
+        if now < self._next_check or self.redis_client is None:
+            return
+        # Set before awaiting so concurrent requests don't issue their own check
+        self._next_check = now + self.check_interval
+        try:
+            version = await self.redis_client.get(self.version_key)
+        except Exception as e:
+            # Keep serving cached entries until their TTL runs out
+            print(f"Warning: Could not read cache version: {e}")
+            return
+        if version != self.version:
+            if self.version is not None:
+                self.invalidations += 1
+            self.clear()
+            self.version = version
+
+    async def get_many(self, keys, loader):
+        await self.check_version()
+        return await super().get_many(keys, loader)
+
+    def stats(self) -> Dict[str, Any]:
+        stats = super().stats()
+        stats["invalidations"] = self.invalidations
+        return stats
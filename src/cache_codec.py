@@ -0,0 +1,146 @@
+import json
+import struct
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+
+import numpy as np
+
+# Fields cached per city for /api/current, in wire order: every numeric
+# column process_features produces, so the record matches the JSON one it
+# replaced. pollution_level travels separately as an index into POLLUTION_LEVELS.
+LATEST_FIELDS = (
+    'aqi', 'co', 'no', 'no2', 'o3', 'so2', 'pm2_5', 'pm10', 'nh3',
+    'hour', 'day_of_week', 'month', 'is_weekend', 'is_rush_hour',
+    'total_pollution', 'pm_ratio', 'health_risk_score',
+    'lag_1h_missing', 'lag_24h_missing',
+    'pm2_5_lag_1h', 'pm2_5_lag_24h', 'pm2_5_rolling_mean_24h',
+    'pm10_lag_1h', 'pm10_lag_24h', 'pm10_rolling_mean_24h',
+    'aqi_lag_1h', 'aqi_lag_24h', 'aqi_rolling_mean_24h'
+)
+INT_FIELDS = {
+    'aqi', 'hour', 'day_of_week', 'month', 'is_weekend', 'is_rush_hour', 'lag_1h_missing', 'lag_24h_missing'
+}
+
+# Labels of pollution_level, in order of its pm2_5 bins
+POLLUTION_LEVELS = ('Good', 'Moderate', 'Unhealthy_Sensitive', 'Unhealthy', 'Very_Unhealthy')
+NO_LEVEL = 255
+
+# Layout version of latest records; a record of another version (or size) is
+# read as a cache miss, so a deploy never fails on what the old code wrote
+CODEC_VERSION = 2
+
+# Latest records expire unless refreshed by the hourly feature pipeline; the
+# version key is bumped on every refresh so in-process caches can invalidate
+LATEST_TTL_SECONDS = 3600
+LATEST_VERSION_KEY = "aqi:latest:version"
+
+
+# Every refresh also publishes each city's record here for live streams
+LATEST_CHANNEL = "aqi:latest:updates"
+
+
+def latest_key(city: str) -> str:
+    return f"aqi:latest:{city}"
+
+
+# Precomputed forecasts live as long as the latest records they were made from
+FORECAST_TTL_SECONDS = LATEST_TTL_SECONDS
+
+
+def forecast_key(city: str) -> str:
+    return f"aqi:forecast:{city}"
+
+
+# Fixed-width little-endian record: version, epoch seconds, pollution level, float32 fields
+LATEST_DTYPE = np.dtype(
+    [('version', '<u1'), ('timestamp', '<f8'), ('pollution_level', '<u1')]
+    + [(field, '<f4') for field in LATEST_FIELDS]
+)
+
+
+# Same layout for scalar decoding, which is much cheaper than numpy per record
+LATEST_STRUCT = struct.Struct('<BdB' + 'f' * len(LATEST_FIELDS))
+
+EPOCH = datetime(1970, 1, 1)
+
+
+def encode_latest(df) -> Dict[str, bytes]:
+    """Encode one row per city of a DataFrame into fixed-width binary records, without iterating rows"""
+    import pandas as pd
+
+    n = len(df)
+    records = np.zeros(n, dtype=LATEST_DTYPE)
+    records['version'] = CODEC_VERSION
+    records['timestamp'] = pd.to_datetime(df['timestamp']).to_numpy('datetime64[ns]').astype(np.int64) / 1e9
+    if 'pollution_level' in df.columns:
+        codes = pd.Categorical(df['pollution_level'], categories=POLLUTION_LEVELS).codes
+        records['pollution_level'] = np.where(codes < 0, NO_LEVEL, codes)
+    else:
+        records['pollution_level'] = NO_LEVEL
+    for field in LATEST_FIELDS:
+        records[field] = df[field].to_numpy(dtype=np.float32) if field in df.columns else np.nan
+
+    raw = records.tobytes()
+    size = LATEST_DTYPE.itemsize
+    return {city: raw[i * size:(i + 1) * size] for i, city in enumerate(df['city'])}
+
+
+def decode_latest(data: bytes, city: str) -> Optional[Dict]:
+    """Decode a cached record; also accepts the legacy JSON encoding. Other layouts decode to None."""
+    if not data:
+        return None
+    if data[:1] == b'{':
+        return json.loads(data)
+    if len(data) != LATEST_STRUCT.size or data[0] != CODEC_VERSION:
+        return None
+
+    _, timestamp, level, *numbers = LATEST_STRUCT.unpack(data)
+    value = {
+        'city': city,
+        'timestamp': (EPOCH + timedelta(seconds=timestamp)).isoformat(sep=' '),
+        'pollution_level': POLLUTION_LEVELS[level] if level != NO_LEVEL else None
+    }
+    for field, number in zip(LATEST_FIELDS, numbers):
+        if number != number:
+            value[field] = None
+        elif field in INT_FIELDS:
+            value[field] = int(number)
+        else:
+            # float32 carries ~7 significant digits; don't echo binary noise
+            value[field] = round(number, 4)
+    return value
+
+
+def encode_update(city: str, payload: bytes) -> bytes:
+    """Pub/sub message for one city: the city name, a NUL byte, then its latest record"""
+    return city.encode() + b'\0' + payload
+
+
+def decode_update(data: bytes) -> Optional[Dict]:
+    city, _, payload = data.partition(b'\0')
+    return decode_latest(payload, city.decode())
+
+
+# Forecast record: version, issue time (epoch seconds of the last observation),
+# model version, then one float32 AQI per hour ahead
+FORECAST_HEADER = struct.Struct('<Bd16s')
+FORECAST_CODEC_VERSION = 1
+
+
+def encode_forecast(issued_at: float, model_version: Optional[str], values: np.ndarray) -> bytes:
+    header = FORECAST_HEADER.pack(FORECAST_CODEC_VERSION, issued_at, (model_version or '').encode())
+    return header + np.asarray(values, dtype='<f4').tobytes()
+
+
+def decode_forecast(data: bytes) -> Optional[Dict]:
+    """Decode a cached forecast; other layouts decode to None, a cache miss"""
+    if not data or len(data) < FORECAST_HEADER.size or (len(data) - FORECAST_HEADER.size) % 4:
+        return None
+    version, issued_at, model_version = FORECAST_HEADER.unpack_from(data)
+    if version != FORECAST_CODEC_VERSION:
+        return None
+    return {
+        'issued_at': EPOCH + timedelta(seconds=issued_at),
+        'model_version': model_version.rstrip(b'\0').decode() or None,
+        'values': np.frombuffer(data, dtype='<f4', offset=FORECAST_HEADER.size)
+    }
@@ -1,17 +1,68 @@
 import os
+import asyncio
+import random
 import requests
+import httpx
 import pandas as pd
 from datetime import datetime
 from dotenv import load_dotenv
-from typing import Dict, List
+from typing import Dict, List, Optional
 import time
 
+try:
+    from src.metrics import JobMetrics
+    from src.storage import RAW_DATA_PATH, save_frame
+except ImportError:
+    from metrics import JobMetrics
+    from storage import RAW_DATA_PATH, save_frame
+
 load_dotenv()
 
+# Status codes worth retrying: rate limited or transient server errors
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+class TokenBucket:
+    """Async token bucket allowing `rate` requests per second with bursts up to `capacity`"""
+    
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = None
+        self._lock = asyncio.Lock()
+    
+    async def acquire(self):
+        """Wait until a token is available and take it"""
+        async with self._lock:
+            loop = asyncio.get_running_loop()
+            while True:
+                now = loop.time()
+                if self.updated is not None:
+                    self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
 class AirQualityDataCollector:
-    def __init__(self):
+    def __init__(self, base_url: Optional[str] = None, rate_limit: Optional[float] = None,
+                 max_concurrency: Optional[int] = None, max_retries: Optional[int] = None,
+                 request_interval: float = 1.0):
         self.api_key = os.getenv("OPENWEATHER_API_KEY")
-        self.base_url = "http://api.openweathermap.org/data/2.5/air_pollution"
+        self.base_url = base_url or os.getenv(
+            "OPENWEATHER_BASE_URL", "http://api.openweathermap.org/data/2.5/air_pollution"
+        )
+        
+        # Concurrent collection settings
+        self.rate_limit = rate_limit or float(os.getenv("COLLECTOR_RATE_LIMIT", 10))
+        self.max_concurrency = max_concurrency or int(os.getenv("COLLECTOR_MAX_CONCURRENCY", 10))
+        self.max_retries = max_retries if max_retries is not None else int(os.getenv("COLLECTOR_MAX_RETRIES", 3))
+        self.backoff_base = 0.5
+        
+        # Pause between cities on the sequential path
+        self.request_interval = request_interval
         
         # Major cities coordinates
         self.cities = {
@@ -67,23 +118,87 @@ class AirQualityDataCollector:
             if parsed:
                 all_data.append(parsed)
             
-            time.sleep(1)
+            time.sleep(self.request_interval)
         
         return pd.DataFrame(all_data)
     
-    def save_data(self, df: pd.DataFrame, filepath: str = "data/raw/aqi_data.csv"):
-        """Save data to CSV"""
-        os.makedirs(os.path.dirname(filepath), exist_ok=True)
+    async def fetch_current_aqi_async(self, client: httpx.AsyncClient, limiter: TokenBucket,
+                                      semaphore: asyncio.Semaphore, lat: float, lon: float) -> Optional[Dict]:
+        """Fetch current air quality data with rate limiting and jittered retries"""
+        params = {"lat": lat, "lon": lon, "appid": self.api_key}
         
-        if os.path.exists(filepath):
-            df.to_csv(filepath, mode='a', header=False, index=False)
-        else:
-            df.to_csv(filepath, index=False)
+        for attempt in range(self.max_retries + 1):
+            async with semaphore:
+                await limiter.acquire()
+                try:
+                    response = await client.get(self.base_url, params=params)
+                    if response.status_code not in RETRY_STATUS_CODES:
+                        response.raise_for_status()
+                        return response.json()
+                    error = f"HTTP {response.status_code}"
+                except httpx.TransportError as e:
+                    error = e
+                except Exception as e:
+                    print(f"Error fetching data: {e}")
+                    return None
+            
+            if attempt < self.max_retries:
+                # Full jitter: spread retries out so they don't arrive in lockstep
+                await asyncio.sleep(random.uniform(0, self.backoff_base * 2 ** attempt))
+        
+        print(f"Error fetching data after {self.max_retries + 1} attempts: {error}")
+        return None
+    
+    async def collect_all_cities_async(self) -> pd.DataFrame:
+        """Collect data for all cities concurrently over a shared connection pool"""
+        limiter = TokenBucket(self.rate_limit)
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        limits = httpx.Limits(
+            max_connections=self.max_concurrency,
+            max_keepalive_connections=self.max_concurrency
+        )
+        
+        async with httpx.AsyncClient(limits=limits, timeout=10) as client:
+            results = await asyncio.gather(*[
+                self.fetch_current_aqi_async(client, limiter, semaphore, coords['lat'], coords['lon'])
+                for coords in self.cities.values()
+            ])
+        
+        all_data = []
+        for city, data in zip(self.cities, results):
+            parsed = self.parse_aqi_data(data, city)
+            if parsed:
+                all_data.append(parsed)
+        
+        print(f"Fetched data for {len(all_data)}/{len(self.cities)} cities")
+        return pd.DataFrame(all_data)
+    
+    def collect_all_cities_concurrent(self) -> pd.DataFrame:
+        """Blocking wrapper around collect_all_cities_async"""
+        return asyncio.run(self.collect_all_cities_async())
+    
+    def save_data(self, df: pd.DataFrame, filepath: str = RAW_DATA_PATH):
+        """Append data to the raw CSV file or Parquet dataset"""
+        save_frame(df, filepath, append=True)
         
         print(f"✅ Data saved to {filepath}")
 
 if __name__ == "__main__":
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="Collect current air quality data")
+    parser.add_argument("--sequential", action="store_true", help="Fetch one city at a time")
+    args = parser.parse_args()
+    
     collector = AirQualityDataCollector()
-    df = collector.collect_all_cities()
+    metrics = JobMetrics("collection")
+    with metrics.stage("fetch"):
+        if args.sequential:
+            df = collector.collect_all_cities()
+        else:
+            df = collector.collect_all_cities_concurrent()
+    metrics.count("fetch", len(df))
     print(df.head())
-    collector.save_data(df)
+    with metrics.stage("save"):
+        collector.save_data(df)
+    metrics.export(success=not df.empty)
@@ -0,0 +1,145 @@
+import io
+import uuid
+from typing import List, Sequence
+
+import pandas as pd
+
+# Rows per COPY / executemany batch; keeps the in-memory CSV buffer bounded
+CHUNK_ROWS = 100_000
+
+
+def _sql_type(dtype, dialect: str) -> str:
+    if pd.api.types.is_bool_dtype(dtype):
+        return "BOOLEAN"
+    if pd.api.types.is_integer_dtype(dtype):
+        return "BIGINT"
+    if pd.api.types.is_float_dtype(dtype):
+        return "DOUBLE PRECISION" if dialect == "postgresql" else "REAL"
+    if pd.api.types.is_datetime64_any_dtype(dtype):
+        return "TIMESTAMP"
+    return "TEXT"
+
+
+def _quote(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+class FeatureTableWriter:
+    """Upserts feature rows into a table keyed on (city, timestamp).
+
+    On PostgreSQL rows are streamed with COPY FROM STDIN into a temporary
+    staging table and merged with INSERT ... ON CONFLICT. Other databases
+    (e.g. SQLite as a local stand-in) fill the staging table with executemany.
+    Readers are never locked out by a table rewrite.
+    """
+
+    def __init__(self, engine, table_name: str = "aqi_features", key_cols: Sequence[str] = ('city', 'timestamp')):
+        self.engine = engine
+        self.table_name = table_name
+        self.key_cols = list(key_cols)
+        self.dialect = engine.dialect.name
+
+    def ensure_table(self, df: pd.DataFrame) -> List[str]:
+        """Create the table and its indexes if needed; add any new columns. Returns the column list."""
+        from sqlalchemy import inspect
+
+        table = _quote(self.table_name)
+        inspector = inspect(self.engine)
+
+        with self.engine.begin() as conn:
+            if not inspector.has_table(self.table_name):
+                columns = ", ".join(f"{_quote(c)} {_sql_type(df[c].dtype, self.dialect)}" for c in df.columns)
+                conn.exec_driver_sql(f"CREATE TABLE {table} ({columns})")
+                existing = set()
+            else:
+                existing = {c['name'] for c in inspector.get_columns(self.table_name)}
+
+            for col in df.columns:
+                if existing and col not in existing:
+                    conn.exec_driver_sql(
+                        f"ALTER TABLE {table} ADD COLUMN {_quote(col)} {_sql_type(df[col].dtype, self.dialect)}"
+                    )
+
+            # Unique key for the upsert (also migrates tables created by to_sql),
+            # plus a time index for cross-city range scans
+            keys = ", ".join(_quote(c) for c in self.key_cols)
+            conn.exec_driver_sql(
+                f"CREATE UNIQUE INDEX IF NOT EXISTS {_quote(f'ux_{self.table_name}_key')} ON {table} ({keys})"
+            )
+            conn.exec_driver_sql(
+                f"CREATE INDEX IF NOT EXISTS {_quote(f'ix_{self.table_name}_timestamp')} ON {table} (\"timestamp\")"
+            )
+
+        return list(df.columns)
+
+    def _merge_sql(self, staging: str, columns: List[str]) -> str:
+        cols = ", ".join(_quote(c) for c in columns)
+        keys = ", ".join(_quote(c) for c in self.key_cols)
+        updates = ", ".join(f"{_quote(c)} = EXCLUDED.{_quote(c)}" for c in columns if c not in self.key_cols)
+        conflict = f"DO UPDATE SET {updates}" if updates else "DO NOTHING"
+        # "WHERE true" keeps SQLite from parsing ON CONFLICT as part of the SELECT
+        return (
+            f"INSERT INTO {_quote(self.table_name)} ({cols}) SELECT {cols} FROM {staging} WHERE true "
+            f"ON CONFLICT ({keys}) {conflict}"
+        )
+
+    def write(self, df: pd.DataFrame) -> int:
+        """Upsert all rows of df; returns the number of rows written"""
+        if df.empty:
+            return 0
+
+        # Later rows win when a batch repeats a key, matching ON CONFLICT DO UPDATE order
+        df = df.drop_duplicates(self.key_cols, keep='last')
+        columns = self.ensure_table(df)
+
+        if self.dialect == "postgresql":
+            self._write_copy(df, columns)
+        else:
+            self._write_executemany(df, columns)
+        return len(df)
+
+    def _write_copy(self, df: pd.DataFrame, columns: List[str]):
+        staging = _quote(f"{self.table_name}_staging_{uuid.uuid4().hex[:8]}")
+        cols = ", ".join(_quote(c) for c in columns)
+
+        raw = self.engine.raw_connection()
+        try:
+            cur = raw.cursor()
+            cur.execute(
+                f"CREATE TEMP TABLE {staging} (LIKE {_quote(self.table_name)} INCLUDING DEFAULTS) ON COMMIT DROP"
+            )
+            for start in range(0, len(df), CHUNK_ROWS):
+                buffer = io.StringIO()
+                df.iloc[start:start + CHUNK_ROWS].to_csv(buffer, index=False, header=False)
+                buffer.seek(0)
+                cur.copy_expert(f"COPY {staging} ({cols}) FROM STDIN WITH (FORMAT csv)", buffer)
+            cur.execute(self._merge_sql(staging, columns))
+            raw.commit()
+        except Exception:
+            raw.rollback()
+            raise
+        finally:
+            raw.close()
+
+    def _write_executemany(self, df: pd.DataFrame, columns: List[str]):
+        staging = _quote(f"{self.table_name}_staging_{uuid.uuid4().hex[:8]}")
+        cols = ", ".join(_quote(c) for c in columns)
+        marker = "?" if self.engine.dialect.paramstyle == "qmark" else "%s"
+        placeholders = ", ".join(marker for _ in columns)
+
+        with self.engine.begin() as conn:
+            conn.exec_driver_sql(
+                f"CREATE TEMP TABLE {staging} AS SELECT {cols} FROM {_quote(self.table_name)} WHERE 1 = 0"
+            )
+            for start in range(0, len(df), CHUNK_ROWS):
+                chunk = df.iloc[start:start + CHUNK_ROWS]
+                values = {}
+                for col in columns:
+                    series = chunk[col]
+                    if pd.api.types.is_datetime64_any_dtype(series.dtype):
+                        series = series.dt.strftime('%Y-%m-%d %H:%M:%S.%f')
+                    values[col] = series.astype(object).where(series.notna(), None)
+                rows = list(zip(*(values[col].tolist() for col in columns)))
+                conn.exec_driver_sql(f"INSERT INTO {staging} ({cols}) VALUES ({placeholders})", rows)
+            conn.exec_driver_sql(self._merge_sql(staging, columns))
+            conn.exec_driver_sql(f"DROP TABLE {staging}")
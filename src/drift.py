@@ -0,0 +1,189 @@
+import json
+import os
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+# Features whose distributions are tracked
+DRIFT_FEATURES = ['pm2_5', 'pm10', 'no2', 'so2', 'o3', 'co', 'health_risk_score']
+
+# Quantile bins per feature; equal-mass bins keep PSI sensitive across the range
+N_BINS = 20
+
+# Reference rows kept in the profile for full (Evidently) reports
+PROFILE_SAMPLE_ROWS = 1000
+
+# PSI above 0.2 is the usual "significant shift" rule of thumb
+PSI_THRESHOLD = 0.2
+KS_THRESHOLD = 0.1
+
+# Fewer current rows than this leave most bins with a handful of counts, so
+# PSI and KS cross their thresholds on clean data; scores below it never alarm
+MIN_WINDOW_ROWS = 20 * N_BINS
+
+# Floor for empty bins so PSI stays finite
+_EPSILON = 1e-4
+
+
+def _reservoir_update(sample: pd.DataFrame, seen: int, chunk: pd.DataFrame, size: int,
+                      rng: np.random.Generator) -> pd.DataFrame:
+    """Reservoir-sample `size` rows over a stream; `seen` is the row count before this chunk"""
+    if len(sample) < size:
+        take = chunk.iloc[:size - len(sample)]
+        sample = pd.concat([sample, take], ignore_index=True)
+        chunk = chunk.iloc[len(take):]
+        seen += len(take)
+    if chunk.empty:
+        return sample
+    # Row i of the stream replaces a random slot with probability size / (i + 1)
+    positions = seen + np.arange(1, len(chunk) + 1)
+    slots = (rng.random(len(chunk)) * positions).astype(np.int64)
+    keep = np.flatnonzero(slots < size)
+    sample = sample.copy()
+    sample.iloc[slots[keep]] = chunk.iloc[keep].to_numpy()
+    return sample
+
+
+def bin_counts(values: np.ndarray, edges: np.ndarray) -> np.ndarray:
+    """Counts per bin (len(edges) + 1 bins, then a final bin for NaN)"""
+    values = np.asarray(values, dtype=np.float64)
+    missing = np.isnan(values)
+    bins = np.searchsorted(edges, values[~missing], side='right')
+    counts = np.bincount(bins, minlength=len(edges) + 1)
+    return np.append(counts, missing.sum())
+
+
+def psi(expected: np.ndarray, actual: np.ndarray) -> float:
+    """Population stability index between two count vectors over the same bins"""
+    e = np.maximum(expected / max(expected.sum(), 1), _EPSILON)
+    a = np.maximum(actual / max(actual.sum(), 1), _EPSILON)
+    return float(np.sum((a - e) * np.log(a / e)))
+
+
+def binned_ks(expected: np.ndarray, actual: np.ndarray) -> float:
+    """Largest gap between the two binned CDFs; bin width bounds the error against exact KS"""
+    e = np.cumsum(expected) / max(expected.sum(), 1)
+    a = np.cumsum(actual) / max(actual.sum(), 1)
+    return float(np.max(np.abs(a - e)))
+
+
+class ReferenceProfile:
+    """Per-feature quantile bins and counts of the reference data, plus a small row sample.
+
+    Built once by streaming the reference in chunks (two passes: a reservoir
+    sample fixes the bin edges, then every row is counted) and stored as
+    JSON, so drift checks never touch the reference data again.
+    """
+
+    def __init__(self, edges: Dict[str, np.ndarray], counts: Dict[str, np.ndarray], rows: int,
+                 sample: pd.DataFrame):
+        self.edges = edges
+        self.counts = counts
+        self.rows = rows
+        self.sample = sample
+
+    @property
+    def features(self) -> List[str]:
+        return list(self.edges)
+
+    @classmethod
+    def build(cls, chunks, features: List[str] = DRIFT_FEATURES, n_bins: int = N_BINS,
+              sample_rows: int = PROFILE_SAMPLE_ROWS, edge_sample_rows: int = 100_000, seed: int = 42):
+        """Build from a zero-argument callable returning an iterator of DataFrame chunks (read twice)"""
+        rng = np.random.default_rng(seed)
+        edge_sample = pd.DataFrame(columns=features, dtype=np.float64)
+        seen = 0
+        for chunk in chunks():
+            edge_sample = _reservoir_update(edge_sample, seen, chunk[features].astype(np.float64),
+                                            edge_sample_rows, rng)
+            seen += len(chunk)
+
+        quantiles = np.linspace(0, 1, n_bins + 1)[1:-1]
+        edges = {
+            col: np.unique(np.nanquantile(edge_sample[col].to_numpy(dtype=np.float64), quantiles))
+            for col in features
+        }
+
+        counts = {col: np.zeros(len(edges[col]) + 2, dtype=np.int64) for col in features}
+        for chunk in chunks():
+            for col in features:
+                counts[col] += bin_counts(chunk[col].to_numpy(dtype=np.float64), edges[col])
+
+        sample = edge_sample.sample(n=min(sample_rows, len(edge_sample)), random_state=seed)
+        return cls(edges, counts, seen, sample.reset_index(drop=True))
+
+    def save(self, path: str):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        data = {
+            "rows": self.rows,
+            "edges": {col: edges.tolist() for col, edges in self.edges.items()},
+            "counts": {col: counts.tolist() for col, counts in self.counts.items()},
+            "sample": self.sample.to_dict(orient='list')
+        }
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, 'w') as f:
+            json.dump(data, f)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str):
+        with open(path) as f:
+            data = json.load(f)
+        return cls(
+            {col: np.asarray(edges) for col, edges in data["edges"].items()},
+            {col: np.asarray(counts, dtype=np.int64) for col, counts in data["counts"].items()},
+            data["rows"],
+            pd.DataFrame(data["sample"])
+        )
+
+
+class DriftMonitor:
+    """Accumulates bin counts of current batches and scores them against a reference profile.
+
+    `update` costs one searchsorted per feature and batch; `scores` works on
+    the bin counts only, so both take milliseconds whatever the data size.
+    A reservoir of current rows is kept for full reports. Nothing counts as
+    drift until the window holds `min_rows` rows.
+    """
+
+    def __init__(self, profile: ReferenceProfile, psi_threshold: float = PSI_THRESHOLD,
+                 ks_threshold: float = KS_THRESHOLD, sample_rows: int = PROFILE_SAMPLE_ROWS, seed: int = 42,
+                 min_rows: int = MIN_WINDOW_ROWS):
+        self.profile = profile
+        self.psi_threshold = psi_threshold
+        self.ks_threshold = ks_threshold
+        self.min_rows = min_rows
+        self.sample_rows = sample_rows
+        self._rng = np.random.default_rng(seed)
+        self.reset()
+
+    def reset(self):
+        """Start a new current window"""
+        self.counts = {col: np.zeros_like(counts) for col, counts in self.profile.counts.items()}
+        self.rows = 0
+        self.sample = pd.DataFrame(columns=self.profile.features, dtype=np.float64)
+
+    def update(self, batch: pd.DataFrame):
+        """Add a batch of current rows to the window"""
+        features = self.profile.features
+        for col in features:
+            self.counts[col] += bin_counts(batch[col].to_numpy(dtype=np.float64), self.profile.edges[col])
+        self.sample = _reservoir_update(self.sample, self.rows, batch[features].astype(np.float64),
+                                        self.sample_rows, self._rng)
+        self.rows += len(batch)
+
+    def scores(self) -> Dict[str, Dict[str, float]]:
+        """PSI and binned KS per feature, with whether either crosses its threshold (never below `min_rows`)"""
+        result = {}
+        enough = self.rows >= self.min_rows
+        for col in self.profile.features:
+            reference, current = self.profile.counts[col], self.counts[col]
+            p, ks = psi(reference, current), binned_ks(reference, current)
+            result[col] = {"psi": p, "ks": ks, "drift": enough and (p > self.psi_threshold or ks > self.ks_threshold)}
+        return result
+
+    def drifted(self, scores: Optional[Dict[str, Dict[str, float]]] = None) -> List[str]:
+        """Features whose scores cross a threshold"""
+        scores = scores or self.scores()
+        return [col for col, score in scores.items() if score["drift"]]
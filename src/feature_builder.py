@@ -0,0 +1,142 @@
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import numpy as np
+
+# Feature order used to train and serve the model
+FEATURE_COLS = [
+    'pm2_5', 'pm10', 'no2', 'so2', 'o3', 'co',
+    'hour', 'day_of_week', 'month', 'is_weekend', 'is_rush_hour',
+    'pm_ratio', 'health_risk_score',
+    'pm2_5_lag_1h', 'pm2_5_lag_24h', 'pm2_5_rolling_mean_24h',
+    'aqi_lag_1h', 'aqi_lag_24h'
+]
+
+LAG_FEATURE_COLS = [
+    'pm2_5_lag_1h', 'pm2_5_lag_24h', 'pm2_5_rolling_mean_24h',
+    'aqi_lag_1h', 'aqi_lag_24h'
+]
+
+RUSH_HOURS = (7, 8, 9, 17, 18, 19)
+WEEKEND_DAYS = (5, 6)
+
+# Used when no history is available for a city
+DEFAULT_AQI_LAG = 50.0
+
+
+def default_lags(pm2_5) -> Dict[str, float]:
+    """Placeholder lag features for a city without history"""
+    return {
+        'pm2_5_lag_1h': pm2_5,
+        'pm2_5_lag_24h': pm2_5,
+        'pm2_5_rolling_mean_24h': pm2_5,
+        'aqi_lag_1h': DEFAULT_AQI_LAG,
+        'aqi_lag_24h': DEFAULT_AQI_LAG
+    }
+
+
+def pm_ratio(pm2_5, pm10):
+    """PM2.5 / PM10 ratio; works on scalars, arrays and Series"""
+    return pm2_5 / (pm10 + 1)
+
+
+def health_risk_score(pm2_5, pm10, no2, o3, so2):
+    """Health risk score (0-100); works on scalars, arrays and Series"""
+    score = (
+        (pm2_5 / 150 * 40) +
+        (pm10 / 250 * 30) +
+        (no2 / 200 * 15) +
+        (o3 / 180 * 10) +
+        (so2 / 100 * 5)
+    )
+    if np.ndim(score) == 0:
+        return min(max(score, 0.0), 100.0)
+    return score.clip(0, 100)
+
+
+class FeatureVectorBuilder:
+    """Writes model features straight into a float32 array in a fixed column order"""
+
+    def __init__(self, feature_cols: Optional[List[str]] = None):
+        self.feature_cols = list(feature_cols or FEATURE_COLS)
+        unknown = set(self.feature_cols) - set(FEATURE_COLS)
+        if unknown:
+            raise ValueError(f"Unknown feature columns: {sorted(unknown)}")
+
+        self.n_features = len(self.feature_cols)
+        position = {col: i for i, col in enumerate(self.feature_cols)}
+        # Target slot for every canonical feature (None when the model does not use it)
+        self._slots = [position.get(col) for col in FEATURE_COLS]
+        self._local = threading.local()
+
+    def slot(self, col: str) -> int:
+        """Column index of a feature in the output vector"""
+        return self.feature_cols.index(col)
+
+    def _buffer(self) -> np.ndarray:
+        buffer = getattr(self._local, 'buffer', None)
+        if buffer is None:
+            buffer = np.empty((1, self.n_features), dtype=np.float32)
+            self._local.buffer = buffer
+        return buffer
+
+    def build(self, pm2_5: float, pm10: float, no2: float, so2: float, o3: float, co: float,
+              hour: int, day_of_week: int, month: Optional[int] = None,
+              lags: Optional[Dict[str, float]] = None, out: Optional[np.ndarray] = None) -> np.ndarray:
+        """Build a (1, n_features) float32 row without pandas.
+
+        The default output is a per-thread buffer that is overwritten by the next call.
+        """
+        if out is None:
+            out = self._buffer()
+        if month is None:
+            month = datetime.now().month
+
+        if lags is None:
+            lags = default_lags(pm2_5)
+        lag_values = tuple(lags[col] for col in LAG_FEATURE_COLS)
+
+        values = (
+            pm2_5, pm10, no2, so2, o3, co,
+            hour, day_of_week, month,
+            1 if day_of_week in WEEKEND_DAYS else 0,
+            1 if hour in RUSH_HOURS else 0,
+            pm_ratio(pm2_5, pm10),
+            health_risk_score(pm2_5, pm10, no2, o3, so2),
+        ) + lag_values
+
+        row = out[0]
+        for slot, value in zip(self._slots, values):
+            if slot is not None:
+                row[slot] = value
+        return out
+
+    def build_matrix(self, pm2_5: np.ndarray, pm10: np.ndarray, no2: np.ndarray, so2: np.ndarray,
+                     o3: np.ndarray, co: np.ndarray, hour: np.ndarray, day_of_week: np.ndarray,
+                     month: Optional[np.ndarray] = None, lags: Optional[Dict[str, np.ndarray]] = None,
+                     out: Optional[np.ndarray] = None) -> np.ndarray:
+        """Build an (n, n_features) float32 matrix from column arrays"""
+        n = len(pm2_5)
+        if out is None:
+            out = np.empty((n, self.n_features), dtype=np.float32)
+        if month is None:
+            month = datetime.now().month
+
+        if lags is None:
+            lags = default_lags(pm2_5)
+        lag_values = tuple(lags[col] for col in LAG_FEATURE_COLS)
+
+        values = (
+            pm2_5, pm10, no2, so2, o3, co,
+            hour, day_of_week, month,
+            np.isin(day_of_week, WEEKEND_DAYS),
+            np.isin(hour, RUSH_HOURS),
+            pm_ratio(pm2_5, pm10),
+            health_risk_score(pm2_5, pm10, no2, o3, so2),
+        ) + lag_values
+
+        for slot, value in zip(self._slots, values):
+            if slot is not None:
+                out[:, slot] = value
+        return out
@@ -1,87 +1,113 @@
 import pandas as pd
 import numpy as np
 from datetime import datetime
-from sqlalchemy import create_engine
-import redis
+from functools import cached_property
 import json
 import os
 from dotenv import load_dotenv
 
+try:
+    from src.feature_builder import RUSH_HOURS, WEEKEND_DAYS, pm_ratio, health_risk_score
+    from src.cache_codec import LATEST_CHANNEL, LATEST_TTL_SECONDS, LATEST_VERSION_KEY, POLLUTION_LEVELS, encode_latest, encode_update, latest_key
+    from src.db_writer import FeatureTableWriter
+    from src.feature_store import LAG_SOURCE_COLS, ROLLING_WINDOW, OnlineFeatureStore
+    from src.forecasting import ForecastState, load_forecaster, write_forecasts
+    from src.lag_engine import add_lag_features, sort_groups
+    from src.metrics import JobMetrics
+    from src.rollups import ROLLUP_FIELDS, refresh_start, write_rollups
+    from src.settings import connect_database, connect_redis
+    from src.storage import RAW_DATA_PATH, PROCESSED_DATA_PATH, load_frame, load_since, save_frame
+except ImportError:
+    from feature_builder import RUSH_HOURS, WEEKEND_DAYS, pm_ratio, health_risk_score
+    from cache_codec import LATEST_CHANNEL, LATEST_TTL_SECONDS, LATEST_VERSION_KEY, POLLUTION_LEVELS, encode_latest, encode_update, latest_key
+    from db_writer import FeatureTableWriter
+    from feature_store import LAG_SOURCE_COLS, ROLLING_WINDOW, OnlineFeatureStore
+    from forecasting import ForecastState, load_forecaster, write_forecasts
+    from lag_engine import add_lag_features, sort_groups
+    from metrics import JobMetrics
+    from rollups import ROLLUP_FIELDS, refresh_start, write_rollups
+    from settings import connect_database, connect_redis
+    from storage import RAW_DATA_PATH, PROCESSED_DATA_PATH, load_frame, load_since, save_frame
+
 load_dotenv()
 
+# Rows of history per city needed before the first new row so that the
+# 24h lag and rolling window match a full recompute. Lags are time-based and
+# there is at most one row per city-hour, so 24 rows always cover 24 hours.
+WARMUP_ROWS = 24
+
+# How far before the oldest high-water mark an incremental run reads from a
+# Parquet dataset; comfortably covers the 24 hours that new rows' lags and
+# rolling means can reach back to
+WARMUP_LOAD_HOURS = 48
+
 class FeatureEngineer:
     def __init__(self):
-        try:
-            self.db_engine = create_engine(os.getenv("DATABASE_URL"))
-            self.redis_client = redis.from_url(os.getenv("REDIS_URL"))
-        except Exception as e:
-            print(f"Warning: Database connection failed: {e}")
-            self.db_engine = None
-            self.redis_client = None
-    
-    def load_data(self, filepath: str = "data/raw/aqi_data.csv") -> pd.DataFrame:
-        """Load raw data"""
-        return pd.read_csv(filepath, parse_dates=['timestamp'])
+        # Stage durations and row counts of pipeline runs
+        self.metrics = JobMetrics("feature_engineering")
+    
+    # Connections are set up on first use (from DATABASE_URL and REDIS_URL), so
+    # runs that never reach a stage needing them don't pay for them
+    @cached_property
+    def db_engine(self):
+        return connect_database()
+    
+    @cached_property
+    def redis_client(self):
+        return connect_redis()
+    
+    @cached_property
+    def feature_store(self) -> OnlineFeatureStore:
+        return OnlineFeatureStore(self.redis_client)
+    
+    def load_data(self, filepath: str = RAW_DATA_PATH, **filters) -> pd.DataFrame:
+        """Load raw data from a CSV file or a partitioned Parquet dataset"""
+        return load_frame(filepath, **filters)
     
     def create_time_features(self, df: pd.DataFrame) -> pd.DataFrame:
-        """Create time-based features"""
-        df = df.copy()
-        
+        """Create time-based features (in place)"""
         df['hour'] = df['timestamp'].dt.hour
         df['day_of_week'] = df['timestamp'].dt.dayofweek
         df['month'] = df['timestamp'].dt.month
-        df['is_weekend'] = df['day_of_week'].isin([5, 6]).astype(int)
-        df['is_rush_hour'] = df['hour'].isin([7, 8, 9, 17, 18, 19]).astype(int)
+        df['is_weekend'] = df['day_of_week'].isin(WEEKEND_DAYS).astype(int)
+        df['is_rush_hour'] = df['hour'].isin(RUSH_HOURS).astype(int)
         
         return df
     
     def create_pollution_features(self, df: pd.DataFrame) -> pd.DataFrame:
-        """Create pollution-related features"""
-        df = df.copy()
-        
+        """Create pollution-related features (in place)"""
         df['total_pollution'] = (
             df['pm2_5'] + df['pm10'] + 
             df['no2'] + df['so2'] + df['o3']
         )
         
-        df['pm_ratio'] = df['pm2_5'] / (df['pm10'] + 1)
+        df['pm_ratio'] = pm_ratio(df['pm2_5'], df['pm10'])
         
         df['pollution_level'] = pd.cut(
             df['pm2_5'],
             bins=[0, 12, 35, 55, 150, 1000],
-            labels=['Good', 'Moderate', 'Unhealthy_Sensitive', 'Unhealthy', 'Very_Unhealthy']
+            labels=list(POLLUTION_LEVELS)
         )
         
         return df
     
     def create_health_risk_score(self, df: pd.DataFrame) -> pd.DataFrame:
-        """Create health risk score (0-100)"""
-        df = df.copy()
-        
-        df['health_risk_score'] = (
-            (df['pm2_5'] / 150 * 40) +
-            (df['pm10'] / 250 * 30) +
-            (df['no2'] / 200 * 15) +
-            (df['o3'] / 180 * 10) +
-            (df['so2'] / 100 * 5)
-        ).clip(0, 100)
+        """Create health risk score (0-100, in place)"""
+        df['health_risk_score'] = health_risk_score(
+            df['pm2_5'], df['pm10'], df['no2'], df['o3'], df['so2']
+        )
         
         return df
     
     def create_lag_features(self, df: pd.DataFrame) -> pd.DataFrame:
-        """Create lag features for time series"""
-        df = df.copy()
-        df = df.sort_values(['city', 'timestamp'])
-        
-        for col in ['pm2_5', 'pm10', 'aqi']:
-            df[f'{col}_lag_1h'] = df.groupby('city')[col].shift(1)
-            df[f'{col}_lag_24h'] = df.groupby('city')[col].shift(24)
-            df[f'{col}_rolling_mean_24h'] = df.groupby('city')[col].rolling(24, min_periods=1).mean().reset_index(0, drop=True)
-        
-        return df
+        """Create hourly-grid lag features, flagging lags whose observation is missing"""
+        return add_lag_features(df, LAG_SOURCE_COLS, lags=(1, 24), window=ROLLING_WINDOW, freq="1h")
     
     def process_features(self, df: pd.DataFrame) -> pd.DataFrame:
         """Apply all feature engineering steps"""
+        # Sorting makes the one copy of the input; every step after it works in place
+        df = sort_groups(df)
+        
         print("Creating time features...")
         df = self.create_time_features(df)
         
@@ -92,61 +118,236 @@ class FeatureEngineer:
         df = self.create_health_risk_score(df)
         
         print("Creating lag features...")
+        base_cols = list(df.columns)
         df = self.create_lag_features(df)
         
-        df = df.dropna()
+        # Missing lags are flagged and left as NaN for the model; only rows
+        # with incomplete observations are dropped
+        df = df.dropna(subset=base_cols)
         
         return df
     
     def save_to_postgres(self, df: pd.DataFrame, table_name: str = "aqi_features"):
-        """Save features to PostgreSQL"""
+        """Upsert features into PostgreSQL keyed on (city, timestamp)"""
         if self.db_engine:
             try:
-                df.to_sql(table_name, self.db_engine, if_exists='replace', index=False)
-                print(f"✅ Features saved to PostgreSQL table: {table_name}")
+                rows = FeatureTableWriter(self.db_engine, table_name).write(df)
+                print(f"✅ {rows} feature rows upserted into PostgreSQL table: {table_name}")
             except Exception as e:
                 print(f"Warning: Could not save to PostgreSQL: {e}")
     
+    def save_rollups(self, df: pd.DataFrame):
+        """Upsert hourly/daily/weekly aggregates of df's buckets for the history API"""
+        if self.db_engine:
+            try:
+                counts = write_rollups(self.db_engine, df)
+                print(f"✅ Rollups updated: {', '.join(f'{rows} {name}' for name, rows in counts.items())}")
+            except Exception as e:
+                print(f"Warning: Could not update rollups: {e}")
+    
     def save_to_redis(self, df: pd.DataFrame):
-        """Save latest features to Redis"""
+        """Save latest features to Redis and publish them to live streams in one pipelined round trip"""
         if self.redis_client:
             try:
                 latest_data = df.groupby('city').tail(1)
+                payloads = encode_latest(latest_data)
                 
-                for _, row in latest_data.iterrows():
-                    key = f"aqi:latest:{row['city']}"
-                    value = row.to_dict()
-                    value['timestamp'] = str(value['timestamp'])
-                    
-                    self.redis_client.setex(key, 3600, json.dumps(value, default=str))
+                pipe = self.redis_client.pipeline(transaction=False)
+                for city, payload in payloads.items():
+                    pipe.set(latest_key(city), payload, ex=LATEST_TTL_SECONDS)
+                pipe.incr(LATEST_VERSION_KEY)
+                # Published after the writes, so a client that then reads /api/current sees the same values
+                for city, payload in payloads.items():
+                    pipe.publish(LATEST_CHANNEL, encode_update(city, payload))
+                pipe.execute()
                 
-                print(f"✅ Latest features cached in Redis for {len(latest_data)} cities")
+                print(f"✅ Latest features cached in Redis for {len(payloads)} cities")
             except Exception as e:
                 print(f"Warning: Could not save to Redis: {e}")
     
-    def run_pipeline(self, input_path: str = "data/raw/aqi_data.csv"):
+    def save_forecasts(self, df: pd.DataFrame):
+        """Precompute every city's multi-hour AQI forecast from its latest hours and cache it in Redis"""
+        if self.redis_client:
+            try:
+                forecaster = load_forecaster()
+                if forecaster is None:
+                    print("No exported model found. Skipping forecasts.")
+                    return
+                state = ForecastState.from_features(df)
+                write_forecasts(self.redis_client, state, forecaster.forecast(state), forecaster.version)
+                print(f"✅ {forecaster.horizon}h forecasts cached in Redis for {len(state)} cities")
+            except Exception as e:
+                print(f"Warning: Could not save forecasts: {e}")
+    
+    def save_to_feature_store(self, df: pd.DataFrame):
+        """Refresh per-city observation buffers used for serve-time lag features"""
+        buffers = self.feature_store.write_history(df)
+        print(f"✅ Feature store updated for {len(buffers)} cities")
+    
+    def load_state(self, state_path: str = "data/processed/feature_state.json") -> dict:
+        """Load per-city high-water-mark timestamps of processed raw data"""
+        if not os.path.exists(state_path):
+            return {}
+        with open(state_path) as f:
+            return {city: pd.Timestamp(ts) for city, ts in json.load(f).items()}
+    
+    def save_state(self, df: pd.DataFrame, state: dict = None,
+                   state_path: str = "data/processed/feature_state.json"):
+        """Advance per-city high-water marks to the latest raw timestamps in df"""
+        state = dict(state or {})
+        for city, ts in df.groupby('city')['timestamp'].max().items():
+            state[city] = max(ts, state[city]) if city in state else ts
+        
+        os.makedirs(os.path.dirname(state_path), exist_ok=True)
+        with open(state_path, 'w') as f:
+            json.dump({city: ts.isoformat() for city, ts in state.items()}, f, indent=2)
+        return state
+    
+    def split_new_rows(self, df: pd.DataFrame, state: dict):
+        """Select rows newer than each city's high-water mark plus a warm-up window.
+        
+        Returns the rows to process and a boolean mask marking the new ones.
+        Rows at or before the high-water mark that arrive late are ignored.
+        """
+        hwm = df['city'].map(state)
+        is_new = hwm.isna() | (df['timestamp'] > hwm)
+        
+        old = df[~is_new].sort_values(['city', 'timestamp'])
+        warmup = old.groupby('city').tail(WARMUP_ROWS)
+        new = df[is_new]
+        
+        batch = pd.concat([warmup, new])
+        new_mask = np.r_[np.zeros(len(warmup), dtype=bool), np.ones(len(new), dtype=bool)]
+        return batch, new_mask
+    
+    def process_new_features(self, df: pd.DataFrame, state: dict) -> pd.DataFrame:
+        """Compute features for rows newer than the high-water marks only.
+        
+        Returns every processed row of the batch (warm-up included) with an
+        'is_new' column marking the rows that were not processed before.
+        """
+        batch, new_mask = self.split_new_rows(df, state)
+        batch = batch.assign(is_new=new_mask)
+        return self.process_features(batch)
+    
+    def run_pipeline(self, input_path: str = RAW_DATA_PATH, incremental: bool = False):
         """Run complete feature engineering pipeline"""
+        if incremental:
+            return self.run_incremental_pipeline(input_path)
+        
+        metrics = self.metrics
+        
         print("Loading data...")
-        df = self.load_data(input_path)
+        with metrics.stage("load"):
+            df = self.load_data(input_path)
+        metrics.count("load", len(df))
         
         print("Processing features...")
-        df_processed = self.process_features(df)
+        with metrics.stage("process"):
+            df_processed = self.process_features(df)
+        metrics.count("process", len(df_processed))
         
         print("Saving to PostgreSQL...")
-        self.save_to_postgres(df_processed)
+        with metrics.stage("postgres"):
+            self.save_to_postgres(df_processed)
         
         print("Caching in Redis...")
-        self.save_to_redis(df_processed)
+        with metrics.stage("redis"):
+            self.save_to_redis(df_processed)
+        
+        print("Updating online feature store...")
+        with metrics.stage("feature_store"):
+            self.save_to_feature_store(df_processed)
         
-        output_path = "data/processed/aqi_features.csv"
-        os.makedirs(os.path.dirname(output_path), exist_ok=True)
-        df_processed.to_csv(output_path, index=False)
+        output_path = PROCESSED_DATA_PATH
+        with metrics.stage("save"):
+            save_frame(df_processed, output_path)
         print(f"✅ Processed data saved to {output_path}")
         
+        with metrics.stage("rollups"):
+            self.save_rollups(df_processed)
+        
+        print("Forecasting...")
+        with metrics.stage("forecast"):
+            self.save_forecasts(df_processed)
+        
+        self.save_state(df)
+        metrics.export()
+        
         return df_processed
+    
+    def run_incremental_pipeline(self, input_path: str = RAW_DATA_PATH):
+        """Process only raw rows newer than the last run and append their features"""
+        output_path = PROCESSED_DATA_PATH
+        state = self.load_state()
+        
+        if not state or not os.path.exists(output_path):
+            print("No previous run found, running full pipeline...")
+            return self.run_pipeline(input_path)
+        
+        metrics = self.metrics
+        
+        print("Loading data...")
+        # Parquet datasets only read partitions near the high-water marks
+        since = min(state.values()) - pd.Timedelta(hours=WARMUP_LOAD_HOURS)
+        with metrics.stage("load"):
+            df = load_since(input_path, since, list(state))
+        metrics.count("load", len(df))
+        
+        print("Processing new rows...")
+        with metrics.stage("process"):
+            batch = self.process_new_features(df, state)
+        is_new = batch.pop('is_new').to_numpy(dtype=bool)
+        df_new = batch[is_new]
+        metrics.count("process", len(df_new))
+        
+        if df_new.empty:
+            print("No new rows to process.")
+            metrics.export()
+            return df_new
+        
+        print("Saving to PostgreSQL...")
+        with metrics.stage("postgres"):
+            self.save_to_postgres(df_new)
+        
+        print("Caching in Redis...")
+        with metrics.stage("redis"):
+            self.save_to_redis(df_new)
+        
+        print("Updating online feature store...")
+        with metrics.stage("feature_store"):
+            self.save_to_feature_store(batch)
+        
+        with metrics.stage("save"):
+            save_frame(df_new, output_path, append=True)
+        print(f"✅ {len(df_new)} new rows appended to {output_path}")
+        
+        if self.db_engine:
+            # Only buckets the new rows fall in change; re-aggregate those from
+            # the stored features (at most a week per city)
+            with metrics.stage("rollups"):
+                window = load_frame(output_path, columns=['city', 'timestamp', *ROLLUP_FIELDS],
+                                    cities=df_new['city'].unique().tolist(), start=refresh_start(df_new['timestamp']))
+                self.save_rollups(window)
+        
+        print("Forecasting...")
+        # The warm-up rows carry the hours before the new ones that lags reach back to
+        with metrics.stage("forecast"):
+            self.save_forecasts(batch[batch['city'].isin(df_new['city'].unique())])
+        
+        self.save_state(df, state)
+        metrics.export()
+        
+        return df_new
 
 if __name__ == "__main__":
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="Run the feature engineering pipeline")
+    parser.add_argument("--incremental", action="store_true", help="Only process rows newer than the last run")
+    args = parser.parse_args()
+    
     engineer = FeatureEngineer()
-    df = engineer.run_pipeline()
+    df = engineer.run_pipeline(incremental=args.incremental)
     print(df.head())
     print(f"\nShape: {df.shape}")
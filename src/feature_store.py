@@ -0,0 +1,249 @@
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+# redis is imported only where a client is in use, so it is already loaded by then
+
+# Columns kept per city, mirroring FeatureEngineer.create_lag_features
+LAG_SOURCE_COLS = ('pm2_5', 'pm10', 'aqi')
+
+# lag_24h needs the observation 24 hours back, and a forecast's first step,
+# the latest stored hour itself, needs the one 24 hours before that; the
+# rolling mean covers the current observation plus the previous
+# ROLLING_WINDOW - 1 stored ones
+HISTORY_SIZE = 25
+ROLLING_WINDOW = 24
+
+# Buffer slots are hours; a gap between pushes is filled with NaN slots
+OBSERVATION_INTERVAL_SECONDS = 3600
+
+KEY_PREFIX = "aqi:fs:"
+KEY_TTL_SECONDS = 2 * 24 * 3600
+
+
+class CityBuffer:
+    """Ring buffer of the last HISTORY_SIZE hours of observations for one city.
+
+    Hours without an observation hold NaN, so lag k is the value k hours
+    back, as in the offline lag features. Running sums over the most recent ROLLING_WINDOW - 1 observations are kept
+    up to date on every push, so lags and the rolling mean are O(1) lookups.
+    """
+
+    _HEADER = 3  # head, count, last_timestamp
+
+    def __init__(self, n_cols: int = len(LAG_SOURCE_COLS), size: int = HISTORY_SIZE):
+        self.size = size
+        self.values = np.full((size, n_cols), np.nan)
+        self.head = 0
+        self.count = 0
+        self.last_timestamp = np.nan
+        self.sums = np.zeros(n_cols)
+        self.counts = np.zeros(n_cols)
+
+    def __len__(self):
+        return self.count
+
+    def lag(self, k: int) -> np.ndarray:
+        """Observation k steps back (k=1 is the latest); NaN when not available"""
+        if k < 1 or k > self.count:
+            return np.full(self.values.shape[1], np.nan)
+        return self.values[(self.head - k) % self.size]
+
+    def missed_steps(self, timestamp: float) -> int:
+        """Hours with no observation between the latest push and `timestamp` (epoch seconds)"""
+        if np.isnan(timestamp) or np.isnan(self.last_timestamp):
+            return 0
+        # Rounded to the nearest hour, like the offline hourly grid
+        step = np.floor(timestamp / OBSERVATION_INTERVAL_SECONDS + 0.5)
+        last = np.floor(self.last_timestamp / OBSERVATION_INTERVAL_SECONDS + 0.5)
+        return max(0, int(step - last) - 1)
+
+    def push(self, observation: Iterable[float], timestamp: float = np.nan):
+        """Append an observation, first filling any missed hours since the previous one with NaN"""
+        observation = np.asarray(observation, dtype=np.float64)
+        for _ in range(min(self.missed_steps(timestamp), self.size)):
+            self._append(np.full(observation.shape, np.nan))
+        self._append(observation)
+        self.last_timestamp = timestamp
+
+    def _append(self, observation: np.ndarray):
+        # The observation at age ROLLING_WINDOW - 1 falls out of the running window
+        leaving = self.lag(ROLLING_WINDOW - 1)
+        present = ~np.isnan(leaving)
+        self.sums[present] -= leaving[present]
+        self.counts[present] -= 1
+
+        present = ~np.isnan(observation)
+        self.sums[present] += observation[present]
+        self.counts[present] += 1
+
+        self.values[self.head] = observation
+        self.head = (self.head + 1) % self.size
+        self.count = min(self.count + 1, self.size)
+
+    @classmethod
+    def from_history(cls, history: np.ndarray, timestamps: Optional[np.ndarray] = None) -> "CityBuffer":
+        """Build a buffer from an (n, n_cols) array of observations and their epoch timestamps, oldest first"""
+        history = np.asarray(history, dtype=np.float64)
+        if timestamps is None:
+            timestamps = np.full(len(history), np.nan)
+        buffer = cls(history.shape[1])
+        for observation, timestamp in zip(history[-buffer.size:], timestamps[-buffer.size:]):
+            buffer.push(observation, timestamp)
+        return buffer
+
+    def rolling_mean(self, col: int, current: float) -> float:
+        """Mean of `current` and the previous ROLLING_WINDOW - 1 observations"""
+        total = self.sums[col]
+        count = self.counts[col]
+        if not np.isnan(current):
+            total += current
+            count += 1
+        return total / count if count else np.nan
+
+    def to_bytes(self) -> bytes:
+        header = np.array([self.head, self.count, self.last_timestamp])
+        return np.concatenate([header, self.sums, self.counts, self.values.ravel()]).tobytes()
+
+    @classmethod
+    def from_bytes(cls, data: bytes, n_cols: int = len(LAG_SOURCE_COLS)) -> "CityBuffer":
+        raw = np.frombuffer(data, dtype=np.float64)
+        h = cls._HEADER
+        buffer = cls(n_cols, (len(raw) - h - 2 * n_cols) // n_cols)
+        buffer.head = int(raw[0])
+        buffer.count = int(raw[1])
+        buffer.last_timestamp = raw[2]
+        buffer.sums = raw[h:h + n_cols].copy()
+        buffer.counts = raw[h + n_cols:h + 2 * n_cols].copy()
+        buffer.values = raw[h + 2 * n_cols:].reshape(buffer.size, n_cols).copy()
+        return buffer
+
+
+def lag_features(buffer: Optional[CityBuffer], pm2_5: float) -> Optional[Dict[str, float]]:
+    """Serve-time lag features for a request carrying the current pm2_5 reading.
+
+    The request is treated as the observation following the latest buffered one.
+    Returns None when there is no history for the city.
+    """
+    if buffer is None or len(buffer) == 0:
+        return None
+
+    pm2_5_col = LAG_SOURCE_COLS.index('pm2_5')
+    aqi_col = LAG_SOURCE_COLS.index('aqi')
+    lag_1h = buffer.lag(1)
+    lag_24h = buffer.lag(24)
+
+    return {
+        'pm2_5_lag_1h': lag_1h[pm2_5_col],
+        'pm2_5_lag_24h': lag_24h[pm2_5_col],
+        'pm2_5_rolling_mean_24h': buffer.rolling_mean(pm2_5_col, pm2_5),
+        'aqi_lag_1h': lag_1h[aqi_col],
+        'aqi_lag_24h': lag_24h[aqi_col]
+    }
+
+
+def history_buffers(df) -> Dict[str, CityBuffer]:
+    """Build every city's buffer from the last HISTORY_SIZE rows of a features DataFrame sorted by timestamp"""
+    buffers = {}
+    for city, group in df.groupby('city', sort=False):
+        recent = group.tail(HISTORY_SIZE)
+        buffers[city] = CityBuffer.from_history(
+            recent[list(LAG_SOURCE_COLS)].to_numpy(dtype=np.float64),
+            recent['timestamp'].to_numpy(dtype='datetime64[ns]').view(np.int64) / 1e9
+        )
+    return buffers
+
+
+class OnlineFeatureStore:
+    """Per-city observation buffers in Redis, with a local in-memory fallback"""
+
+    def __init__(self, redis_client=None):
+        self.redis_client = redis_client
+        self.local: Dict[str, CityBuffer] = {}
+
+    @staticmethod
+    def key(city: str) -> str:
+        return f"{KEY_PREFIX}{city}"
+
+    def decode_many(self, cities: List[str], raw: List[Optional[bytes]]) -> Dict[str, Optional[CityBuffer]]:
+        """Decode an MGET reply into buffers"""
+        return {
+            city: CityBuffer.from_bytes(data) if data else None
+            for city, data in zip(cities, raw)
+        }
+
+    def get_many(self, cities: List[str]) -> Dict[str, Optional[CityBuffer]]:
+        """Fetch buffers for several cities in one round trip"""
+        if self.redis_client is not None:
+            import redis
+            try:
+                raw = self.redis_client.mget([self.key(city) for city in cities])
+                return self.decode_many(cities, raw)
+            except redis.RedisError as e:
+                print(f"Warning: Feature store read failed, using local buffers: {e}")
+        return {city: self.local.get(city) for city in cities}
+
+    def put_many(self, buffers: Dict[str, CityBuffer]):
+        """Store buffers locally and in Redis with one pipelined round trip"""
+        self.local.update(buffers)
+        if self.redis_client is not None and buffers:
+            import redis
+            try:
+                pipe = self.redis_client.pipeline(transaction=False)
+                for city, buffer in buffers.items():
+                    pipe.set(self.key(city), buffer.to_bytes(), ex=KEY_TTL_SECONDS)
+                pipe.execute()
+            except redis.RedisError as e:
+                print(f"Warning: Feature store write failed: {e}")
+
+    def push(self, city: str, observation: Dict[str, float], timestamp: float = np.nan):
+        """Append one hourly observation for a city"""
+        buffer = self.get_many([city])[city] or CityBuffer()
+        buffer.push([observation[col] for col in LAG_SOURCE_COLS], timestamp)
+        self.put_many({city: buffer})
+
+    def write_history(self, df):
+        """Rebuild every city's buffer from a features DataFrame sorted by timestamp"""
+        buffers = history_buffers(df)
+        self.put_many(buffers)
+        return buffers
+
+
+class AsyncOnlineFeatureStore(OnlineFeatureStore):
+    """OnlineFeatureStore on a redis.asyncio client, for use from async handlers"""
+
+    async def get_many(self, cities: List[str]) -> Dict[str, Optional[CityBuffer]]:
+        """Fetch buffers for several cities in one round trip"""
+        if self.redis_client is not None:
+            import redis
+            try:
+                raw = await self.redis_client.mget([self.key(city) for city in cities])
+                return self.decode_many(cities, raw)
+            except redis.RedisError as e:
+                print(f"Warning: Feature store read failed, using local buffers: {e}")
+        return {city: self.local.get(city) for city in cities}
+
+    async def put_many(self, buffers: Dict[str, CityBuffer]):
+        """Store buffers locally and in Redis with one pipelined round trip"""
+        self.local.update(buffers)
+        if self.redis_client is not None and buffers:
+            import redis
+            try:
+                pipe = self.redis_client.pipeline(transaction=False)
+                for city, buffer in buffers.items():
+                    pipe.set(self.key(city), buffer.to_bytes(), ex=KEY_TTL_SECONDS)
+                await pipe.execute()
+            except redis.RedisError as e:
+                print(f"Warning: Feature store write failed: {e}")
+
+    async def push(self, city: str, observation: Dict[str, float], timestamp: float = np.nan):
+        """Append one hourly observation for a city"""
+        buffer = (await self.get_many([city]))[city] or CityBuffer()
+        buffer.push([observation[col] for col in LAG_SOURCE_COLS], timestamp)
+        await self.put_many({city: buffer})
+
+    async def write_history(self, df):
+        """Rebuild every city's buffer from a features DataFrame sorted by timestamp"""
+        buffers = history_buffers(df)
+        await self.put_many(buffers)
+        return buffers
@@ -0,0 +1,232 @@
+import os
+from typing import TYPE_CHECKING, Dict, List, Optional
+
+import numpy as np
+
+try:
+    from src.cache_codec import FORECAST_TTL_SECONDS, encode_forecast, forecast_key
+    from src.feature_store import LAG_SOURCE_COLS, ROLLING_WINDOW, CityBuffer
+    from src.model_registry import MODEL_DIR, LoadedModel, load_horizon_models, read_manifest
+except ImportError:
+    from cache_codec import FORECAST_TTL_SECONDS, encode_forecast, forecast_key
+    from feature_store import LAG_SOURCE_COLS, ROLLING_WINDOW, CityBuffer
+    from model_registry import MODEL_DIR, LoadedModel, load_horizon_models, read_manifest
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+# Hours ahead forecast for every city after each pipeline run
+FORECAST_HORIZON = int(os.getenv("FORECAST_HORIZON", 48))
+
+READING_COLS = ('pm2_5', 'pm10', 'no2', 'so2', 'o3', 'co')
+
+# Series kept per city and hour for lag features
+HISTORY_COLS = ('pm2_5', 'aqi')
+
+# The first step's row needs its own hour and the 24 before it
+HISTORY_HOURS = 25
+
+_HOUR = np.timedelta64(1, 'h')
+
+
+class ForecastState:
+    """Per-city starting point of a forecast: the latest observation and the hours before it.
+
+    `history[i, j]` holds HISTORY_COLS of city i at HISTORY_HOURS - 1 - j
+    hours before its latest observation (NaN for hours without one);
+    `readings` are the pollutant readings of that observation.
+    """
+
+    def __init__(self, cities: List[str], issued_at: np.ndarray, readings: Dict[str, np.ndarray],
+                 history: np.ndarray):
+        self.cities = list(cities)
+        self.issued_at = np.asarray(issued_at, dtype='datetime64[ns]')
+        self.readings = readings
+        self.history = history
+
+    def __len__(self):
+        return len(self.cities)
+
+    @classmethod
+    def from_features(cls, df: 'pd.DataFrame') -> "ForecastState":
+        """State of every city in a features frame (any row order; only each city's last 25 hours are used)"""
+        import pandas as pd
+        try:
+            from src.lag_engine import grid_steps
+        except ImportError:
+            from lag_engine import grid_steps
+
+        codes, cities = pd.factorize(df['city'], sort=True)
+        steps = grid_steps(df['timestamp'])
+        n = len(cities)
+
+        last_step = np.full(n, np.iinfo(np.int64).min)
+        np.maximum.at(last_step, codes, steps)
+        age = last_step[codes] - steps
+
+        history = np.full((n, HISTORY_HOURS, len(HISTORY_COLS)), np.nan)
+        recent = np.flatnonzero(age < HISTORY_HOURS)
+        history[codes[recent], HISTORY_HOURS - 1 - age[recent]] = (
+            df[list(HISTORY_COLS)].to_numpy(dtype=np.float64)[recent]
+        )
+
+        latest = np.empty(n, dtype=np.int64)
+        rows = np.flatnonzero(age == 0)
+        latest[codes[rows]] = rows
+        return cls(
+            list(cities),
+            df['timestamp'].to_numpy(dtype='datetime64[ns]')[latest],
+            {col: df[col].to_numpy(dtype=np.float64)[latest] for col in READING_COLS},
+            history
+        )
+
+    @classmethod
+    def from_buffers(cls, records: Dict[str, dict], buffers: Dict[str, Optional[CityBuffer]]) -> "ForecastState":
+        """State from /api/current records and feature store buffers, for cities without a precomputed forecast"""
+        def value(record, col):
+            number = record.get(col)
+            return np.nan if number is None else number
+
+        cities = list(records)
+        history = np.full((len(cities), HISTORY_HOURS, len(HISTORY_COLS)), np.nan)
+        cols = [LAG_SOURCE_COLS.index(col) for col in HISTORY_COLS]
+        for i, city in enumerate(cities):
+            buffer = buffers.get(city)
+            if buffer is None or len(buffer) == 0:
+                history[i, -1] = [value(records[city], col) for col in HISTORY_COLS]
+                continue
+            # lag(1) is the latest buffered hour, the one the record describes
+            for k in range(1, min(len(buffer), HISTORY_HOURS) + 1):
+                history[i, HISTORY_HOURS - k] = buffer.lag(k)[cols]
+
+        return cls(
+            cities,
+            np.array([records[city]['timestamp'] for city in cities], dtype='datetime64[ns]'),
+            {col: np.array([value(records[city], col) for city in cities], dtype=np.float64)
+             for col in READING_COLS},
+            history
+        )
+
+
+class Forecaster:
+    """AQI forecasts 1..horizon hours ahead for many cities at once.
+
+    The model predicts the next hour's AQI from the current readings and
+    lags. Pollutant readings are held at their latest values (persistence),
+    so every input except the AQI lags is known for all steps up front and
+    built into one matrix. Each step then fills in the AQI lags from the
+    previous steps' predictions and runs one batched prediction over all
+    cities. Direct models, trained for a given horizon on the latest
+    observation, replace the recursive value at their horizon.
+    """
+
+    def __init__(self, model: LoadedModel, horizon: int = FORECAST_HORIZON,
+                 direct: Optional[Dict[int, LoadedModel]] = None):
+        self.model = model
+        self.horizon = horizon
+        self.direct = {h: m for h, m in (direct or {}).items() if h <= horizon}
+
+    @property
+    def version(self) -> Optional[str]:
+        return self.model.version
+
+    def _inputs(self, state: ForecastState, horizon: int) -> dict:
+        """build_matrix arguments for every (step, city), step-major; AQI lags are left as NaN"""
+        n = len(state)
+        # pm2_5 by hour: observed history, then the latest reading held for every step
+        pm2_5 = np.empty((n, HISTORY_HOURS + horizon))
+        pm2_5[:, :HISTORY_HOURS] = state.history[:, :, HISTORY_COLS.index('pm2_5')]
+        pm2_5[:, HISTORY_HOURS:] = state.readings['pm2_5'][:, None]
+
+        # Step k's row is the hour HISTORY_HOURS - 1 + k of the series, k hours after the latest observation
+        current = slice(HISTORY_HOURS - 1, HISTORY_HOURS - 1 + horizon)
+        present = ~np.isnan(pm2_5)
+        sums = np.concatenate([np.zeros((n, 1)), np.cumsum(np.where(present, pm2_5, 0.0), axis=1)], axis=1)
+        counts = np.concatenate([np.zeros((n, 1)), np.cumsum(present, axis=1)], axis=1)
+        ends = np.arange(HISTORY_HOURS, HISTORY_HOURS + horizon)
+        window_sum = sums[:, ends] - sums[:, ends - ROLLING_WINDOW]
+        window_count = counts[:, ends] - counts[:, ends - ROLLING_WINDOW]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            rolling = np.where(window_count > 0, window_sum / window_count, np.nan)
+
+        times = (state.issued_at[None, :] + np.arange(horizon)[:, None] * _HOUR).ravel()
+        hours = times.astype('datetime64[h]').view(np.int64)
+        days = times.astype('datetime64[D]').view(np.int64)
+        step_major = lambda values: np.ascontiguousarray(values.T).ravel()
+        nan = np.full(n * horizon, np.nan)
+
+        return {
+            'pm2_5': step_major(pm2_5[:, current]),
+            **{col: np.tile(state.readings[col], horizon) for col in READING_COLS if col != 'pm2_5'},
+            'hour': hours % 24,
+            # 1970-01-01 was a Thursday; Monday is 0
+            'day_of_week': (days + 3) % 7,
+            'month': times.astype('datetime64[M]').view(np.int64) % 12 + 1,
+            'lags': {
+                'pm2_5_lag_1h': step_major(pm2_5[:, HISTORY_HOURS - 2:HISTORY_HOURS - 2 + horizon]),
+                'pm2_5_lag_24h': step_major(pm2_5[:, HISTORY_HOURS - 25:HISTORY_HOURS - 25 + horizon]),
+                'pm2_5_rolling_mean_24h': step_major(rolling),
+                'aqi_lag_1h': nan,
+                'aqi_lag_24h': nan
+            }
+        }
+
+    @staticmethod
+    def _slot(builder, col: str) -> Optional[int]:
+        return builder.slot(col) if col in builder.feature_cols else None
+
+    def forecast(self, state: ForecastState, horizon: Optional[int] = None) -> np.ndarray:
+        """(cities, horizon) array of predicted AQI, column h - 1 being h hours after each city's latest observation"""
+        horizon = horizon or self.horizon
+        n = len(state)
+        if n == 0:
+            return np.empty((0, horizon), dtype=np.float32)
+        inputs = self._inputs(state, horizon)
+        builder = self.model.feature_builder
+        X = builder.build_matrix(**inputs).reshape(horizon, n, builder.n_features)
+
+        # AQI by hour: observed history, then each step's prediction
+        aqi = np.full((n, HISTORY_HOURS + horizon), np.nan)
+        aqi[:, :HISTORY_HOURS] = state.history[:, :, HISTORY_COLS.index('aqi')]
+        lag_1h, lag_24h = self._slot(builder, 'aqi_lag_1h'), self._slot(builder, 'aqi_lag_24h')
+
+        for k in range(horizon):
+            row = HISTORY_HOURS - 1 + k
+            if lag_1h is not None:
+                X[k, :, lag_1h] = aqi[:, row - 1]
+            if lag_24h is not None:
+                X[k, :, lag_24h] = aqi[:, row - 24]
+            aqi[:, row + 1] = self.model.predictor.predict(X[k])
+
+        forecasts = aqi[:, HISTORY_HOURS:].astype(np.float32)
+        if self.direct:
+            # Direct models see the first step's row, with observed AQI lags
+            observed = {col: values[:n] for col, values in inputs.items() if col != 'lags'}
+            observed['lags'] = {col: values[:n] for col, values in inputs['lags'].items()}
+            observed['lags']['aqi_lag_1h'] = aqi[:, HISTORY_HOURS - 2]
+            observed['lags']['aqi_lag_24h'] = aqi[:, HISTORY_HOURS - 25]
+            for h, model in self.direct.items():
+                if h > horizon:
+                    continue
+                forecasts[:, h - 1] = model.predictor.predict(model.feature_builder.build_matrix(**observed))
+        return forecasts
+
+
+def load_forecaster(model_dir: str = MODEL_DIR, backend: str = 'xgboost',
+                    horizon: int = FORECAST_HORIZON) -> Optional[Forecaster]:
+    """A forecaster for the exported model and any per-horizon models next to it; None before the first export"""
+    manifest = read_manifest(model_dir)
+    if manifest is None:
+        return None
+    return Forecaster(LoadedModel.from_manifest(manifest, model_dir, backend), horizon,
+                      load_horizon_models(model_dir, backend))
+
+
+def write_forecasts(redis_client, state: ForecastState, forecasts: np.ndarray, model_version: Optional[str],
+                    ttl: int = FORECAST_TTL_SECONDS):
+    """Store each city's forecast in Redis with one pipelined round trip"""
+    issued_at = state.issued_at.astype('datetime64[ns]').view(np.int64) / 1e9
+    pipe = redis_client.pipeline(transaction=False)
+    for city, issued, values in zip(state.cities, issued_at, forecasts):
+        pipe.set(forecast_key(city), encode_forecast(issued, model_version, values), ex=ttl)
+    pipe.execute()
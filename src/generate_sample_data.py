@@ -1,67 +1,140 @@
 import pandas as pd
 import numpy as np
-from datetime import datetime, timedelta
-import os
-
-def generate_historical_data(days=30):
-    """Generate synthetic historical AQI data"""
-    
-    cities = {
-        "Lahore": {"base_pm25": 80, "variance": 30},
-        "Karachi": {"base_pm25": 60, "variance": 20},
-        "Islamabad": {"base_pm25": 50, "variance": 15},
-        "Faisalabad": {"base_pm25": 70, "variance": 25},
-        "Multan": {"base_pm25": 75, "variance": 28}
+from datetime import datetime
+from typing import Iterator, Optional
+
+try:
+    from src.feature_builder import RUSH_HOURS, WEEKEND_DAYS
+    from src.storage import RAW_DATA_PATH, save_frame
+except ImportError:
+    from feature_builder import RUSH_HOURS, WEEKEND_DAYS
+    from storage import RAW_DATA_PATH, save_frame
+
+# Named cities come first; further stations get random profiles
+CITY_PROFILES = {
+    "Lahore": {"base_pm25": 80, "variance": 30},
+    "Karachi": {"base_pm25": 60, "variance": 20},
+    "Islamabad": {"base_pm25": 50, "variance": 15},
+    "Faisalabad": {"base_pm25": 70, "variance": 25},
+    "Multan": {"base_pm25": 75, "variance": 28}
+}
+
+# (mean, standard deviation) of the gaseous pollutants, clipped at zero
+GAS_PROFILES = {
+    'co': (200, 50),
+    'no': (0.5, 0.2),
+    'no2': (20, 10),
+    'o3': (50, 20),
+    'so2': (10, 5),
+    'nh3': (5, 2)
+}
+
+COLUMNS = ['timestamp', 'city', 'aqi', 'co', 'no', 'no2', 'o3', 'so2', 'pm2_5', 'pm10', 'nh3']
+
+# Rows held in memory at once when streaming to disk
+CHUNK_ROWS = 1_000_000
+
+
+def time_grid(days: int = 30, freq: str = "1h", end: Optional[datetime] = None) -> pd.DatetimeIndex:
+    """Regular timestamps covering `days` days up to `end` (default: now, floored to freq)"""
+    end = pd.Timestamp(end) if end is not None else pd.Timestamp.now().floor(freq)
+    n_steps = int(pd.Timedelta(days=days) / pd.Timedelta(freq))
+    return pd.date_range(end=end, periods=n_steps, freq=freq)
+
+
+def generate_station(index: int, seq: np.random.SeedSequence, timestamps: pd.DatetimeIndex,
+                     rush_weekday: np.ndarray) -> dict:
+    """Columns for one station over the whole time grid, one Generator call per column"""
+    rng = np.random.default_rng(seq)
+    names = list(CITY_PROFILES)
+    if index < len(names):
+        city = names[index]
+        base, variance = CITY_PROFILES[city]["base_pm25"], CITY_PROFILES[city]["variance"]
+    else:
+        city = f"Station_{index:05d}"
+        base = rng.uniform(30, 120)
+        variance = base * rng.uniform(0.2, 0.4)
+
+    n = len(timestamps)
+    # Higher pollution in rush hours and on weekdays
+    pm25 = np.maximum(5, base * rush_weekday + rng.normal(0, variance, n))
+    pm10 = np.maximum(0, pm25 * 1.5 + rng.normal(0, 10, n))
+
+    columns = {
+        'timestamp': timestamps,
+        'city': np.full(n, city, dtype=object),
+        'aqi': np.clip((pm25 // 30).astype(np.int64) + 1, 1, 5),
+        'pm2_5': pm25,
+        'pm10': pm10
     }
-    
-    all_data = []
-    
-    print(f"Generating {days} days of data for {len(cities)} cities...")
-    
-    for city, params in cities.items():
-        for day in range(days):
-            for hour in range(24):
-                timestamp = datetime.now() - timedelta(days=days-day, hours=24-hour)
-                
-                # Add patterns: higher pollution in morning/evening rush hours
-                rush_hour_factor = 1.3 if hour in [7, 8, 9, 17, 18, 19] else 1.0
-                
-                # Add day pattern: worse on weekdays
-                weekday_factor = 1.2 if timestamp.weekday() < 5 else 0.8
-                
-                # Generate values with noise
-                pm25 = max(5, params['base_pm25'] * rush_hour_factor * weekday_factor + 
-                          np.random.normal(0, params['variance']))
-                pm10 = pm25 * 1.5 + np.random.normal(0, 10)
-                
-                all_data.append({
-                    'timestamp': timestamp,
-                    'city': city,
-                    'aqi': min(5, max(1, int(pm25 / 30) + 1)),
-                    'co': max(0, 200 + np.random.normal(0, 50)),
-                    'no': max(0, 0.5 + np.random.normal(0, 0.2)),
-                    'no2': max(0, 20 + np.random.normal(0, 10)),
-                    'o3': max(0, 50 + np.random.normal(0, 20)),
-                    'so2': max(0, 10 + np.random.normal(0, 5)),
-                    'pm2_5': pm25,
-                    'pm10': max(0, pm10),
-                    'nh3': max(0, 5 + np.random.normal(0, 2))
-                })
-    
-    df = pd.DataFrame(all_data)
-    
-    # Create directory if doesn't exist
-    os.makedirs("data/raw", exist_ok=True)
-    
-    # Save to CSV
-    df.to_csv("data/raw/aqi_data.csv", index=False)
-    print(f"✅ Generated {len(df)} records")
-    print(f"✅ Saved to: data/raw/aqi_data.csv")
+    for gas, (mean, std) in GAS_PROFILES.items():
+        columns[gas] = np.maximum(0, rng.normal(mean, std, n))
+    return columns
+
+
+def generate_chunks(n_stations: int = 5, days: int = 30, freq: str = "1h", seed: int = 42,
+                    end: Optional[datetime] = None, chunk_rows: int = CHUNK_ROWS) -> Iterator[pd.DataFrame]:
+    """Yield synthetic observations a few stations at a time, ordered by station then time.
+
+    Each station draws from its own stream spawned from `seed`, so the values
+    do not depend on chunk size or on how many stations are generated.
+    """
+    timestamps = time_grid(days, freq, end)
+    rush_factor = np.where(np.isin(timestamps.hour, RUSH_HOURS), 1.3, 1.0)
+    weekday_factor = np.where(np.isin(timestamps.dayofweek, WEEKEND_DAYS), 0.8, 1.2)
+    rush_weekday = rush_factor * weekday_factor
+
+    seqs = np.random.SeedSequence(seed).spawn(n_stations)
+    per_chunk = max(1, chunk_rows // max(1, len(timestamps)))
+
+    for start in range(0, n_stations, per_chunk):
+        stations = [
+            generate_station(i, seqs[i], timestamps, rush_weekday)
+            for i in range(start, min(start + per_chunk, n_stations))
+        ]
+        yield pd.DataFrame({
+            col: np.concatenate([np.asarray(station[col]) for station in stations])
+            for col in COLUMNS
+        })
+
+
+def generate_historical_data(days=30, n_stations=5, freq="1h", seed=42, end=None):
+    """Generate synthetic historical AQI data in memory"""
+    return pd.concat(list(generate_chunks(n_stations, days, freq, seed, end)), ignore_index=True)
+
+
+def save_historical_data(output_path: str = RAW_DATA_PATH, days=30, n_stations=5, freq="1h", seed=42,
+                         end=None, chunk_rows: int = CHUNK_ROWS) -> int:
+    """Stream synthetic data to a CSV file or partitioned Parquet dataset; returns the row count"""
+    print(f"Generating {days} days of {freq} data for {n_stations} stations...")
+
+    total = 0
+    sample = None
+    for i, chunk in enumerate(generate_chunks(n_stations, days, freq, seed, end, chunk_rows)):
+        save_frame(chunk, output_path, append=(i > 0))
+        if i == 0:
+            sample = chunk.head()
+        total += len(chunk)
+
+    print(f"✅ Generated {total} records")
+    print(f"✅ Saved to: {output_path}")
     print(f"\nSample data:")
-    print(df.head())
-    print(f"\nData shape: {df.shape}")
-    
-    return df
+    print(sample)
+
+    return total
+
 
 if __name__ == "__main__":
-    df = generate_historical_data(days=30)
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Generate synthetic historical AQI data")
+    parser.add_argument("--stations", type=int, default=5, help="Number of stations (the first 5 are named cities)")
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--freq", default="1h", help="Observation frequency, e.g. 1h or 15min")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--end", help="Last timestamp (default: now); fix it for byte-identical output")
+    parser.add_argument("--output", default=RAW_DATA_PATH, help="CSV file or Parquet dataset directory")
+    parser.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS)
+    args = parser.parse_args()
+
+    save_historical_data(args.output, args.days, args.stations, args.freq, args.seed, args.end, args.chunk_rows)
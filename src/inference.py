@@ -0,0 +1,162 @@
+import os
+import tempfile
+from typing import TYPE_CHECKING, List, Optional
+
+import numpy as np
+
+if TYPE_CHECKING:
+    import xgboost as xgb
+
+# Every predictor takes float32 arrays laid out in its feature_cols order and
+# offers predict (n rows) and predict_one (a single row)
+
+
+class BoosterPredictor:
+    """Runs the XGBoost booster directly on float32 feature arrays"""
+
+    backend = 'xgboost'
+
+    def __init__(self, booster: 'xgb.Booster', feature_cols: Optional[List[str]] = None, nthread: int = 1):
+        self.booster = booster
+        # Small inputs are faster on one thread than paying the OpenMP fan-out
+        self.booster.set_param({'nthread': nthread})
+        self.feature_cols = list(feature_cols or booster.feature_names or [])
+
+    @classmethod
+    def from_model(cls, model, feature_cols: Optional[List[str]] = None, nthread: int = 1):
+        """Wrap an XGBRegressor or a Booster"""
+        booster = model.get_booster() if hasattr(model, 'get_booster') else model
+        return cls(booster, feature_cols, nthread)
+
+    def predict(self, X: np.ndarray) -> np.ndarray:
+        """Predict a (n, n_features) matrix laid out in feature_cols order"""
+        return self.booster.inplace_predict(X, validate_features=False)
+
+    def predict_one(self, x: np.ndarray) -> float:
+        """Predict a single (1, n_features) row"""
+        return float(self.booster.inplace_predict(x, validate_features=False)[0])
+
+
+class OnnxPredictor:
+    """Runs the model converted to ONNX on onnxruntime's CPU provider"""
+
+    backend = 'onnx'
+
+    def __init__(self, onnx_model: bytes, feature_cols: List[str], nthread: int = 1):
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = nthread
+        options.inter_op_num_threads = 1
+        self.session = ort.InferenceSession(onnx_model, options, providers=['CPUExecutionProvider'])
+        self.input_name = self.session.get_inputs()[0].name
+        self.feature_cols = list(feature_cols)
+
+    @classmethod
+    def from_booster(cls, booster: 'xgb.Booster', feature_cols: Optional[List[str]] = None, nthread: int = 1,
+                     cache_path: Optional[str] = None):
+        """Convert a booster with onnxmltools, reusing `cache_path` when it already holds the conversion"""
+        feature_cols = list(feature_cols or booster.feature_names or [])
+        if cache_path and os.path.exists(cache_path):
+            with open(cache_path, 'rb') as f:
+                return cls(f.read(), feature_cols, nthread)
+
+        import onnxmltools
+        from onnxmltools.convert.common.data_types import FloatTensorType
+
+        # The converter expects XGBoost's default f0, f1, ... feature names
+        unnamed = booster.copy()
+        unnamed.feature_names = None
+        onnx_model = onnxmltools.convert_xgboost(
+            unnamed, initial_types=[('input', FloatTensorType([None, len(feature_cols)]))]
+        ).SerializeToString()
+        if cache_path:
+            _write_atomic(cache_path, onnx_model)
+        return cls(onnx_model, feature_cols, nthread)
+
+    def predict(self, X: np.ndarray) -> np.ndarray:
+        return self.session.run(None, {self.input_name: X})[0].ravel()
+
+    def predict_one(self, x: np.ndarray) -> float:
+        return float(self.session.run(None, {self.input_name: x})[0][0, 0])
+
+
+class TreelitePredictor:
+    """Runs the model compiled to a native shared library with Treelite and TL2cgen"""
+
+    backend = 'treelite'
+
+    def __init__(self, libpath: str, feature_cols: List[str], nthread: int = 1):
+        import tl2cgen
+
+        self._dmatrix = tl2cgen.DMatrix
+        self.predictor = tl2cgen.Predictor(libpath, nthread=nthread)
+        self.feature_cols = list(feature_cols)
+        # Build directory of an uncached library, removed with the predictor
+        self._workdir: Optional[tempfile.TemporaryDirectory] = None
+
+    @classmethod
+    def from_booster(cls, booster: 'xgb.Booster', feature_cols: Optional[List[str]] = None, nthread: int = 1,
+                     cache_path: Optional[str] = None):
+        """Compile a booster (a few seconds with gcc), reusing `cache_path` when it is already built.
+
+        Without `cache_path` the library is built in a temporary directory
+        that lives as long as the returned predictor.
+        """
+        feature_cols = list(feature_cols or booster.feature_names or [])
+        workdir = None
+        if cache_path is None:
+            workdir = tempfile.TemporaryDirectory(prefix="treelite-")
+            cache_path = os.path.join(workdir.name, "model.so")
+        if not os.path.exists(cache_path):
+            import tl2cgen
+            import treelite
+
+            tmp = f"{cache_path}.{os.getpid()}.tmp.so"
+            tl2cgen.export_lib(
+                treelite.frontend.from_xgboost(booster), toolchain='gcc', libpath=tmp,
+                params={'parallel_comp': os.cpu_count() or 1}, verbose=False
+            )
+            os.replace(tmp, cache_path)
+        predictor = cls(cache_path, feature_cols, nthread)
+        predictor._workdir = workdir
+        return predictor
+
+    def predict(self, X: np.ndarray) -> np.ndarray:
+        return self.predictor.predict(self._dmatrix(X)).ravel()
+
+    def predict_one(self, x: np.ndarray) -> float:
+        return float(self.predictor.predict(self._dmatrix(x)).ravel()[0])
+
+
+def _write_atomic(path: str, data: bytes):
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, 'wb') as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+# Artifact suffix of each compiled backend, cached next to the booster
+BACKEND_SUFFIXES = {'onnx': '.onnx', 'treelite': '.so'}
+
+
+def make_predictor(model, backend: str = 'xgboost', feature_cols: Optional[List[str]] = None, nthread: int = 1,
+                   cache_prefix: Optional[str] = None):
+    """Predictor for an XGBRegressor or Booster on the chosen backend ('xgboost', 'onnx' or 'treelite').
+
+    Compiled backends cache their artifact at `cache_prefix` plus a suffix.
+    When a backend's packages are not installed the XGBoost predictor is used.
+    """
+    booster = model.get_booster() if hasattr(model, 'get_booster') else model
+    if backend == 'xgboost':
+        return BoosterPredictor(booster, feature_cols, nthread)
+    if backend not in BACKEND_SUFFIXES:
+        raise ValueError(f"Unknown inference backend: {backend}")
+
+    cls = OnnxPredictor if backend == 'onnx' else TreelitePredictor
+    cache_path = cache_prefix + BACKEND_SUFFIXES[backend] if cache_prefix else None
+    try:
+        return cls.from_booster(booster, feature_cols, nthread, cache_path)
+    except ImportError as e:
+        print(f"Warning: {backend} backend unavailable ({e}), using xgboost")
+        return BoosterPredictor(booster, feature_cols, nthread)
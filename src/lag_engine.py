@@ -0,0 +1,232 @@
+from typing import Iterable, Optional, Sequence
+
+import importlib.util
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+# numba is optional and slow to import; it is loaded with the first rolling mean
+HAS_NUMBA = importlib.util.find_spec("numba") is not None
+
+# The kernel is compiled on first use and not cached on disk: this module is
+# imported both as src.lag_engine and as lag_engine, and numba's cache, keyed
+# by file, fails to load under the other name. Compiling takes about half a
+# second, so by default numba is only used on inputs this large.
+NUMBA_MIN_ROWS = 1_000_000
+
+# Rolling sums add the window's values oldest first, starting from zero, on
+# every path. A row's mean therefore depends only on the values in its
+# window, not on where the array starts, so an incremental run over a
+# warm-up window reproduces a full recompute bit for bit.
+#
+# Lags and windows are measured on a regular time grid: each timestamp is
+# rounded to the nearest step of `freq`, so "24h ago" means 24 grid steps
+# back, not 24 rows back. When collection ran more than once in a step, only
+# the group's last row for that step is kept. An observation that does not exist (a missed collection run) gives a NaN
+# lag and sets the matching `lag_{k}h_missing` flag.
+
+
+def _order(codes: np.ndarray, times: np.ndarray) -> Optional[np.ndarray]:
+    """Stable permutation ordering rows by group code, then time; None when already ordered"""
+    same = codes[1:] == codes[:-1]
+    if np.all((codes[1:] > codes[:-1]) | (same & (times[1:] >= times[:-1]))):
+        return None
+    return np.lexsort((times, codes))
+
+
+def sort_groups(df: pd.DataFrame, group_col: str = 'city', time_col: str = 'timestamp') -> pd.DataFrame:
+    """Return the rows of df ordered by group, then time (stable, index labels kept)"""
+    codes = pd.factorize(df[group_col], sort=True)[0]
+    order = _order(codes, df[time_col].to_numpy())
+    return df.take(np.arange(len(df)) if order is None else order)
+
+
+def group_positions(groups: np.ndarray) -> np.ndarray:
+    """Position of each row within its run of equal group keys; rows must be sorted by group"""
+    n = len(groups)
+    starts = np.flatnonzero(np.r_[True, groups[1:] != groups[:-1]]) if n else np.empty(0, dtype=np.int64)
+    lengths = np.diff(np.r_[starts, n])
+    return np.arange(n) - np.repeat(starts, lengths)
+
+
+def grid_steps(timestamps, freq: str = "1h") -> np.ndarray:
+    """Index of each timestamp on a regular grid, rounding to the nearest step"""
+    step = pd.Timedelta(freq).value
+    ns = pd.DatetimeIndex(timestamps).to_numpy(dtype='datetime64[ns]').view(np.int64)
+    return (ns + step // 2) // step
+
+
+def _packed_keys(codes: np.ndarray, steps: np.ndarray, offset: int) -> np.ndarray:
+    """Group code and grid step packed into one sortable key; steps lie in [offset, span) within a group"""
+    low = steps.min()
+    span = int(steps.max() - low) + offset + 1
+    return codes.astype(np.int64) * span + (steps - low + offset)
+
+
+def lag_rows(positions: np.ndarray, k: int, codes: Optional[np.ndarray] = None,
+             steps: Optional[np.ndarray] = None) -> np.ndarray:
+    """Row index holding the value k steps back within the same group, or -1 when there is none.
+
+    Without `steps` the lag is positional (k rows back). With grid steps the
+    row k rows back is checked first, which is right whenever no observation
+    is missing in between; only the remaining rows are binary searched.
+    """
+    n = len(positions)
+    rows = np.arange(n) - k
+    found = positions >= k
+    if steps is not None and n:
+        found[k:] &= steps[:n - k] == steps[k:] - k
+        rest = np.flatnonzero(~found)
+        if len(rest):
+            keys = _packed_keys(codes, steps, k)
+            target = keys[rest] - k
+            candidate = np.searchsorted(keys, target, side='right') - 1
+            found[rest] = (candidate >= 0) & (keys[np.maximum(candidate, 0)] == target)
+            rows[rest] = candidate
+    return np.where(found, rows, -1)
+
+
+def window_sizes(positions: np.ndarray, window: int, codes: Optional[np.ndarray] = None,
+                 steps: Optional[np.ndarray] = None) -> np.ndarray:
+    """Number of rows, ending at each row, that fall in its window of the last `window` rows or grid steps.
+
+    Windows are contiguous runs of rows, so they are computed once and shared
+    by every column.
+    """
+    n = len(positions)
+    sizes = np.minimum(positions + 1, window)
+    if steps is not None and n:
+        # Whether the first row of each window is still inside it: a shifted
+        # comparison for full windows, a gather for the few shorter ones
+        inside = np.zeros(n, dtype=bool)
+        inside[window - 1:] = steps[:max(n - window + 1, 0)] > steps[window - 1:] - window
+        short = np.flatnonzero(sizes < window)
+        inside[short] = steps[short - sizes[short] + 1] > steps[short] - window
+        rest = np.flatnonzero(~inside)
+        if len(rest):
+            keys = _packed_keys(codes, steps, window)
+            first = np.searchsorted(keys, keys[rest] - window + 1, side='left')
+            sizes[rest] = rest - first + 1
+    return sizes
+
+
+def lag_fixups(source: np.ndarray, k: int) -> np.ndarray:
+    """Rows whose lag source is not simply the row k rows back"""
+    return np.flatnonzero(source != np.arange(len(source)) - k)
+
+
+def lag(values: np.ndarray, source: np.ndarray, k: int, fixups: Optional[np.ndarray] = None,
+        out: Optional[np.ndarray] = None) -> np.ndarray:
+    """Values at the rows returned by lag_rows; NaN where there is no source row.
+
+    The bulk is a shifted copy; only `fixups` rows (see lag_fixups) are gathered.
+    """
+    n = len(values)
+    if out is None:
+        out = np.empty(n)
+    if fixups is None:
+        fixups = lag_fixups(source, k)
+    out[:k] = np.nan
+    if k < n:
+        out[k:] = values[:n - k]
+    fixed = source[fixups]
+    out[fixups] = np.where(fixed >= 0, values[np.maximum(fixed, 0)], np.nan)
+    return out
+
+
+def _rolling_mean_numpy(values, sizes, out):
+    n = len(values)
+    sums = np.zeros(n)
+    counts = np.zeros(n, dtype=np.int64)
+    valid = np.empty(n, dtype=bool)
+    present = ~np.isnan(values)
+
+    for j in range(int(sizes.max(initial=0)) - 1, -1, -1):
+        # Rows whose window reaches j rows back
+        v = valid[:n - j]
+        np.greater(sizes[j:], j, out=v)
+        v &= present[:n - j]
+        np.add(sums[j:], values[:n - j], out=sums[j:], where=v)
+        counts[j:] += v
+
+    out[:] = np.nan
+    np.divide(sums, counts, out=out, where=counts > 0)
+
+
+@lru_cache(maxsize=1)
+def _numba_kernel():
+    import numba
+
+    @numba.njit(nogil=True)
+    def _rolling_mean_numba(values, sizes, out):
+        for i in range(len(values)):
+            total = 0.0
+            count = 0
+            for j in range(sizes[i] - 1, -1, -1):
+                v = values[i - j]
+                if v == v:
+                    total += v
+                    count += 1
+            out[i] = total / count if count else np.nan
+
+    return _rolling_mean_numba
+
+
+def rolling_mean(values: np.ndarray, sizes: np.ndarray, out: Optional[np.ndarray] = None,
+                 use_numba: Optional[bool] = None) -> np.ndarray:
+    """Mean of the non-NaN values among the `sizes[i]` rows ending at each row i (min_periods=1)"""
+    values = np.ascontiguousarray(values, dtype=np.float64)
+    if out is None:
+        out = np.empty(len(values))
+    if use_numba is None:
+        use_numba = HAS_NUMBA and len(values) >= NUMBA_MIN_ROWS
+    if use_numba:
+        _numba_kernel()(values, np.ascontiguousarray(sizes), out)
+    else:
+        _rolling_mean_numpy(values, sizes, out)
+    return out
+
+
+def add_lag_features(df: pd.DataFrame, cols: Iterable[str], lags: Sequence[int] = (1, 24), window: int = 24,
+                     group_col: str = 'city', time_col: str = 'timestamp', freq: Optional[str] = "1h",
+                     use_numba: Optional[bool] = None) -> pd.DataFrame:
+    """Add `{col}_lag_{k}h` and `{col}_rolling_mean_{window}h` columns for every col.
+
+    Lags and windows are counted in steps of `freq`, and `lag_{k}h_missing`
+    flags mark rows with no observation k steps back. With `freq=None` they
+    are positional (rows back) and no flags are added.
+
+    Rows are sorted by group and time first unless they already are, and
+    with a `freq` only the last row per group and step is kept; columns are
+    then written into that frame in place. Group boundaries are computed
+    once and shared by every column.
+    """
+    codes = pd.factorize(df[group_col], sort=True)[0]
+    order = _order(codes, df[time_col].to_numpy())
+    if order is not None:
+        df = df.take(order)
+        codes = codes[order]
+
+    steps = grid_steps(df[time_col], freq) if freq is not None else None
+    if steps is not None and len(df):
+        # Sorting is stable, so the last row of a step is the latest collected
+        last = np.r_[(codes[1:] != codes[:-1]) | (steps[1:] != steps[:-1]), True]
+        if not last.all():
+            df, codes, steps = df[last], codes[last], steps[last]
+
+    positions = group_positions(codes)
+    sources = {k: lag_rows(positions, k, codes, steps) for k in lags}
+    fixups = {k: lag_fixups(sources[k], k) for k in lags}
+    sizes = window_sizes(positions, window, codes, steps)
+
+    if steps is not None:
+        for k in lags:
+            df[f'lag_{k}h_missing'] = (sources[k] < 0).astype(np.int8)
+
+    for col in cols:
+        values = df[col].to_numpy(dtype=np.float64)
+        for k in lags:
+            df[f'{col}_lag_{k}h'] = lag(values, sources[k], k, fixups[k])
+        df[f'{col}_rolling_mean_{window}h'] = rolling_mean(values, sizes, use_numba=use_numba)
+    return df
@@ -0,0 +1,151 @@
+import asyncio
+import json
+from typing import AsyncIterator, Dict, Iterable, Optional, Set
+
+try:
+    from src.cache_codec import LATEST_CHANNEL, decode_update
+except ImportError:
+    from cache_codec import LATEST_CHANNEL, decode_update
+
+
+def format_event(record: Dict) -> bytes:
+    """One Server-Sent Events frame carrying a city's latest record"""
+    return f"event: aqi\ndata: {json.dumps(record)}\n\n".encode()
+
+
+HEARTBEAT = b": keepalive\n\n"
+
+
+class Subscription:
+    """Pending frames of one client, at most one per city.
+
+    A client that reads slower than updates arrive never falls behind by
+    more than one frame per city: a new update replaces the unsent one, so
+    memory stays bounded and the client always gets the newest value.
+    """
+
+    def __init__(self, cities: Optional[Iterable[str]]):
+        self.cities = frozenset(cities) if cities else None
+        self.pending: Dict[str, bytes] = {}
+        self.ready = asyncio.Event()
+        self.sent = 0
+        self.active = True
+
+    def push(self, city: str, frame: bytes) -> bool:
+        """Queue a frame; returns True when it replaced one the client had not read yet"""
+        replaced = city in self.pending
+        self.pending[city] = frame
+        self.ready.set()
+        return replaced
+
+    async def frames(self, heartbeat: float) -> AsyncIterator[bytes]:
+        """Yield frames as they arrive, and a comment line after `heartbeat` idle seconds"""
+        while True:
+            if not self.pending:
+                self.ready.clear()
+                try:
+                    await asyncio.wait_for(self.ready.wait(), heartbeat)
+                except asyncio.TimeoutError:
+                    # Keeps proxies from closing an idle connection
+                    yield HEARTBEAT
+                    continue
+            city = next(iter(self.pending))
+            self.sent += 1
+            yield self.pending.pop(city)
+
+
+class LiveBroker:
+    """In-process fan-out of per-city updates to stream subscribers.
+
+    Each update is formatted once and handed to every subscriber of its
+    city; writing to clients is left to their own response tasks, so a
+    slow client never delays the others. With Redis, `listen` feeds the
+    broker from the channel the feature pipeline publishes to, so one
+    subscription per worker serves all of its clients.
+    """
+
+    def __init__(self, max_subscribers: int = 10_000):
+        self.max_subscribers = max_subscribers
+        self.by_city: Dict[str, Set[Subscription]] = {}
+        # Subscribers to every city
+        self.everyone: Set[Subscription] = set()
+        self.subscribers = 0
+        self.published = 0
+        self.delivered = 0
+        self.replaced = 0
+
+    @property
+    def full(self) -> bool:
+        return self.subscribers >= self.max_subscribers
+
+    def subscribe(self, cities: Optional[Iterable[str]] = None) -> Subscription:
+        subscription = Subscription(cities)
+        if subscription.cities is None:
+            self.everyone.add(subscription)
+        else:
+            for city in subscription.cities:
+                self.by_city.setdefault(city, set()).add(subscription)
+        self.subscribers += 1
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        """Release a subscription; later calls for the same one do nothing"""
+        if not subscription.active:
+            return
+        subscription.active = False
+        if subscription.cities is None:
+            self.everyone.discard(subscription)
+        else:
+            for city in subscription.cities:
+                subscribers = self.by_city.get(city)
+                if subscribers is not None:
+                    subscribers.discard(subscription)
+                    if not subscribers:
+                        del self.by_city[city]
+        self.subscribers -= 1
+
+    def publish(self, record: Dict) -> int:
+        """Deliver a record to its city's subscribers; returns how many received it"""
+        city = record['city']
+        frame = format_event(record)
+        receivers = 0
+        for subscribers in (self.by_city.get(city, ()), self.everyone):
+            for subscription in subscribers:
+                self.replaced += subscription.push(city, frame)
+            receivers += len(subscribers)
+        self.published += 1
+        self.delivered += receivers
+        return receivers
+
+    def publish_message(self, data: bytes) -> int:
+        record = decode_update(data)
+        return self.publish(record) if record else 0
+
+    async def listen(self, redis_client, channel: str = LATEST_CHANNEL, retry_seconds: float = 5.0):
+        """Relay the pipeline's pub/sub messages until cancelled, resubscribing after errors"""
+        while True:
+            try:
+                async with redis_client.pubsub() as pubsub:
+                    await pubsub.subscribe(channel)
+                    async for message in pubsub.listen():
+                        if message['type'] != 'message':
+                            continue
+                        try:
+                            self.publish_message(message['data'])
+                        except ValueError as e:
+                            print(f"Warning: Skipping live update: {e}")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Warning: Live update subscription failed: {e}")
+            await asyncio.sleep(retry_seconds)
+
+    def stats(self) -> Dict:
+        return {
+            "subscribers": self.subscribers,
+            "cities": len(self.by_city),
+            "published": self.published,
+            "delivered": self.delivered,
+            # Updates a slow client never saw because a newer one replaced them
+            "replaced": self.replaced
+        }
@@ -0,0 +1,134 @@
+import os
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Optional
+
+from prometheus_client import CollectorRegistry, Gauge, Histogram, push_to_gateway, write_to_textfile
+from prometheus_client.core import GaugeMetricFamily
+
+# Batch jobs push here when set (a Prometheus Pushgateway or compatible endpoint)
+PUSHGATEWAY_URL = os.getenv("PUSHGATEWAY_URL")
+# Otherwise they write <job>.prom files here for node_exporter's textfile collector
+METRICS_TEXTFILE_DIR = os.getenv("METRICS_TEXTFILE_DIR", "metrics")
+
+# API metrics live in their own registry so /metrics exposes only what the app records
+API_REGISTRY = CollectorRegistry()
+
+# Most requests finish in well under a millisecond; the top buckets catch pool waits
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+REQUEST_LATENCY = Histogram(
+    'aqi_api_request_seconds', 'API request latency by route template',
+    ['method', 'route', 'status'], buckets=LATENCY_BUCKETS, registry=API_REGISTRY
+)
+
+STAGE_LATENCY = Histogram(
+    'aqi_api_stage_seconds', 'Time spent in hot-path stages of API requests',
+    ['stage'], buckets=LATENCY_BUCKETS, registry=API_REGISTRY
+)
+
+
+def time_stage(stage: str):
+    """Context manager timing one hot-path stage (feature_build, inference, redis, ...)"""
+    return STAGE_LATENCY.labels(stage).time()
+
+
+class StatsCollector:
+    """Exposes the numeric entries of a stats() dict as gauges, read at scrape time"""
+
+    def __init__(self, prefix: str, documentation: str, stats: Callable[[], Dict]):
+        self.prefix = prefix
+        self.documentation = documentation
+        self.stats = stats
+
+    def collect(self):
+        for name, value in self.stats().items():
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                yield GaugeMetricFamily(f"{self.prefix}_{name}", self.documentation, value=value)
+
+
+# Long-lived responses whose duration is the connection's lifetime, not latency
+UNTIMED_ROUTES = frozenset({'/api/stream'})
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording request latency per route template.
+
+    Labels use the matched route's path (e.g. /api/current/{city}), so the
+    number of series doesn't grow with path parameters. UNTIMED_ROUTES are
+    left out.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        start = time.perf_counter()
+
+        async def send_with_status(message):
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            # The router adds the matched route to the scope
+            route = getattr(scope.get('route'), 'path', 'unmatched')
+            if route not in UNTIMED_ROUTES:
+                REQUEST_LATENCY.labels(scope['method'], route, str(status)).observe(time.perf_counter() - start)
+
+
+class JobMetrics:
+    """Per-stage durations and row counts of a batch job, exported when the job ends.
+
+    `export()` pushes to PUSHGATEWAY_URL when it is set, otherwise writes
+    `<job>.prom` to METRICS_TEXTFILE_DIR, so runs can be inspected offline.
+    """
+
+    def __init__(self, job: str):
+        self.job = job
+        self.registry = CollectorRegistry()
+        self.durations = Gauge('aqi_job_stage_seconds', 'Duration of a batch job stage',
+                               ['job', 'stage'], registry=self.registry)
+        self.rows = Gauge('aqi_job_rows', 'Rows handled by a batch job stage',
+                          ['job', 'stage'], registry=self.registry)
+        self.last_success = Gauge('aqi_job_last_success_timestamp_seconds', 'End of the last successful run',
+                                  ['job'], registry=self.registry)
+
+    @contextmanager
+    def stage(self, name: str):
+        """Time a stage; the duration is recorded even if it fails"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.durations.labels(self.job, name).set(time.perf_counter() - start)
+
+    def count(self, stage: str, rows: int):
+        self.rows.labels(self.job, stage).set(rows)
+
+    def export(self, success: bool = True, pushgateway: Optional[str] = PUSHGATEWAY_URL,
+               textfile_dir: Optional[str] = METRICS_TEXTFILE_DIR) -> Optional[str]:
+        """Push or write the job's metrics; returns where they went. Failures only warn."""
+        if success:
+            self.last_success.labels(self.job).set_to_current_time()
+        try:
+            if pushgateway:
+                push_to_gateway(pushgateway, job=self.job, registry=self.registry)
+                return pushgateway
+            if textfile_dir:
+                os.makedirs(textfile_dir, exist_ok=True)
+                path = os.path.join(textfile_dir, f"{self.job}.prom")
+                # Writes a temporary file and renames it, so collectors never read half a file
+                write_to_textfile(path, self.registry)
+                return path
+        except Exception as e:
+            print(f"Warning: Could not export {self.job} metrics: {e}")
+        return None
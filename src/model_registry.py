@@ -0,0 +1,166 @@
+import hashlib
+import json
+import os
+from datetime import datetime, timezone
+from typing import TYPE_CHECKING, Dict, List, Optional
+
+try:
+    from src.feature_builder import FEATURE_COLS, FeatureVectorBuilder
+    from src.inference import make_predictor
+except ImportError:
+    from feature_builder import FEATURE_COLS, FeatureVectorBuilder
+    from inference import make_predictor
+
+if TYPE_CHECKING:
+    import xgboost as xgb
+
+MODEL_DIR = os.getenv("MODEL_DIR", "models/saved_models")
+MANIFEST_NAME = "model_manifest.json"
+
+# Booster files kept next to the manifest; older ones are removed on export
+KEEP_VERSIONS = 3
+
+
+def manifest_path(model_dir: str = MODEL_DIR) -> str:
+    return os.path.join(model_dir, MANIFEST_NAME)
+
+
+def export_model(model, model_dir: str = MODEL_DIR, feature_cols: Optional[List[str]] = None,
+                 metrics: Optional[dict] = None) -> dict:
+    """Write the booster as UBJSON with a manifest; returns the manifest.
+
+    The booster file is named after the hash of its bytes, so a given
+    version is never rewritten. The manifest is written last and renamed
+    into place, so readers see either the old or the new model, never a
+    partial one.
+    """
+    import xgboost as xgb
+
+    booster = model.get_booster() if hasattr(model, 'get_booster') else model
+    raw = bytes(booster.save_raw(raw_format='ubj'))
+    version = hashlib.sha256(raw).hexdigest()[:16]
+    filename = f"xgboost_aqi_model-{version}.ubj"
+
+    os.makedirs(model_dir, exist_ok=True)
+    path = os.path.join(model_dir, filename)
+    if not os.path.exists(path):
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, 'wb') as f:
+            f.write(raw)
+        os.replace(tmp, path)
+
+    manifest = {
+        "version": version,
+        "booster": filename,
+        "format": "ubj",
+        "feature_cols": list(feature_cols or booster.feature_names or FEATURE_COLS),
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "xgboost_version": xgb.__version__,
+        "metrics": metrics or {}
+    }
+    tmp = f"{manifest_path(model_dir)}.{os.getpid()}.tmp"
+    with open(tmp, 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp, manifest_path(model_dir))
+
+    _prune(model_dir, keep=filename)
+    return manifest
+
+
+def _prune(model_dir: str, keep: str):
+    """Remove all but the newest KEEP_VERSIONS boosters (always keeping `keep`) with their compiled artifacts"""
+    names = os.listdir(model_dir)
+    files = sorted(
+        (name for name in names if name.startswith("xgboost_aqi_model-") and name.endswith(".ubj")),
+        key=lambda name: os.path.getmtime(os.path.join(model_dir, name)),
+        reverse=True
+    )
+    for name in files[KEEP_VERSIONS:]:
+        if name != keep:
+            stem = name[:-len(".ubj")]
+            for other in names:
+                if other.startswith(stem):
+                    os.remove(os.path.join(model_dir, other))
+
+
+def read_manifest(model_dir: str = MODEL_DIR) -> Optional[dict]:
+    """The current manifest, or None when no model has been exported"""
+    try:
+        with open(manifest_path(model_dir)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def load_booster(manifest: dict, model_dir: str = MODEL_DIR) -> 'xgb.Booster':
+    """Load the booster a manifest points to, checking its bytes against the version hash"""
+    import xgboost as xgb
+
+    with open(os.path.join(model_dir, manifest['booster']), 'rb') as f:
+        raw = f.read()
+    if hashlib.sha256(raw).hexdigest()[:16] != manifest['version']:
+        raise ValueError(f"{manifest['booster']} does not match model version {manifest['version']}")
+    booster = xgb.Booster()
+    booster.load_model(bytearray(raw))
+    booster.feature_names = manifest['feature_cols']
+    return booster
+
+
+class LoadedModel:
+    """A model with its predictor and feature builder, swapped in as one reference.
+
+    Requests take the current LoadedModel once and use it throughout, so
+    replacing it never mixes a new predictor with an old feature order and
+    never disturbs requests already running.
+    """
+
+    def __init__(self, model, version: Optional[str] = None, manifest: Optional[dict] = None,
+                 source: Optional[str] = None, backend: str = 'xgboost'):
+        self.model = model
+        self.manifest = manifest or {}
+        feature_cols = self.manifest.get('feature_cols')
+        # Compiled backends are cached next to the booster file they came from
+        cache_prefix = os.path.splitext(source)[0] if source and self.manifest else None
+        self.predictor = make_predictor(model, backend, feature_cols, cache_prefix=cache_prefix)
+        self.backend = self.predictor.backend
+        self.feature_builder = FeatureVectorBuilder(self.predictor.feature_cols or None)
+        self.version = version or self.manifest.get('version')
+        self.source = source
+        self.loaded_at = datetime.now(timezone.utc)
+
+    @classmethod
+    def from_manifest(cls, manifest: dict, model_dir: str = MODEL_DIR, backend: str = 'xgboost'):
+        return cls(load_booster(manifest, model_dir), manifest=manifest,
+                   source=os.path.join(model_dir, manifest['booster']), backend=backend)
+
+    def info(self) -> dict:
+        return {
+            "version": self.version,
+            "loaded_at": self.loaded_at.isoformat(),
+            "source": self.source,
+            "backend": self.backend,
+            "feature_cols": self.predictor.feature_cols,
+            "created_at": self.manifest.get('created_at'),
+            "metrics": self.manifest.get('metrics', {})
+        }
+
+
+def horizon_model_dir(horizon: int, model_dir: str = MODEL_DIR) -> str:
+    """Export directory of the direct model trained to predict `horizon` hours ahead"""
+    return os.path.join(model_dir, "horizons", f"h{horizon}")
+
+
+def load_horizon_models(model_dir: str = MODEL_DIR, backend: str = 'xgboost') -> Dict[int, LoadedModel]:
+    """Every exported per-horizon model under model_dir, keyed by hours ahead"""
+    root = os.path.join(model_dir, "horizons")
+    models = {}
+    if not os.path.isdir(root):
+        return models
+    for name in os.listdir(root):
+        if not (name.startswith("h") and name[1:].isdigit()):
+            continue
+        horizon_dir = os.path.join(root, name)
+        manifest = read_manifest(horizon_dir)
+        if manifest is not None:
+            models[int(name[1:])] = LoadedModel.from_manifest(manifest, horizon_dir, backend)
+    return dict(sorted(models.items()))
@@ -1,55 +1,157 @@
 import pandas as pd
 import numpy as np
 import xgboost as xgb
-from sklearn.model_selection import train_test_split
 from sklearn.metrics import mean_squared_error, r2_score
-import mlflow
-import mlflow.xgboost
-import joblib
 import os
+import tempfile
 from datetime import datetime
+from functools import cached_property
+
+try:
+    from src.feature_builder import FEATURE_COLS
+    from src.storage import PROCESSED_DATA_PATH, is_dataset, load_frame, partition_row_counts
+    from src.training_data import CHUNK_ROWS, FeatureChunkIter, add_target, streamed_split_time
+    from src.param_search import horizon_gap, search, time_split
+    from src.model_registry import MODEL_DIR, export_model, horizon_model_dir
+    from src.metrics import JobMetrics
+    from src.settings import get_settings
+except ImportError:
+    from feature_builder import FEATURE_COLS
+    from storage import PROCESSED_DATA_PATH, is_dataset, load_frame, partition_row_counts
+    from training_data import CHUNK_ROWS, FeatureChunkIter, add_target, streamed_split_time
+    from param_search import horizon_gap, search, time_split
+    from model_registry import MODEL_DIR, export_model, horizon_model_dir
+    from metrics import JobMetrics
+    from settings import get_settings
+
+MODEL_PARAMS = {
+    'objective': 'reg:squarederror',
+    'n_estimators': 100,
+    'learning_rate': 0.1,
+    'max_depth': 6,
+    'random_state': 42
+}
+
+
+def booster_params(params: dict) -> tuple:
+    """Split XGBRegressor-style params into native xgb.train params and a round count"""
+    params = dict(params)
+    num_boost_round = params.pop('n_estimators', 100)
+    if 'random_state' in params:
+        params['seed'] = params.pop('random_state')
+    params.setdefault('tree_method', 'hist')
+    return params, num_boost_round
+
+
+def train_streaming_booster(filepath: str = PROCESSED_DATA_PATH, params: dict = None,
+                            chunk_rows: int = CHUNK_ROWS, external_memory: bool = False,
+                            cache_dir: str = None, test_size: float = 0.2):
+    """Train on feature chunks streamed from disk; returns (booster, y_test, y_pred).
+
+    By default chunks are sketched into a QuantileDMatrix, which keeps only
+    the quantized (one byte per value) matrix in memory. With
+    `external_memory` the quantized pages are cached on disk as well, so
+    memory follows the chunk size alone. The test set is the last
+    `test_size` of time, split as in prepare_data, so the metrics compare.
+    """
+    params, num_boost_round = booster_params(params or MODEL_PARAMS)
+    counts = partition_row_counts(filepath) if is_dataset(filepath) else None
+    cut = streamed_split_time(filepath, test_size, chunk_rows, counts)
+    test_iter = FeatureChunkIter(filepath, cut, chunk_rows=chunk_rows, holdout=True, counts=counts)
+
+    with tempfile.TemporaryDirectory(dir=cache_dir) as cache:
+        train_iter = FeatureChunkIter(filepath, cut, chunk_rows=chunk_rows, counts=counts,
+                                      cache_prefix=os.path.join(cache, "train") if external_memory else None)
+        if external_memory:
+            # xgboost < 3.0 has no ExtMemQuantileDMatrix; a DMatrix over a
+            # DataIter with a cache prefix is its external-memory mode
+            if hasattr(xgb, 'ExtMemQuantileDMatrix'):
+                dtrain = xgb.ExtMemQuantileDMatrix(train_iter)
+            else:
+                dtrain = xgb.DMatrix(train_iter)
+        else:
+            dtrain = xgb.QuantileDMatrix(train_iter)
+        dtest = xgb.QuantileDMatrix(test_iter, ref=dtrain)
+
+        booster = xgb.train(params, dtrain, num_boost_round=num_boost_round)
+        y_pred = booster.predict(dtest)
+        y_test = dtest.get_label()
+        del dtrain, dtest
+
+    return booster, y_test, y_pred
+
+
+def regressor_from_booster(booster: xgb.Booster, params: dict = None) -> xgb.XGBRegressor:
+    """Wrap a natively trained booster so it saves and serves like XGBRegressor.fit output"""
+    model = xgb.XGBRegressor(**(params or MODEL_PARAMS))
+    model.load_model(booster.save_raw(raw_format='ubj'))
+    return model
+
 
 class ModelTrainer:
     def __init__(self):
-        self.tracking_uri = os.getenv("MLFLOW_TRACKING_URI", "http://localhost:5000")
+        self.tracking_uri = get_settings().mlflow_tracking_uri
+    
+    @cached_property
+    def mlflow(self):
+        """mlflow, imported and pointed at the tracking server on the first run that logs to it"""
+        import mlflow
+        import mlflow.xgboost
+        
         mlflow.set_tracking_uri(self.tracking_uri)
         mlflow.set_experiment("air_quality_prediction")
+        return mlflow
+        
+    def load_features(self, filepath: str = PROCESSED_DATA_PATH, **filters) -> pd.DataFrame:
+        """Load processed features from a CSV file or a partitioned Parquet dataset"""
+        df = load_frame(filepath, **filters)
+        # Dataset partitions come back in file order; targets rely on per-city time order
+        if {'city', 'timestamp'} <= set(df.columns):
+            df = df.sort_values(['city', 'timestamp'], ignore_index=True)
+        return df
+    
+    def prepare_data(self, df: pd.DataFrame, test_size: float = 0.2, horizon: int = 1):
+        """Prepare features and target, holding out the most recent `test_size` of time for testing"""
+        # Target: AQI `horizon` hours later (next hour by default); missing lags stay NaN for XGBoost
+        df = add_target(df, horizon=horizon)
+        # Training targets stop short of the test window
+        train, test = time_split(df, test_size, horizon_gap(horizon))
         
-    def load_features(self, filepath: str = "data/processed/aqi_features.csv") -> pd.DataFrame:
-        """Load processed features"""
-        return pd.read_csv(filepath)
+        return train[FEATURE_COLS], test[FEATURE_COLS], train['target_aqi'], test['target_aqi']
     
-    def prepare_data(self, df: pd.DataFrame):
-        """Prepare features and target"""
-        # Target: Next hour AQI
-        df['target_aqi'] = df.groupby('city')['aqi'].shift(-1)
-        df = df.dropna()
+    def search_params(self, df: pd.DataFrame, n_trials: int = 20, n_workers: int = 1,
+                      test_size: float = 0.2, horizon: int = 1) -> dict:
+        """Hyperparameter search with rolling-origin CV on the training period.
         
-        feature_cols = [
-            'pm2_5', 'pm10', 'no2', 'so2', 'o3', 'co',
-            'hour', 'day_of_week', 'month', 'is_weekend', 'is_rush_hour',
-            'pm_ratio', 'health_risk_score',
-            'pm2_5_lag_1h', 'pm2_5_lag_24h', 'pm2_5_rolling_mean_24h',
-            'aqi_lag_1h', 'aqi_lag_24h'
-        ]
+        Each trial is logged as a nested MLflow run. Returns the best
+        parameters, with n_estimators set from early stopping.
+        """
+        gap = horizon_gap(horizon)
+        train, _ = time_split(add_target(df, horizon=horizon), test_size, gap)
         
-        X = df[feature_cols]
-        y = df['target_aqi']
+        with self.mlflow.start_run(run_name="param_search"):
+            self.mlflow.log_params({"n_trials": n_trials, "n_workers": n_workers})
+            
+            def log_trial(result):
+                with self.mlflow.start_run(nested=True):
+                    self.mlflow.log_params(result['params'])
+                    self.mlflow.log_metrics({"cv_rmse": result['cv_rmse'], "best_rounds": result['best_rounds']})
+                print(f"cv_rmse={result['cv_rmse']:.4f} rounds={result['best_rounds']} {result['params']}")
+            
+            results = search(train, n_trials, n_workers, on_result=log_trial, gap=gap)
+            best = results[0]
+            self.mlflow.log_params({f"best_{key}": value for key, value in best['params'].items()})
+            self.mlflow.log_metric("best_cv_rmse", best['cv_rmse'])
         
-        return train_test_split(X, y, test_size=0.2, random_state=42)
+        print(f"✅ Best CV RMSE {best['cv_rmse']:.4f} with {best['params']}")
+        return {**MODEL_PARAMS, **best['params'], 'n_estimators': best['best_rounds']}
     
-    def train_model(self, X_train, y_train, X_test, y_test):
+    def train_model(self, X_train, y_train, X_test, y_test, params: dict = None):
         """Train XGBoost model with MLflow tracking"""
-        with mlflow.start_run():
-            params = {
-                'objective': 'reg:squarederror',
-                'n_estimators': 100,
-                'learning_rate': 0.1,
-                'max_depth': 6,
-                'random_state': 42
-            }
+        with self.mlflow.start_run():
+            params = params or MODEL_PARAMS
             
-            mlflow.log_params(params)
+            self.mlflow.log_params(params)
             
             model = xgb.XGBRegressor(**params)
             model.fit(X_train, y_train)
@@ -57,42 +159,120 @@ class ModelTrainer:
             # Predict
             y_pred = model.predict(X_test)
             
-            # Metrics
-            mse = mean_squared_error(y_test, y_pred)
-            rmse = np.sqrt(mse)
-            r2 = r2_score(y_test, y_pred)
-            
-            mlflow.log_metrics({
-                "mse": mse,
-                "rmse": rmse,
-                "r2": r2
-            })
+            self.log_results(model, y_test, y_pred)
             
-            print(f"✅ Model Performance:")
-            print(f"RMSE: {rmse:.4f}")
-            print(f"R2 Score: {r2:.4f}")
+            return model
+    
+    def train_horizon_models(self, df: pd.DataFrame, horizons, params: dict = None, test_size: float = 0.2):
+        """Train a direct model per horizon, each exported next to the main model for the forecaster"""
+        params = params or MODEL_PARAMS
+        models = {}
+        for horizon in horizons:
+            X_train, X_test, y_train, y_test = self.prepare_data(df, test_size, horizon)
+            with self.mlflow.start_run(run_name=f"horizon_{horizon}h"):
+                self.mlflow.log_params({**params, "horizon": horizon})
+                model = xgb.XGBRegressor(**params)
+                model.fit(X_train, y_train)
+                y_pred = model.predict(X_test)
+                rmse = np.sqrt(mean_squared_error(y_test, y_pred))
+                self.mlflow.log_metric(f"rmse_h{horizon}", rmse)
             
-            # Save model
-            os.makedirs("models/saved_models", exist_ok=True)
-            joblib.dump(model, "models/saved_models/xgboost_aqi_model.pkl")
+            model_dir = horizon_model_dir(horizon)
+            manifest = export_model(model, model_dir, FEATURE_COLS, {"rmse": rmse, "horizon": horizon})
+            print(f"✅ {horizon}h model {manifest['version']} (RMSE {rmse:.4f}) exported to {model_dir}")
+            models[horizon] = model
+        return models
+    
+    def train_streaming(self, filepath: str = PROCESSED_DATA_PATH, chunk_rows: int = CHUNK_ROWS,
+                        external_memory: bool = False):
+        """Train XGBoost from feature chunks streamed off disk, with MLflow tracking"""
+        with self.mlflow.start_run():
+            self.mlflow.log_params({**MODEL_PARAMS, "chunk_rows": chunk_rows, "external_memory": external_memory})
             
-            # Log model to MLflow
-            mlflow.xgboost.log_model(model, "model")
+            booster, y_test, y_pred = train_streaming_booster(
+                filepath, MODEL_PARAMS, chunk_rows, external_memory
+            )
+            model = regressor_from_booster(booster)
+            self.log_results(model, y_test, y_pred)
             
             return model
+    
+    def log_results(self, model, y_test, y_pred):
+        """Log test metrics, export the model for serving and log it to MLflow"""
+        # Metrics
+        mse = mean_squared_error(y_test, y_pred)
+        rmse = np.sqrt(mse)
+        r2 = r2_score(y_test, y_pred)
+        
+        self.mlflow.log_metrics({
+            "mse": mse,
+            "rmse": rmse,
+            "r2": r2
+        })
+        
+        print(f"✅ Model Performance:")
+        print(f"RMSE: {rmse:.4f}")
+        print(f"R2 Score: {r2:.4f}")
+        
+        # Export the booster and manifest the API watches
+        manifest = export_model(model, MODEL_DIR, FEATURE_COLS, {"mse": mse, "rmse": rmse, "r2": r2})
+        print(f"✅ Model {manifest['version']} exported to {MODEL_DIR}")
+        
+        # Log model to MLflow
+        self.mlflow.xgboost.log_model(model, "model")
 
 if __name__ == "__main__":
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="Train the AQI model")
+    parser.add_argument("--streaming", action="store_true",
+                        help="Stream feature chunks from disk instead of loading the whole dataset")
+    parser.add_argument("--external-memory", action="store_true",
+                        help="With --streaming, also keep the quantized matrix on disk")
+    parser.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS)
+    parser.add_argument("--search", action="store_true", help="Tune hyperparameters before training")
+    parser.add_argument("--trials", type=int, default=20)
+    parser.add_argument("--workers", type=int, default=1, help="Processes running search trials")
+    parser.add_argument("--horizons", default="",
+                        help="Comma-separated hours ahead (e.g. 6,12,24,48) to train direct forecast models for")
+    args = parser.parse_args()
+    
     trainer = ModelTrainer()
+    metrics = JobMetrics("training")
     
     # Check if data exists
-    if not os.path.exists("data/processed/aqi_features.csv"):
+    if not os.path.exists(PROCESSED_DATA_PATH):
         print("Data not found. Please run feature_engineering.py first.")
+    elif args.streaming or args.external_memory:
+        print("Training model from streamed chunks...")
+        with metrics.stage("train"):
+            trainer.train_streaming(chunk_rows=args.chunk_rows, external_memory=args.external_memory)
+        metrics.export()
     else:
         print("Loading data...")
-        df = trainer.load_features()
+        with metrics.stage("load"):
+            df = trainer.load_features()
+        metrics.count("load", len(df))
+        
+        params = None
+        if args.search:
+            print(f"Searching hyperparameters ({args.trials} trials, {args.workers} workers)...")
+            with metrics.stage("search"):
+                params = trainer.search_params(df, args.trials, args.workers)
         
         print("Preparing data...")
-        X_train, X_test, y_train, y_test = trainer.prepare_data(df)
+        with metrics.stage("prepare"):
+            X_train, X_test, y_train, y_test = trainer.prepare_data(df)
+        metrics.count("train", len(X_train))
+        metrics.count("test", len(X_test))
         
         print("Training model...")
-        trainer.train_model(X_train, y_train, X_test, y_test)
+        with metrics.stage("train"):
+            trainer.train_model(X_train, y_train, X_test, y_test, params)
+        
+        horizons = [int(h) for h in args.horizons.split(",") if h.strip()]
+        if horizons:
+            print(f"Training direct models for {', '.join(f'{h}h' for h in horizons)}...")
+            with metrics.stage("horizons"):
+                trainer.train_horizon_models(df, horizons, params)
+        metrics.export()
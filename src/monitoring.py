@@ -1,43 +1,113 @@
 import pandas as pd
-from evidently.report import Report
-from evidently.metric_preset import DataDriftPreset, TargetDriftPreset
-from evidently.test_suite import TestSuite
-from evidently.test_preset import DataStabilityTestPreset
 import json
 import os
-from datetime import datetime
+from datetime import datetime, timedelta
+from typing import Optional
+
+try:
+    from src.drift import DRIFT_FEATURES, PSI_THRESHOLD, KS_THRESHOLD, DriftMonitor, ReferenceProfile
+    from src.storage import PROCESSED_DATA_PATH, iter_chunks, last_modified, load_frame
+except ImportError:
+    from drift import DRIFT_FEATURES, PSI_THRESHOLD, KS_THRESHOLD, DriftMonitor, ReferenceProfile
+    from storage import PROCESSED_DATA_PATH, iter_chunks, last_modified, load_frame
+
+# Precomputed bins, counts and sample of the reference data, built once from PROCESSED_DATA_PATH
+REFERENCE_PROFILE_PATH = os.getenv("REFERENCE_PROFILE_PATH", "data/processed/reference_profile.json")
+
+# Rows of current data scored together; a full window starts over, as does one that was reported
+DRIFT_WINDOW_ROWS = int(os.getenv("DRIFT_WINDOW_ROWS", 10_000))
+
 
 class ModelMonitor:
-    def __init__(self):
-        self.reference_data_path = "data/processed/aqi_features.csv"
+    def __init__(self, psi_threshold: float = PSI_THRESHOLD, ks_threshold: float = KS_THRESHOLD,
+                 window_rows: int = DRIFT_WINDOW_ROWS):
+        self.reference_data_path = PROCESSED_DATA_PATH
+        self.profile_path = REFERENCE_PROFILE_PATH
         self.reports_dir = "reports"
+        self.psi_threshold = psi_threshold
+        self.ks_threshold = ks_threshold
+        self.window_rows = window_rows
+        self.drift_monitor: Optional[DriftMonitor] = None
         os.makedirs(self.reports_dir, exist_ok=True)
         
-    def load_reference_data(self):
+    def load_reference_data(self, columns=None):
         if os.path.exists(self.reference_data_path):
-            return pd.read_csv(self.reference_data_path)
+            return load_frame(self.reference_data_path, columns=columns)
         return None
         
+    def build_reference_profile(self) -> Optional[ReferenceProfile]:
+        """Stream the reference data once into a profile and save it"""
+        if not os.path.exists(self.reference_data_path):
+            return None
+        profile = ReferenceProfile.build(lambda: iter_chunks(self.reference_data_path, columns=DRIFT_FEATURES))
+        profile.save(self.profile_path)
+        print(f"✅ Reference profile of {profile.rows} rows saved to: {self.profile_path}")
+        return profile
+
+    def load_reference_profile(self, rebuild: bool = False) -> Optional[ReferenceProfile]:
+        """The saved profile, built first if missing or older than the reference data"""
+        stale = (
+            not os.path.exists(self.profile_path)
+            or (os.path.exists(self.reference_data_path)
+                and last_modified(self.reference_data_path) > os.path.getmtime(self.profile_path))
+        )
+        if rebuild or stale:
+            return self.build_reference_profile()
+        return ReferenceProfile.load(self.profile_path)
+
+    def get_drift_monitor(self) -> Optional[DriftMonitor]:
+        if self.drift_monitor is None:
+            profile = self.load_reference_profile()
+            if profile is None:
+                return None
+            self.drift_monitor = DriftMonitor(profile, self.psi_threshold, self.ks_threshold)
+        return self.drift_monitor
+
+    def check_drift(self, current_data: pd.DataFrame, report: bool = True) -> Optional[dict]:
+        """Add a batch to the current window and score it against the reference profile.
+
+        Scoring works on bin counts only; the full Evidently report is
+        generated only when a feature crosses a threshold. The window holds
+        at most `window_rows` rows and starts over after a report, so old
+        batches don't mask a new shift.
+        """
+        monitor = self.get_drift_monitor()
+        if monitor is None:
+            print("Reference data not found. Skipping drift check.")
+            return None
+
+        if monitor.rows >= self.window_rows:
+            monitor.reset()
+        monitor.update(current_data)
+        scores = monitor.scores()
+        drifted = monitor.drifted(scores)
+        result = {"rows": monitor.rows, "drifted": drifted, "scores": scores}
+
+        if drifted:
+            print(f"Warning: Drift detected in {', '.join(drifted)}")
+            if report:
+                result["report"] = self.generate_data_drift_report(monitor.sample)
+                monitor.reset()
+        return result
+
     def generate_data_drift_report(self, current_data: pd.DataFrame):
         """Generate data drift report comparing current batch with reference"""
-        reference_data = self.load_reference_data()
-        
-        if reference_data is None:
+        from evidently.report import Report
+        from evidently.metric_preset import DataDriftPreset
+
+        numerical_features = DRIFT_FEATURES
+
+        monitor = self.get_drift_monitor()
+        if monitor is None:
             print("Reference data not found. Skipping drift check.")
             return
-            
-        # Select numerical columns for drift check
-        numerical_features = [
-            'pm2_5', 'pm10', 'no2', 'so2', 'o3', 'co',
-            'health_risk_score'
-        ]
         
         report = Report(metrics=[
             DataDriftPreset(), 
         ])
         
         report.run(
-            reference_data=reference_data[numerical_features].sample(n=min(1000, len(reference_data))), 
+            reference_data=monitor.profile.sample[numerical_features],
             current_data=current_data[numerical_features]
         )
         
@@ -46,9 +116,13 @@ class ModelMonitor:
         report.save_html(report_path)
         
         print(f"✅ Data drift report saved to: {report_path}")
+        return report_path
         
     def run_tests(self, current_data: pd.DataFrame):
         """Run stability tests"""
+        from evidently.test_suite import TestSuite
+        from evidently.test_preset import DataStabilityTestPreset
+
         tests = TestSuite(tests=[
             DataStabilityTestPreset(),
         ])
@@ -67,8 +141,11 @@ if __name__ == "__main__":
     
     # Simulate new incoming data
     try:
-        current_data = pd.read_csv("data/raw/aqi_data.csv").tail(100)
-        monitor.generate_data_drift_report(current_data)
+        # The last day of processed features; raw data lacks the derived columns
+        current_data = load_frame(PROCESSED_DATA_PATH, start=datetime.now() - timedelta(hours=24))
+        result = monitor.check_drift(current_data)
+        if result is not None:
+            print(json.dumps({col: round(score["psi"], 4) for col, score in result["scores"].items()}))
         monitor.run_tests(current_data)
     except Exception as e:
         print(f"Error running monitoring: {e}")
@@ -0,0 +1,136 @@
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Callable, Iterator, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import xgboost as xgb
+from sklearn.model_selection import ParameterSampler
+
+try:
+    from src.feature_builder import FEATURE_COLS
+except ImportError:
+    from feature_builder import FEATURE_COLS
+
+# Candidate values sampled by the search; n_estimators is an upper bound
+# that early stopping cuts short
+PARAM_SPACE = {
+    'max_depth': [4, 6, 8, 10],
+    'learning_rate': [0.03, 0.05, 0.1, 0.2],
+    'min_child_weight': [1, 5, 10],
+    'subsample': [0.7, 0.85, 1.0],
+    'colsample_bytree': [0.6, 0.8, 1.0],
+    'reg_lambda': [0.5, 1.0, 5.0]
+}
+
+SEARCH_ESTIMATORS = 500
+EARLY_STOPPING_ROUNDS = 20
+
+# Train rows whose target (the next hour) falls in the validation window
+# are excluded, so no fold trains on a value it is scored on; targets
+# further ahead need a gap of their horizon (horizon_gap)
+SPLIT_GAP = pd.Timedelta("1h")
+
+
+def horizon_gap(horizon: int) -> pd.Timedelta:
+    """Split gap for targets `horizon` hours ahead"""
+    return pd.Timedelta(hours=horizon)
+
+
+def split_time(times: np.ndarray, test_size: float = 0.2) -> np.datetime64:
+    """First test timestamp: the last `test_size` of the sorted distinct `times` are held out"""
+    return times[int(len(times) * (1 - test_size))]
+
+
+def time_split(df: pd.DataFrame, test_size: float = 0.2,
+               gap: pd.Timedelta = SPLIT_GAP) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """Split rows at a point in time: the last `test_size` of distinct timestamps are the test set"""
+    cut = split_time(np.unique(df['timestamp'].to_numpy()), test_size)
+    timestamps = df['timestamp'].to_numpy()
+    return df[timestamps < cut - gap], df[timestamps >= cut]
+
+
+def rolling_origin_splits(timestamps, n_splits: int = 3,
+                          gap: pd.Timedelta = SPLIT_GAP) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+    """Yield (train, validation) row indices for expanding-window time-series CV.
+
+    Distinct timestamps are cut into n_splits + 1 equal blocks; fold k trains
+    on everything before block k + 1 and validates on that block.
+    """
+    timestamps = np.asarray(timestamps)
+    times = np.unique(timestamps)
+    bounds = [times[len(times) * k // (n_splits + 1)] for k in range(1, n_splits + 1)] + [None]
+    for start, end in zip(bounds[:-1], bounds[1:]):
+        train = np.flatnonzero(timestamps < start - gap)
+        in_window = timestamps >= start
+        if end is not None:
+            in_window &= timestamps < end
+        yield train, np.flatnonzero(in_window)
+
+
+def sample_params(n_trials: int, seed: int = 42) -> List[dict]:
+    """Random draws from PARAM_SPACE, identical for a given seed"""
+    return list(ParameterSampler(PARAM_SPACE, n_iter=n_trials, random_state=seed))
+
+
+# Per-process copy of the search data, installed once by _init_worker
+_worker_data = {}
+
+
+def _init_worker(X: np.ndarray, y: np.ndarray, folds: list, nthread: int):
+    _worker_data.update(X=X, y=y, folds=folds, nthread=nthread)
+
+
+def evaluate_params(params: dict, X: np.ndarray, y: np.ndarray, folds: list, nthread: int = 1) -> dict:
+    """Cross-validated RMSE of one parameter set, early stopping on each fold's validation block"""
+    fold_rmse, fold_rounds = [], []
+    for train, val in folds:
+        model = xgb.XGBRegressor(
+            objective='reg:squarederror', n_estimators=SEARCH_ESTIMATORS, random_state=42,
+            early_stopping_rounds=EARLY_STOPPING_ROUNDS, n_jobs=nthread, **params
+        )
+        model.fit(X[train], y[train], eval_set=[(X[val], y[val])], verbose=False)
+        fold_rmse.append(float(model.evals_result()['validation_0']['rmse'][model.best_iteration]))
+        fold_rounds.append(model.best_iteration + 1)
+    return {
+        "params": params,
+        "cv_rmse": float(np.mean(fold_rmse)),
+        "fold_rmse": fold_rmse,
+        "best_rounds": int(np.mean(fold_rounds))
+    }
+
+
+def _run_trial(params: dict) -> dict:
+    data = _worker_data
+    return evaluate_params(params, data['X'], data['y'], data['folds'], data['nthread'])
+
+
+def search(df: pd.DataFrame, n_trials: int = 20, n_workers: int = 1, n_splits: int = 3,
+           nthread: Optional[int] = None, seed: int = 42,
+           on_result: Optional[Callable[[dict], None]] = None, gap: pd.Timedelta = SPLIT_GAP) -> List[dict]:
+    """Random search over PARAM_SPACE with rolling-origin CV, trials run in a process pool.
+
+    Each worker trains with `nthread` threads (default: the CPUs divided
+    among the workers) so the pool never runs more threads than cores.
+    `on_result` is called in this process as each trial finishes. Returns
+    the trials sorted by CV RMSE, best first.
+    """
+    X = df[FEATURE_COLS].to_numpy(dtype=np.float32)
+    y = df['target_aqi'].to_numpy(dtype=np.float32)
+    folds = list(rolling_origin_splits(df['timestamp'].to_numpy(), n_splits, gap))
+    nthread = nthread or max(1, (os.cpu_count() or 1) // n_workers)
+
+    results = []
+    # Spawned workers start without the parent's OpenMP thread pool, which
+    # does not survive a fork
+    with ProcessPoolExecutor(max_workers=n_workers, mp_context=multiprocessing.get_context("spawn"),
+                             initializer=_init_worker, initargs=(X, y, folds, nthread)) as pool:
+        futures = [pool.submit(_run_trial, params) for params in sample_params(n_trials, seed)]
+        for future in as_completed(futures):
+            result = future.result()
+            results.append(result)
+            if on_result is not None:
+                on_result(result)
+
+    return sorted(results, key=lambda result: result['cv_rmse'])
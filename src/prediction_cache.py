@@ -0,0 +1,121 @@
+import hashlib
+import struct
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+import numpy as np
+
+try:
+    from src.cache import TTLCache
+    from src.feature_builder import LAG_FEATURE_COLS
+except ImportError:
+    from cache import TTLCache
+    from feature_builder import LAG_FEATURE_COLS
+
+PREDICTION_KEY_PREFIX = "prediction:"
+
+# Readings snapped to the quantum; hour, day_of_week and month are already discrete
+QUANTIZED_FIELDS = ('pm2_5', 'pm10', 'no2', 'so2', 'o3', 'co')
+
+_VALUE = struct.Struct('<dd')
+
+
+class PredictionCache:
+    """Cache of (predicted_aqi, health_risk_score) keyed on everything the model sees.
+
+    A key holds the model version, the time features (hour, day of week
+    and the month the prediction is made in), the request readings snapped
+    to `quantum` (0 keeps them exact) and the serve-time lag features, so a
+    cached prediction is what the model would return for the snapped
+    request; new observations or a new model simply produce new keys.
+    Lookups go to an in-process LRU first, then to Redis when a client is
+    set, which lets replicas share results.
+    """
+
+    def __init__(self, maxsize: int = 10_000, ttl: float = 3600.0, quantum: float = 0.0,
+                 redis_client=None, redis_ttl: int = 3600):
+        self.local = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.maxsize = maxsize
+        self.quantum = quantum
+        self.redis_client = redis_client
+        self.redis_ttl = redis_ttl
+
+        self.redis_hits = 0
+        self.redis_seconds = 0.0
+        self.computes = 0
+        self.compute_seconds = 0.0
+
+    @property
+    def enabled(self) -> bool:
+        return self.maxsize > 0
+
+    def quantize(self, request):
+        """The request with its readings snapped to the quantum (a pydantic model copy)"""
+        if self.quantum <= 0:
+            return request
+        q = self.quantum
+        return request.model_copy(update={
+            field: round(getattr(request, field) / q) * q for field in QUANTIZED_FIELDS
+        })
+
+    def key(self, version: Optional[str], request, lags: Optional[Dict[str, float]], month: int) -> Tuple:
+        """Hashable key of one prediction; NaN lags become None so equal inputs give equal keys"""
+        lag_values = (None,) if lags is None else tuple(
+            None if np.isnan(lags[col]) else float(lags[col]) for col in LAG_FEATURE_COLS
+        )
+        readings = tuple(float(getattr(request, field)) for field in QUANTIZED_FIELDS)
+        return (version, request.hour, request.day_of_week, month) + readings + lag_values
+
+    def _redis_key(self, key: Tuple) -> str:
+        digest = hashlib.blake2b(repr(key[1:]).encode(), digest_size=16).hexdigest()
+        return f"{PREDICTION_KEY_PREFIX}{key[0]}:{digest}"
+
+    async def get(self, key: Tuple, compute: Callable[[], Awaitable[Tuple[float, float]]]) -> Tuple[float, float]:
+        """Cached value for key, else the shared tier, else compute() (once for concurrent callers)"""
+        async def load():
+            if self.redis_client is not None:
+                start = time.perf_counter()
+                try:
+                    data = await self.redis_client.get(self._redis_key(key))
+                except Exception as e:
+                    print(f"Warning: Prediction cache read failed: {e}")
+                    data = None
+                if data is not None:
+                    self.redis_hits += 1
+                    self.redis_seconds += time.perf_counter() - start
+                    return _VALUE.unpack(data)
+
+            start = time.perf_counter()
+            value = await compute()
+            self.computes += 1
+            self.compute_seconds += time.perf_counter() - start
+
+            if self.redis_client is not None:
+                try:
+                    await self.redis_client.set(self._redis_key(key), _VALUE.pack(*value), ex=self.redis_ttl)
+                except Exception as e:
+                    print(f"Warning: Prediction cache write failed: {e}")
+            return value
+
+        return await self.local.get(key, load)
+
+    def clear(self):
+        """Drop local entries, e.g. after a model reload; shared entries expire on their own"""
+        self.local.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        local = self.local.stats()
+        lookups = local['hits'] + local['misses'] + local['coalesced']
+        mean_compute = self.compute_seconds / self.computes if self.computes else 0.0
+        mean_redis = self.redis_seconds / self.redis_hits if self.redis_hits else 0.0
+        saved = (local['hits'] + local['coalesced']) * mean_compute + self.redis_hits * (mean_compute - mean_redis)
+        return {
+            **local,
+            "quantum": self.quantum,
+            "redis_hits": self.redis_hits,
+            "computes": self.computes,
+            "hit_rate": (lookups - self.computes) / lookups if lookups else 0.0,
+            "mean_compute_ms": mean_compute * 1000,
+            "mean_redis_hit_ms": mean_redis * 1000,
+            "estimated_seconds_saved": saved
+        }
@@ -0,0 +1,214 @@
+from datetime import datetime, timezone
+from typing import TYPE_CHECKING, Dict, List, Optional, Sequence
+
+import numpy as np
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+# pandas, SQLAlchemy and the writer are imported where used: the API only
+# reads history, and shouldn't pay for the pipeline's aggregation code at startup
+
+# Per-city aggregates kept for each resolution, so history queries never read feature rows
+ROLLUP_FIELDS = ('aqi', 'pm2_5', 'pm10', 'no2', 'so2', 'o3', 'co', 'health_risk_score')
+ROLLUP_STATS = ('min', 'mean', 'max', 'p95')
+RESOLUTIONS = ('hourly', 'daily', 'weekly')
+
+# Points returned by a history query before downsampling kicks in
+HISTORY_MAX_POINTS = 1000
+
+
+def rollup_table(resolution: str) -> str:
+    return f"aqi_rollup_{resolution}"
+
+
+def rollup_columns(fields: Sequence[str] = ROLLUP_FIELDS) -> List[str]:
+    return [f"{field}_{stat}" for field in fields for stat in ROLLUP_STATS]
+
+
+def bucket_start(timestamps: 'pd.Series', resolution: str) -> 'pd.Series':
+    """Start of the bucket each timestamp falls in; weeks start on Monday"""
+    import pandas as pd
+
+    timestamps = pd.to_datetime(timestamps)
+    if resolution == 'hourly':
+        return timestamps.dt.floor('h')
+    days = timestamps.dt.normalize()
+    if resolution == 'daily':
+        return days
+    return days - pd.to_timedelta(days.dt.dayofweek, unit='D')
+
+
+def rollups_exist(engine, resolution: str) -> bool:
+    """Whether the pipeline has created a resolution's rollup table yet"""
+    from sqlalchemy import inspect
+
+    return inspect(engine).has_table(rollup_table(resolution))
+
+
+def compute_rollups(df: 'pd.DataFrame', resolution: str) -> 'pd.DataFrame':
+    """Row count and min/mean/max/p95 of each field per city and bucket"""
+    import pandas as pd
+
+    fields = [field for field in ROLLUP_FIELDS if field in df.columns]
+    grouped = df[fields].groupby([df['city'].astype(str), bucket_start(df['timestamp'], resolution).rename('bucket')])
+
+    stats = grouped.agg(['min', 'mean', 'max'])
+    stats.columns = [f"{field}_{stat}" for field, stat in stats.columns]
+    p95 = grouped.quantile(0.95)
+    p95.columns = [f"{field}_p95" for field in p95.columns]
+
+    rollups = pd.concat([grouped.size().rename('n'), stats, p95], axis=1)
+    return rollups[['n'] + rollup_columns(fields)].reset_index()
+
+
+def refresh_start(timestamps: 'pd.Series') -> 'pd.Timestamp':
+    """Earliest bucket start, at any resolution, that rows at these timestamps fall in"""
+    import pandas as pd
+
+    return bucket_start(pd.Series([pd.to_datetime(timestamps).min()]), 'weekly').iloc[0]
+
+
+def write_rollups(engine, df: 'pd.DataFrame', resolutions: Sequence[str] = RESOLUTIONS) -> Dict[str, int]:
+    """Upsert the rollups of df's rows; df must hold every row of the buckets it touches"""
+    try:
+        from src.db_writer import FeatureTableWriter
+    except ImportError:
+        from db_writer import FeatureTableWriter
+
+    return {
+        resolution: FeatureTableWriter(engine, rollup_table(resolution), key_cols=('city', 'bucket'))
+        .write(compute_rollups(df, resolution))
+        for resolution in resolutions
+    }
+
+
+def lttb(x: np.ndarray, y: np.ndarray, n_out: int) -> np.ndarray:
+    """Indices of the points Largest-Triangle-Three-Buckets keeps when reducing x, y to n_out points.
+
+    The first and last points are always kept; from each bucket in between
+    it keeps the point forming the largest triangle with the previously
+    kept point and the next bucket's average, which preserves peaks.
+    """
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    # Gaps would never be picked (NaN areas) and would spoil the bucket averages
+    y = np.where(np.isnan(y), np.nanmean(y) if np.isfinite(y).any() else 0.0, y)
+
+    edges = np.append((np.arange(n_out - 1) * ((n - 2) / (n_out - 2))).astype(np.int64) + 1, n)
+    sizes = np.diff(edges)
+    avg_x = np.add.reduceat(x, edges[:-1]) / sizes
+    avg_y = np.add.reduceat(y, edges[:-1]) / sizes
+
+    selected = np.empty(n_out, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    a = 0
+    if n > 64 * n_out:
+        # Large buckets: vectorize within each bucket
+        for i in range(n_out - 2):
+            lo, hi = edges[i], edges[i + 1]
+            # Twice the triangle area; the constant factor doesn't change the argmax
+            area = np.abs((x[a] - avg_x[i + 1]) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (avg_y[i + 1] - y[a]))
+            a = lo + int(np.argmax(area))
+            selected[i + 1] = a
+        return selected
+
+    # Small buckets (the usual case for rollups): plain floats beat per-slice numpy calls
+    xs, ys, bounds = x.tolist(), y.tolist(), edges.tolist()
+    next_x, next_y = avg_x.tolist(), avg_y.tolist()
+    for i in range(n_out - 2):
+        ax, ay = xs[a], ys[a]
+        dx, dy = next_x[i + 1] - ax, next_y[i + 1] - ay
+        best = -1.0
+        for j in range(bounds[i], bounds[i + 1]):
+            area = abs(dx * (ys[j] - ay) - (xs[j] - ax) * dy)
+            if area > best:
+                best, a = area, j
+        selected[i + 1] = a
+    return selected
+
+
+def _json_values(values: np.ndarray) -> list:
+    # Three decimals is beyond sensor precision and halves the JSON size and encoding time
+    return [None if value != value else value for value in np.round(values, 3).tolist()]
+
+
+def _datetimes(values: list) -> np.ndarray:
+    """Bucket values as the driver returns them (datetimes, or text on SQLite) as datetime64[us]"""
+    return np.array(values, dtype='datetime64[us]')
+
+
+def _bound(engine, value) -> object:
+    """A range bound in the form stored timestamps compare against (naive UTC)"""
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    # SQLite stores the writer's text timestamps; compare strings of the same format
+    return value.strftime('%Y-%m-%d %H:%M:%S.%f') if engine.dialect.name == 'sqlite' else value
+
+
+def read_history(engine, city: str, resolution: str, start: Optional[datetime] = None,
+                 end: Optional[datetime] = None, fields: Sequence[str] = ROLLUP_FIELDS,
+                 max_points: int = HISTORY_MAX_POINTS) -> Optional[dict]:
+    """A city's rollups between start (inclusive) and end (exclusive), downsampled to max_points.
+
+    Index range scans on (city, bucket) only. When the range holds more
+    buckets than max_points, the first field's mean is read alone and
+    downsampled with LTTB, then full rows are fetched for the kept buckets,
+    so long ranges never transfer every column of every bucket.
+    Returns None when the city has no rollups in the range.
+    """
+    from sqlalchemy import bindparam, text
+
+    table = rollup_table(resolution)
+    conditions = ['"city" = :city']
+    params = {'city': city}
+    if start is not None:
+        conditions.append('"bucket" >= :start')
+        params['start'] = _bound(engine, start)
+    if end is not None:
+        conditions.append('"bucket" < :end')
+        params['end'] = _bound(engine, end)
+    where = " AND ".join(conditions)
+    columns = ['n'] + rollup_columns(fields)
+    selected = ", ".join(f'"{col}"' for col in columns)
+
+    with engine.connect() as conn:
+        primary = conn.execute(
+            text(f'SELECT "bucket", "{fields[0]}_mean" FROM "{table}" WHERE {where} ORDER BY "bucket"'), params
+        ).fetchall()
+        if not primary:
+            return None
+
+        if len(primary) > max_points:
+            x = _datetimes([row[0] for row in primary]).view(np.int64) / 1e6
+            y = np.array([row[1] for row in primary], dtype=np.float64)
+            # Buckets are passed back as the driver returned them, so they match stored values exactly
+            keep = [primary[i][0] for i in lttb(x, y, max_points)]
+            query = text(
+                f'SELECT "bucket", {selected} FROM "{table}" '
+                f'WHERE "city" = :city AND "bucket" IN :buckets ORDER BY "bucket"'
+            ).bindparams(bindparam('buckets', expanding=True))
+            rows = conn.execute(query, {'city': city, 'buckets': keep}).fetchall()
+        else:
+            rows = conn.execute(
+                text(f'SELECT "bucket", {selected} FROM "{table}" WHERE {where} ORDER BY "bucket"'), params
+            ).fetchall()
+
+    buckets = _datetimes([row[0] for row in rows])
+    values = np.array([row[1:] for row in rows], dtype=np.float64)
+
+    return {
+        "city": city,
+        "resolution": resolution,
+        "rows": len(primary),
+        "downsampled": len(rows) < len(primary),
+        "timestamp": np.datetime_as_string(buckets, unit='s').tolist(),
+        "n": values[:, 0].astype(np.int64).tolist(),
+        "series": {col: _json_values(values[:, i]) for i, col in enumerate(columns) if col != 'n'}
+    }
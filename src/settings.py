@@ -0,0 +1,45 @@
+from functools import lru_cache
+from typing import Optional
+
+from pydantic_settings import BaseSettings, SettingsConfigDict
+
+
+class Settings(BaseSettings):
+    """Connection settings shared by the API and batch jobs, read from the environment or .env"""
+
+    model_config = SettingsConfigDict(env_file=".env", extra="ignore")
+
+    redis_url: Optional[str] = None
+    database_url: Optional[str] = None
+    mlflow_tracking_uri: str = "http://localhost:5000"
+
+
+@lru_cache(maxsize=1)
+def get_settings() -> Settings:
+    return Settings()
+
+
+def connect_redis(settings: Optional[Settings] = None):
+    """Sync Redis client for REDIS_URL, or None when unset; connects on first command"""
+    settings = settings or get_settings()
+    if not settings.redis_url:
+        return None
+    import redis
+    try:
+        return redis.from_url(settings.redis_url)
+    except Exception as e:
+        print(f"Warning: Redis connection failed: {e}")
+        return None
+
+
+def connect_database(settings: Optional[Settings] = None, **engine_kwargs):
+    """SQLAlchemy engine for DATABASE_URL, or None when unset; connects on first query"""
+    settings = settings or get_settings()
+    if not settings.database_url:
+        return None
+    from sqlalchemy import create_engine
+    try:
+        return create_engine(settings.database_url, **engine_kwargs)
+    except Exception as e:
+        print(f"Warning: Database connection failed: {e}")
+        return None
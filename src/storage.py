@@ -0,0 +1,214 @@
+import os
+import shutil
+import uuid
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+
+# Default locations; a path without a .csv suffix is a partitioned Parquet dataset
+RAW_DATA_PATH = os.getenv("RAW_DATA_PATH", "data/raw/aqi_data.csv")
+PROCESSED_DATA_PATH = os.getenv("PROCESSED_DATA_PATH", "data/processed/aqi_features.csv")
+
+# Granularity of the date partition. Hourly data leaves only 24 rows per
+# city-day, so monthly partitions keep files large enough to scan efficiently.
+# Any format that sorts lexicographically in time order works here.
+PARTITION_DATE_FORMAT = os.getenv("PARTITION_DATE_FORMAT", "%Y-%m")
+
+PARTITIONING = ds.partitioning(
+    pa.schema([('city', pa.string()), ('date', pa.string())]),
+    flavor='hive'
+)
+
+
+def is_dataset(path: str) -> bool:
+    """Whether a path refers to a partitioned Parquet dataset rather than a CSV file"""
+    return not path.endswith('.csv')
+
+
+def last_modified(path: str) -> float:
+    """Modification time of a CSV file, or of the newest file in a partitioned dataset.
+
+    Appends add files deep in the partition tree without touching the root
+    directory, so the root's own mtime says nothing about new data.
+    """
+    if not is_dataset(path) or os.path.isfile(path):
+        return os.path.getmtime(path)
+    newest = os.path.getmtime(path)
+    for root, _, files in os.walk(path):
+        for name in files:
+            newest = max(newest, os.path.getmtime(os.path.join(root, name)))
+    return newest
+
+
+def write_partitioned(df: pd.DataFrame, root: str, overwrite: bool = False):
+    """Write rows to a Parquet dataset partitioned by city and date.
+
+    Each call adds new files, so appends never rewrite existing partitions.
+    """
+    if overwrite and os.path.exists(root):
+        shutil.rmtree(root)
+
+    # Format each distinct timestamp once; strftime per row dominates large writes
+    codes, uniques = pd.factorize(pd.to_datetime(df['timestamp']), use_na_sentinel=False)
+    df = df.assign(date=uniques.strftime(PARTITION_DATE_FORMAT).to_numpy(dtype=object)[codes])
+    # Categoricals (e.g. pollution_level) are stored as plain strings
+    for col in df.select_dtypes('category').columns:
+        df[col] = df[col].astype(str)
+
+    ds.write_dataset(
+        pa.Table.from_pandas(df, preserve_index=False),
+        root,
+        format='parquet',
+        partitioning=PARTITIONING,
+        basename_template=f"part-{uuid.uuid4().hex}-{{i}}.parquet",
+        existing_data_behavior='overwrite_or_ignore',
+        # Years of history for hundreds of stations exceed Arrow's default of 1024
+        max_partitions=1_000_000
+    )
+
+
+def read_partitioned(root: str, columns: Optional[List[str]] = None, cities: Optional[List[str]] = None,
+                     start: Optional[datetime] = None, end: Optional[datetime] = None,
+                     predicate: Optional[ds.Expression] = None) -> pd.DataFrame:
+    """Read a partitioned dataset with column projection and predicate pushdown.
+
+    City and time bounds prune whole partitions before any file is opened.
+    `start` is inclusive and `end` exclusive.
+    """
+    dataset = ds.dataset(root, format='parquet', partitioning=PARTITIONING)
+
+    conditions = [] if predicate is None else [predicate]
+    if cities is not None:
+        conditions.append(ds.field('city').isin(list(cities)))
+    if start is not None:
+        start = pd.Timestamp(start)
+        conditions.append(ds.field('date') >= start.strftime(PARTITION_DATE_FORMAT))
+        conditions.append(ds.field('timestamp') >= start.to_pydatetime())
+    if end is not None:
+        end = pd.Timestamp(end)
+        conditions.append(ds.field('date') <= end.strftime(PARTITION_DATE_FORMAT))
+        conditions.append(ds.field('timestamp') < end.to_pydatetime())
+
+    expression = None
+    for condition in conditions:
+        expression = condition if expression is None else expression & condition
+
+    if columns is None:
+        columns = [name for name in dataset.schema.names if name != 'date']
+
+    # self_destruct frees Arrow buffers as columns are converted, capping peak memory
+    table = dataset.to_table(columns=list(columns), filter=expression)
+    return table.to_pandas(split_blocks=True, self_destruct=True)
+
+
+def partition_row_counts(root: str) -> Dict[str, int]:
+    """Rows per city of a partitioned dataset, from Parquet metadata without reading any data"""
+    dataset = ds.dataset(root, format='parquet', partitioning=PARTITIONING)
+    counts: Dict[str, int] = {}
+    for fragment in dataset.get_fragments():
+        city = ds.get_partition_keys(fragment.partition_expression).get('city')
+        counts[city] = counts.get(city, 0) + fragment.count_rows()
+    return counts
+
+
+def iter_chunks(path: str, columns: Optional[List[str]] = None,
+                chunk_rows: int = 500_000) -> Iterator[pd.DataFrame]:
+    """Stream a CSV file or partitioned dataset in chunks of at most `chunk_rows`, in no particular order"""
+    if is_dataset(path):
+        dataset = ds.dataset(path, format='parquet', partitioning=PARTITIONING)
+        if columns is None:
+            columns = [name for name in dataset.schema.names if name != 'date']
+        for batch in dataset.to_batches(columns=list(columns), batch_size=chunk_rows):
+            if batch.num_rows:
+                yield batch.to_pandas()
+        return
+
+    yield from pd.read_csv(path, usecols=columns, chunksize=chunk_rows)
+
+
+def load_frame(path: str, columns: Optional[List[str]] = None, cities: Optional[List[str]] = None,
+               start: Optional[datetime] = None, end: Optional[datetime] = None) -> pd.DataFrame:
+    """Load a CSV file or a partitioned Parquet dataset.
+
+    Filters are pushed down for datasets and applied after parsing for CSV files.
+    """
+    if is_dataset(path):
+        return read_partitioned(path, columns=columns, cities=cities, start=start, end=end)
+
+    usecols = None
+    if columns is not None:
+        needed = list(columns)
+        if cities is not None:
+            needed.append('city')
+        if start is not None or end is not None:
+            needed.append('timestamp')
+        usecols = list(dict.fromkeys(needed))
+
+    header = pd.read_csv(path, nrows=0).columns
+    parse_dates = ['timestamp'] if 'timestamp' in header and (usecols is None or 'timestamp' in usecols) else None
+    df = pd.read_csv(path, usecols=usecols, parse_dates=parse_dates)
+
+    if cities is not None:
+        df = df[df['city'].isin(cities)]
+    if start is not None:
+        df = df[df['timestamp'] >= pd.Timestamp(start)]
+    if end is not None:
+        df = df[df['timestamp'] < pd.Timestamp(end)]
+    return df if columns is None else df[list(columns)]
+
+
+def load_since(path: str, since: datetime, known_cities: List[str]) -> pd.DataFrame:
+    """Load rows at or after `since`, plus the full history of cities not in `known_cities`"""
+    since = pd.Timestamp(since)
+    if is_dataset(path):
+        predicate = (
+            (ds.field('date') >= since.strftime(PARTITION_DATE_FORMAT)) & (ds.field('timestamp') >= since.to_pydatetime())
+        ) | ~ds.field('city').isin(list(known_cities))
+        return read_partitioned(path, predicate=predicate)
+
+    df = load_frame(path)
+    return df[(df['timestamp'] >= since) | ~df['city'].isin(known_cities)]
+
+
+def save_frame(df: pd.DataFrame, path: str, append: bool = False):
+    """Save to a CSV file or a partitioned Parquet dataset, appending or replacing"""
+    if is_dataset(path):
+        write_partitioned(df, path, overwrite=not append)
+        return
+
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    if append and os.path.exists(path):
+        df.to_csv(path, mode='a', header=False, index=False)
+    else:
+        df.to_csv(path, index=False)
+
+
+def migrate_csv(csv_path: str, dataset_path: str, chunksize: int = 1_000_000):
+    """Convert an existing CSV file into a partitioned Parquet dataset"""
+    total = 0
+    for i, chunk in enumerate(pd.read_csv(csv_path, parse_dates=['timestamp'], chunksize=chunksize)):
+        write_partitioned(chunk, dataset_path, overwrite=(i == 0))
+        total += len(chunk)
+        print(f"Migrated {total} rows...")
+
+    print(f"✅ {csv_path} migrated to {dataset_path}")
+    return total
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Storage utilities")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    migrate = subparsers.add_parser("migrate", help="Convert a CSV file to a partitioned Parquet dataset")
+    migrate.add_argument("csv_path")
+    migrate.add_argument("dataset_path")
+    migrate.add_argument("--chunksize", type=int, default=1_000_000)
+
+    args = parser.parse_args()
+    if args.command == "migrate":
+        migrate_csv(args.csv_path, args.dataset_path, args.chunksize)
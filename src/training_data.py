@@ -0,0 +1,158 @@
+from typing import Dict, Iterator, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+import xgboost as xgb
+
+try:
+    from src.feature_builder import FEATURE_COLS
+    from src.lag_engine import grid_steps, sort_groups
+    from src.param_search import SPLIT_GAP, split_time
+    from src.storage import PROCESSED_DATA_PATH, is_dataset, partition_row_counts, read_partitioned
+except ImportError:
+    from feature_builder import FEATURE_COLS
+    from lag_engine import grid_steps, sort_groups
+    from param_search import SPLIT_GAP, split_time
+    from storage import PROCESSED_DATA_PATH, is_dataset, partition_row_counts, read_partitioned
+
+# Rows of features held in memory at once while streaming into XGBoost
+CHUNK_ROWS = 500_000
+
+# Columns add_target needs besides the features
+TARGET_COLS = ['city', 'timestamp', 'aqi']
+
+
+def add_target(df: pd.DataFrame, freq: str = "1h", horizon: int = 1) -> pd.DataFrame:
+    """Add 'target_aqi', the AQI `horizon` steps of `freq` later in the same city, and drop rows without one.
+
+    Rows must be sorted by city and time. A missing observation at the
+    target step leaves no target rather than borrowing a later row's.
+    """
+    codes = pd.factorize(df['city'])[0]
+    steps = grid_steps(df['timestamp'], freq)
+    aqi = df['aqi'].to_numpy(dtype=np.float64)
+
+    target = np.full(len(df), np.nan)
+    if len(df):
+        # (city, step) packed into one key that increases along the sorted rows
+        span = int(steps.max() - steps.min()) + horizon + 1
+        keys = codes.astype(np.int64) * span + (steps - steps.min())
+        rows = np.minimum(np.searchsorted(keys, keys + horizon), len(df) - 1)
+        found = keys[rows] == keys + horizon
+        target[found] = aqi[rows[found]]
+
+    df = df.assign(target_aqi=target)
+    return df[~np.isnan(target)]
+
+
+def city_batches(counts: Dict[str, int], chunk_rows: int = CHUNK_ROWS) -> List[List[str]]:
+    """Group cities, in sorted order, into batches of at most chunk_rows rows (or one larger city)"""
+    batches, rows = [], 0
+    for city, count in sorted(counts.items()):
+        if not batches or rows + count > chunk_rows:
+            batches.append([])
+            rows = 0
+        batches[-1].append(city)
+        rows += count
+    return batches
+
+
+def iter_feature_chunks(filepath: str = PROCESSED_DATA_PATH, columns: Optional[List[str]] = None,
+                        chunk_rows: int = CHUNK_ROWS,
+                        counts: Optional[Dict[str, int]] = None) -> Iterator[pd.DataFrame]:
+    """Yield processed features a few whole cities at a time, sorted by city and time.
+
+    Parquet datasets are read by city partition, sized from file metadata
+    (or `counts`, rows per city, when already known).
+    CSV files are read sequentially and must already be grouped by city, as
+    the feature pipeline writes them; a city is held back until its last row
+    has been read. A single city larger than chunk_rows is yielded whole.
+    """
+    if is_dataset(filepath):
+        for batch in city_batches(counts or partition_row_counts(filepath), chunk_rows):
+            yield sort_groups(read_partitioned(filepath, columns=columns, cities=batch))
+        return
+
+    done = set()
+    pending = None
+    for chunk in pd.read_csv(filepath, usecols=columns, parse_dates=['timestamp'], chunksize=chunk_rows):
+        if pending is not None:
+            chunk = pd.concat([pending, chunk], ignore_index=True)
+        city = chunk['city'].to_numpy()
+        # The trailing run of one city may continue in the next chunk
+        split = np.flatnonzero(city != city[-1])
+        split = split[-1] + 1 if len(split) else 0
+        ready, pending = chunk.iloc[:split], chunk.iloc[split:]
+        if ready.empty:
+            continue
+
+        cities = set(ready['city'].unique())
+        if cities & done:
+            raise ValueError(f"{filepath} is not grouped by city; rewrite it sorted or use a Parquet dataset")
+        done |= cities
+        yield sort_groups(ready)
+
+    if pending is not None and not pending.empty:
+        if pending['city'].iloc[0] in done:
+            raise ValueError(f"{filepath} is not grouped by city; rewrite it sorted or use a Parquet dataset")
+        yield sort_groups(pending)
+
+
+def streamed_split_time(filepath: str = PROCESSED_DATA_PATH, test_size: float = 0.2,
+                        chunk_rows: int = CHUNK_ROWS, counts: Optional[Dict[str, int]] = None) -> np.datetime64:
+    """The cut param_search.time_split would choose on the rows with a target, from one pass over three columns"""
+    times = np.array([], dtype='datetime64[ns]')
+    for chunk in iter_feature_chunks(filepath, TARGET_COLS, chunk_rows, counts):
+        times = np.union1d(times, add_target(chunk)['timestamp'].to_numpy('datetime64[ns]'))
+    return split_time(times, test_size)
+
+
+class FeatureChunkIter(xgb.DataIter):
+    """Feeds float32 feature chunks to a QuantileDMatrix or external-memory DMatrix.
+
+    Only one chunk is materialized at a time, so peak memory follows
+    `chunk_rows` rather than the size of the dataset. Rows split at `cut`
+    as in param_search.time_split: training rows end `gap` before it, and
+    `holdout` selects the test rows from it on instead.
+    """
+
+    def __init__(self, filepath: str, cut: np.datetime64, feature_cols: Sequence[str] = FEATURE_COLS,
+                 chunk_rows: int = CHUNK_ROWS, holdout: bool = False, gap: pd.Timedelta = SPLIT_GAP,
+                 cache_prefix: Optional[str] = None, counts: Optional[Dict[str, int]] = None):
+        self.filepath = filepath
+        self.cut = np.datetime64(cut, 'ns')
+        self.feature_cols = list(feature_cols)
+        self.chunk_rows = chunk_rows
+        self.holdout = holdout
+        self.gap = gap.to_timedelta64()
+        self.rows = 0
+        self._chunks = None
+        # Rows per city, counted once; XGBoost makes several passes
+        self._counts = counts
+        super().__init__(cache_prefix=cache_prefix)
+
+    def next(self, input_data) -> bool:
+        if self._chunks is None:
+            columns = list(dict.fromkeys(TARGET_COLS + self.feature_cols))
+            if self._counts is None and is_dataset(self.filepath):
+                self._counts = partition_row_counts(self.filepath)
+            self._chunks = iter_feature_chunks(self.filepath, columns, self.chunk_rows, self._counts)
+            self.rows = 0
+
+        for chunk in self._chunks:
+            chunk = add_target(chunk)
+            timestamps = chunk['timestamp'].to_numpy('datetime64[ns]')
+            chunk = chunk[timestamps >= self.cut if self.holdout else timestamps < self.cut - self.gap]
+            if chunk.empty:
+                continue
+            self.rows += len(chunk)
+            input_data(
+                data=chunk[self.feature_cols].to_numpy(dtype=np.float32),
+                label=chunk['target_aqi'].to_numpy(dtype=np.float32),
+                feature_names=self.feature_cols
+            )
+            return True
+        return False
+
+    def reset(self):
+        self._chunks = None
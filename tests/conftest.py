@@ -0,0 +1,68 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+# Modules import each other as src.<module>; make the repository root importable
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def _raw_data(n_hours: int, n_cities: int = 5, seed: int = 42) -> pd.DataFrame:
+    """Hourly synthetic raw observations for several cities"""
+    rng = np.random.default_rng(seed)
+    n = n_hours * n_cities
+    timestamps = pd.date_range("2024-01-01", periods=n_hours, freq="h")
+    return pd.DataFrame({
+        'timestamp': np.tile(timestamps, n_cities),
+        'city': np.repeat([f"City_{i:03d}" for i in range(n_cities)], n_hours),
+        'aqi': rng.integers(1, 6, n),
+        'co': rng.uniform(100, 300, n),
+        'no': rng.uniform(0, 1, n),
+        'no2': rng.uniform(0, 50, n),
+        'o3': rng.uniform(0, 100, n),
+        'so2': rng.uniform(0, 20, n),
+        'pm2_5': rng.uniform(5, 200, n),
+        'pm10': rng.uniform(10, 300, n),
+        'nh3': rng.uniform(0, 10, n)
+    })
+
+
+@pytest.fixture(scope="session")
+def make_raw_data():
+    """Factory of hourly raw observations: make_raw_data(n_hours, n_cities=5, seed=42)"""
+    return _raw_data
+
+
+@pytest.fixture
+def raw_data() -> pd.DataFrame:
+    """90 days of hourly observations for 5 cities with ~5% of collection runs missed"""
+    raw = _raw_data(24 * 90)
+    return raw[np.random.default_rng(0).random(len(raw)) > 0.05]
+
+
+@pytest.fixture(scope="session")
+def model():
+    """A small XGBoost model on the serving features, fit to random data"""
+    import xgboost as xgb
+    from src.feature_builder import FEATURE_COLS
+
+    rng = np.random.default_rng(42)
+    X = pd.DataFrame(rng.uniform(0, 200, size=(2000, len(FEATURE_COLS))), columns=FEATURE_COLS)
+    y = rng.uniform(0, 300, size=len(X))
+    return xgb.XGBRegressor(
+        objective='reg:squarederror', n_estimators=100, learning_rate=0.1, max_depth=6, random_state=42
+    ).fit(X, y)
+
+
+@pytest.fixture
+def api(model, monkeypatch):
+    """The API module serving `model`, with an empty prediction cache"""
+    from src import api
+    from src.prediction_cache import PredictionCache
+
+    monkeypatch.setattr(api, "serving", None)
+    api.set_model(model)
+    monkeypatch.setattr(api, "prediction_cache", PredictionCache(maxsize=100))
+    return api
@@ -0,0 +1,82 @@
+import asyncio
+import struct
+
+import httpx
+import pytest
+from fastapi import HTTPException
+from prometheus_client.parser import text_string_to_metric_families
+
+from src.cache import VersionedCache
+from src.cache_codec import LATEST_VERSION_KEY, forecast_key, latest_key
+from src.feature_builder import health_risk_score
+from src.prediction_cache import PredictionCache
+
+
+def reading(city: str, pm2_5: float) -> dict:
+    return dict(pm2_5=pm2_5, pm10=120.3, no2=30.7, so2=8.1, o3=40.9, co=250.0, city=city, hour=9, day_of_week=2)
+
+
+def score(request) -> float:
+    return round(health_risk_score(request.pm2_5, request.pm10, request.no2, request.o3, request.so2), 4)
+
+
+@pytest.mark.parametrize("cached", [False, True])
+def test_prediction_is_a_rounded_python_float(api, monkeypatch, cached):
+    if not cached:
+        monkeypatch.setattr(api, "prediction_cache", PredictionCache(maxsize=0))
+    request = api.PredictionRequest(**reading("Lahore", 80.3))
+    response = asyncio.run(api.predict_health_risk(request))
+
+    assert type(response["predicted_aqi"]) is float
+    assert response["predicted_aqi"] == round(response["predicted_aqi"], 4)
+    assert response["health_risk_score"] == score(request)
+
+
+def test_batch_predictions_are_rounded_python_floats(api):
+    request = api.BatchPredictionRequest(records=[reading(f"City_{i}", 10.7 * i) for i in range(5)])
+    response = asyncio.run(api.predict_health_risk_batch(request))
+
+    for record, prediction in zip(request.records, response["predictions"]):
+        assert type(prediction["predicted_aqi"]) is float
+        assert prediction["predicted_aqi"] == round(prediction["predicted_aqi"], 4)
+        assert prediction["health_risk_score"] == score(record)
+
+
+def test_records_written_by_an_older_codec_are_misses(api, monkeypatch):
+    fakeredis = pytest.importorskip("fakeredis")
+    client = fakeredis.FakeAsyncRedis()
+    monkeypatch.setattr(api, "redis_client", client)
+    monkeypatch.setattr(api, "current_cache", VersionedCache(client, LATEST_VERSION_KEY))
+
+    async def run():
+        # What the first binary codec left in Redis before a deploy
+        await client.set(latest_key("Lahore"), struct.pack('<Bd12f', 1, 1.7e9, *range(12)))
+        await client.set(forecast_key("Lahore"), struct.pack('<Bd16s', 0, 1.7e9, b"v1") + bytes(8))
+        for request in (api.get_current_aqi("Lahore"), api.get_forecast("Lahore", hours=24)):
+            with pytest.raises(HTTPException) as missing:
+                await request
+            assert missing.value.status_code == 404
+
+    asyncio.run(run())
+
+
+def test_metrics_endpoint_reports_routes_stages_and_caches(api):
+    async def run():
+        transport = httpx.ASGITransport(app=api.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://metrics") as client:
+            assert (await client.post("/api/predict", json=reading("Lahore", 80.3))).status_code == 200
+            assert (await client.get("/api/missing/route")).status_code == 404
+            return await client.get("/metrics")
+
+    response = asyncio.run(run())
+    families = {family.name: family for family in text_string_to_metric_families(response.text)}
+    counts = {
+        (s.labels['route'], s.labels['status']): s.value
+        for s in families['aqi_api_request_seconds'].samples if s.name.endswith('_count')
+    }
+    stages = {s.labels['stage'] for s in families['aqi_api_stage_seconds'].samples}
+
+    # Routes are labelled by template, and unknown paths share one label
+    assert counts[("/api/predict", "200")] >= 1 and counts[("unmatched", "404")] >= 1
+    assert {"feature_store", "feature_build", "inference"} <= stages
+    assert "aqi_current_cache_hits" in families and "aqi_prediction_cache_hits" in families
@@ -0,0 +1,43 @@
+import contextlib
+import io
+import struct
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.cache_codec import decode_forecast, decode_latest, encode_forecast, encode_latest
+from src.feature_engineering import FeatureEngineer
+
+
+def test_latest_record_keeps_every_field_of_the_json_record(make_raw_data):
+    with contextlib.redirect_stdout(io.StringIO()):
+        df = FeatureEngineer().process_features(make_raw_data(48))
+    # The first hour has no lags, so missing values are covered too
+    for latest in (df.groupby('city').head(1), df.groupby('city').tail(1)):
+        payloads = encode_latest(latest)
+        for _, row in latest.iterrows():
+            # What the pipeline cached as JSON before the binary codec
+            expected = row.to_dict()
+            expected['timestamp'] = str(expected['timestamp'])
+            record = decode_latest(payloads[row['city']], row['city'])
+
+            assert record.keys() == expected.keys()
+            for field, value in expected.items():
+                if pd.isna(value):
+                    assert record[field] is None, field
+                elif isinstance(value, str):
+                    assert record[field] == value, field
+                else:
+                    assert record[field] == pytest.approx(value, rel=1e-6, abs=1e-4), field
+
+
+def test_records_of_another_layout_are_cache_misses():
+    # A latest record as the first binary codec wrote it: version 1, no pollution level, 12 fields
+    old_latest = struct.pack('<Bd12f', 1, 1.7e9, *range(12))
+    assert decode_latest(old_latest, "Lahore") is None
+
+    forecast = encode_forecast(1.7e9, "v3", np.arange(48, dtype=np.float32))
+    assert decode_forecast(forecast)['model_version'] == "v3"
+    assert decode_forecast(b'\x09' + forecast[1:]) is None
+    assert decode_forecast(forecast[:10]) is None
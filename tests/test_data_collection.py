@@ -0,0 +1,52 @@
+import contextlib
+import io
+
+import httpx
+import pytest
+
+from src.benchmarks import start_mock_openweather_server
+from src.data_collection import AirQualityDataCollector
+
+
+@pytest.fixture
+def collect(monkeypatch):
+    """Collect every city from a mock server; returns (rows, requests per latitude)"""
+    servers, requests = [], {}
+    get = httpx.AsyncClient.get
+
+    async def counted_get(client, url, params=None, **kwargs):
+        requests[str(params['lat'])] = requests.get(str(params['lat']), 0) + 1
+        return await get(client, url, params=params, **kwargs)
+
+    monkeypatch.setattr(httpx.AsyncClient, "get", counted_get)
+
+    def run(failures: dict, max_retries: int = 3):
+        server, base_url = start_mock_openweather_server(latency=0.01, failures=failures)
+        servers.append(server)
+        collector = AirQualityDataCollector(base_url=base_url, rate_limit=1000, max_concurrency=3,
+                                            max_retries=max_retries)
+        collector.backoff_base = 0.01
+        with contextlib.redirect_stdout(io.StringIO()):
+            return collector.collect_all_cities_concurrent(), requests
+
+    yield run
+    for server in servers:
+        server.terminate()
+
+
+def test_city_that_fails_then_succeeds_is_collected(collect):
+    karachi = str(AirQualityDataCollector().cities["Karachi"]["lat"])
+    df, requests = collect({karachi: 2})
+
+    assert sorted(df['city']) == sorted(AirQualityDataCollector().cities)
+    # Two 503s, then the successful retry; the other cities need one request each
+    assert requests.pop(karachi) == 3
+    assert set(requests.values()) == {1}
+
+
+def test_city_that_keeps_failing_is_dropped_after_its_retries(collect):
+    karachi = str(AirQualityDataCollector().cities["Karachi"]["lat"])
+    df, requests = collect({karachi: 10}, max_retries=2)
+
+    assert "Karachi" not in set(df['city']) and len(df) == 4
+    assert requests[karachi] == 3
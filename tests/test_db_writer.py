@@ -0,0 +1,50 @@
+import contextlib
+import io
+
+import pandas as pd
+import pytest
+from sqlalchemy import create_engine
+
+from src.db_writer import FeatureTableWriter
+from src.feature_engineering import FeatureEngineer
+
+
+@pytest.fixture
+def features(make_raw_data) -> pd.DataFrame:
+    with contextlib.redirect_stdout(io.StringIO()):
+        return FeatureEngineer().process_features(make_raw_data(72))
+
+
+def read_table(engine, columns) -> pd.DataFrame:
+    df = pd.read_sql(f'SELECT {", ".join(columns)} FROM aqi_features ORDER BY city, timestamp', engine)
+    return df.assign(timestamp=pd.to_datetime(df['timestamp']))
+
+
+def test_rerun_updates_rows_in_place(features, tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path}/features.db")
+    writer = FeatureTableWriter(engine)
+    writer.write(features)
+
+    # A re-run over the same hours, with one hour's readings revised
+    revised = features.copy()
+    last = revised['timestamp'] == revised['timestamp'].max()
+    revised.loc[last, 'pm2_5'] += 1000
+    writer.write(revised)
+
+    stored = read_table(engine, ['city', 'timestamp', 'pm2_5'])
+    assert len(stored) == len(features)
+    assert not stored.duplicated(['city', 'timestamp']).any()
+    expected = revised.sort_values(['city', 'timestamp'])['pm2_5'].to_numpy()
+    pd.testing.assert_series_equal(stored['pm2_5'], pd.Series(expected, name='pm2_5'), rtol=1e-6)
+
+
+def test_new_rows_and_columns_are_added(features, tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path}/features.db")
+    writer = FeatureTableWriter(engine)
+    cutoff = features['timestamp'].max()
+    writer.write(features[features['timestamp'] < cutoff])
+    writer.write(features[features['timestamp'] >= cutoff].assign(source='pipeline'))
+
+    stored = read_table(engine, ['city', 'timestamp', 'source'])
+    assert len(stored) == len(features)
+    assert (stored['source'].notna() == (stored['timestamp'] == cutoff)).all()
@@ -0,0 +1,94 @@
+import fakeredis
+import numpy as np
+import pytest
+
+from src.cache_codec import decode_latest, latest_key
+from src.feature_engineering import FeatureEngineer
+from src.feature_store import OnlineFeatureStore
+from src.forecasting import Forecaster, ForecastState
+from src.model_registry import LoadedModel
+
+
+@pytest.fixture(scope="module")
+def features(make_raw_data):
+    """Three days of features for 20 cities with ~5% of collection runs missed"""
+    raw = make_raw_data(72, 20)
+    return FeatureEngineer().process_features(raw[np.random.default_rng(0).random(len(raw)) > 0.05])
+
+
+def test_on_demand_forecast_matches_precomputed(model, features):
+    forecaster = Forecaster(LoadedModel(model), horizon=24)
+    state = ForecastState.from_features(features)
+    precomputed = forecaster.forecast(state)
+
+    # The API's path: latest records and feature store buffers read back from Redis
+    engineer = FeatureEngineer()
+    engineer.redis_client = fakeredis.FakeRedis()
+    engineer.save_to_redis(features)
+    engineer.save_to_feature_store(features)
+    records = {city: decode_latest(engineer.redis_client.get(latest_key(city)), city) for city in state.cities}
+    buffers = OnlineFeatureStore(engineer.redis_client).get_many(state.cities)
+    on_demand = forecaster.forecast(ForecastState.from_buffers(records, buffers))
+
+    np.testing.assert_allclose(on_demand, precomputed, rtol=1e-5, atol=1e-3)
+
+
+def per_city_forecast(model: LoadedModel, df, horizon: int) -> dict:
+    """Single-row recursive forecast of each city, one prediction per step"""
+    import pandas as pd
+
+    builder, predictor = model.feature_builder, model.predictor
+    out = {}
+    for city, group in df.sort_values('timestamp').groupby('city'):
+        last = group.iloc[-1]
+        t0 = last['timestamp']
+        by_hour = {ts.floor('h'): row for ts, row in zip(group['timestamp'], group[['pm2_5', 'aqi']].to_numpy())}
+        hours = [t0.floor('h') - pd.Timedelta(hours=24 - j) for j in range(25)]
+        pm2_5 = [by_hour[h][0] if h in by_hour else np.nan for h in hours] + [last['pm2_5']] * horizon
+        aqi = [by_hour[h][1] if h in by_hour else np.nan for h in hours]
+        for k in range(horizon):
+            t = t0 + pd.Timedelta(hours=k)
+            window = np.array(pm2_5[k + 1:k + 25])
+            lags = {
+                'pm2_5_lag_1h': pm2_5[23 + k], 'pm2_5_lag_24h': pm2_5[k],
+                'pm2_5_rolling_mean_24h': np.nanmean(window) if (~np.isnan(window)).any() else np.nan,
+                'aqi_lag_1h': aqi[23 + k], 'aqi_lag_24h': aqi[k]
+            }
+            x = builder.build(last['pm2_5'], last['pm10'], last['no2'], last['so2'], last['o3'], last['co'],
+                              t.hour, t.dayofweek, t.month, lags=lags)
+            aqi.append(predictor.predict_one(x))
+        out[city] = np.array(aqi[25:], dtype=np.float32)
+    return out
+
+
+def test_batched_forecast_matches_per_city_loop(model, features):
+    loaded = LoadedModel(model)
+    state = ForecastState.from_features(features)
+    forecasts = Forecaster(loaded, horizon=48).forecast(state)
+
+    expected = per_city_forecast(loaded, features, 48)
+    for i, city in enumerate(state.cities):
+        np.testing.assert_allclose(forecasts[i], expected[city], rtol=1e-5, atol=1e-3)
+
+
+def test_direct_models_replace_only_their_horizon(model, features, tmp_path):
+    import xgboost as xgb
+    from src.feature_builder import FEATURE_COLS
+    from src.forecasting import load_forecaster
+    from src.model_registry import export_model, horizon_model_dir
+
+    state = ForecastState.from_features(features)
+    recursive = Forecaster(LoadedModel(model), horizon=24).forecast(state)
+
+    rng = np.random.default_rng(6)
+    X = rng.uniform(0, 200, size=(500, len(FEATURE_COLS)))
+    direct_model = xgb.XGBRegressor(n_estimators=10).fit(X, rng.uniform(0, 300, size=len(X)))
+    export_model(model, str(tmp_path), FEATURE_COLS)
+    for h in (6, 48):
+        export_model(direct_model, horizon_model_dir(h, str(tmp_path)), FEATURE_COLS)
+
+    forecaster = load_forecaster(str(tmp_path), horizon=24)
+    assert sorted(forecaster.direct) == [6]
+    forecasts = forecaster.forecast(state)
+    assert not np.allclose(forecasts[:, 5], recursive[:, 5])
+    np.testing.assert_array_equal(np.delete(forecasts, 5, axis=1), np.delete(recursive, 5, axis=1))
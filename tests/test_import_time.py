@@ -0,0 +1,51 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+
+# Cold import budget (ms) of each entry point, and the heavy packages it must
+# leave to the code paths that use them. IMPORT_BUDGET_SCALE loosens the
+# budgets on slower machines.
+IMPORT_BUDGETS_MS = {
+    "api": 1500,
+    "data_collection": 1200,
+    "feature_engineering": 2000,
+    "model_training": 4000,
+    "monitoring": 1000,
+}
+DEFERRED_IMPORTS = {
+    "api": ("pandas", "pyarrow", "xgboost", "sklearn", "sqlalchemy", "numba", "joblib", "mlflow"),
+    "data_collection": ("xgboost", "sqlalchemy", "mlflow"),
+    "feature_engineering": ("xgboost", "sqlalchemy", "redis", "numba", "mlflow"),
+    "model_training": ("mlflow", "numba", "sqlalchemy"),
+    "monitoring": ("evidently", "xgboost", "mlflow"),
+}
+
+
+def cold_import(module: str):
+    """Import time (ms) of an entry point in a fresh interpreter, as the scripts run, and the DEFERRED_IMPORTS
+    it loaded"""
+    code = (
+        "import importlib, json, sys, time\n"
+        "start = time.perf_counter()\n"
+        f"importlib.import_module({module!r})\n"
+        "elapsed = (time.perf_counter() - start) * 1000\n"
+        f"print(json.dumps([elapsed, [name for name in {DEFERRED_IMPORTS[module]!r} if name in sys.modules]]))"
+    )
+    result = subprocess.run([sys.executable, "-c", code], cwd=SRC_DIR, capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.splitlines()[-1])
+
+
+@pytest.mark.parametrize("module", sorted(IMPORT_BUDGETS_MS))
+def test_entry_point_imports_within_budget(module):
+    runs = [cold_import(module) for _ in range(3)]
+    loaded = runs[0][1]
+    assert not loaded, f"{module} imports {', '.join(loaded)} at module load"
+
+    budget = IMPORT_BUDGETS_MS[module] * float(os.getenv("IMPORT_BUDGET_SCALE", 1))
+    fastest = min(elapsed for elapsed, _ in runs)
+    assert fastest <= budget, f"{module} imports in {fastest:.0f} ms, over its {budget:.0f} ms budget"
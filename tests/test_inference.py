@@ -0,0 +1,84 @@
+import asyncio
+import gc
+import os
+
+import numpy as np
+import pytest
+
+from src.feature_builder import FEATURE_COLS
+from src.inference import make_predictor
+
+# Packages each compiled backend needs
+BACKEND_PACKAGES = {'onnx': ('onnxmltools', 'onnxruntime'), 'treelite': ('treelite', 'tl2cgen')}
+
+
+@pytest.fixture(scope="module")
+def features() -> np.ndarray:
+    X = np.random.default_rng(0).uniform(0, 200, size=(1000, len(FEATURE_COLS))).astype(np.float32)
+    X[::7, FEATURE_COLS.index('aqi_lag_24h')] = np.nan
+    return X
+
+
+@pytest.mark.parametrize("backend", sorted(BACKEND_PACKAGES))
+def test_backend_matches_xgboost(model, features, backend, tmp_path):
+    for package in BACKEND_PACKAGES[backend]:
+        pytest.importorskip(package)
+    reference = make_predictor(model).predict(features)
+
+    predictor = make_predictor(model, backend, cache_prefix=str(tmp_path / "model"))
+    assert predictor.backend == backend
+    np.testing.assert_allclose(predictor.predict(features), reference, rtol=1e-5, atol=1e-3)
+    assert predictor.predict_one(features[:1]) == pytest.approx(float(reference[0]), rel=1e-5, abs=1e-3)
+
+
+def test_uncached_treelite_build_is_removed_with_its_predictor(model, features):
+    for package in BACKEND_PACKAGES['treelite']:
+        pytest.importorskip(package)
+    from src.inference import TreelitePredictor
+
+    predictor = TreelitePredictor.from_booster(model.get_booster(), FEATURE_COLS)
+    workdir = predictor._workdir.name
+    assert os.path.exists(os.path.join(workdir, "model.so"))
+    predictor.predict(features[:10])
+
+    del predictor
+    gc.collect()
+    assert not os.path.exists(workdir)
+
+
+def test_api_hot_reloads_a_newly_exported_model(model, monkeypatch, tmp_path):
+    import xgboost as xgb
+    from src import api
+    from src.model_registry import export_model
+
+    monkeypatch.setattr(api, "MODEL_DIR", str(tmp_path))
+    monkeypatch.setattr(api, "MODEL_RELOAD_SECONDS", 0.01)
+    monkeypatch.setattr(api, "serving", None)
+    monkeypatch.setattr(api, "manifest_mtime", None)
+    first = export_model(model, str(tmp_path), FEATURE_COLS)['version']
+    api.load_initial_model()
+    assert api.serving.version == first
+
+    rng = np.random.default_rng(1)
+    retrained = xgb.XGBRegressor(n_estimators=20).fit(rng.uniform(0, 200, (500, len(FEATURE_COLS))),
+                                                      rng.uniform(0, 300, 500))
+    request = api.PredictionRequest(pm2_5=80.0, pm10=120.0, no2=30.0, so2=8.0, o3=40.0, co=250.0,
+                                    city="Lahore", hour=9, day_of_week=2)
+
+    async def run():
+        watcher = asyncio.create_task(api.watch_model())
+        try:
+            second = export_model(retrained, str(tmp_path), FEATURE_COLS)['version']
+            for _ in range(500):
+                # Requests keep succeeding across the swap
+                await api.predict_health_risk(request)
+                if api.serving.version == second:
+                    return second
+                await asyncio.sleep(0.01)
+        finally:
+            watcher.cancel()
+
+    second = asyncio.run(run())
+    assert second is not None and second != first
+    x = api.serving.feature_builder.build(80.0, 120.0, 30.0, 8.0, 40.0, 250.0, 9, 2)
+    assert api.serving.predictor.predict_one(x) == pytest.approx(float(retrained.predict(x)[0]), rel=1e-5)
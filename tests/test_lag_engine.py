@@ -0,0 +1,79 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.feature_store import LAG_SOURCE_COLS
+from src.lag_engine import HAS_NUMBA, add_lag_features
+
+
+def legacy_lag_features(df: pd.DataFrame) -> pd.DataFrame:
+    """The original groupby shift/rolling implementation the engine replaces"""
+    df = df.sort_values(['city', 'timestamp'])
+    for col in LAG_SOURCE_COLS:
+        df[f'{col}_lag_1h'] = df.groupby('city')[col].shift(1)
+        df[f'{col}_lag_24h'] = df.groupby('city')[col].shift(24)
+        df[f'{col}_rolling_mean_24h'] = df.groupby('city')[col].rolling(24, min_periods=1).mean().reset_index(0, drop=True)
+    return df
+
+
+@pytest.fixture(scope="module")
+def sample() -> pd.DataFrame:
+    """Shuffled lag source columns for 50 cities with missed hours and missing pm2_5 readings"""
+    rng = np.random.default_rng(42)
+    n_cities, n_hours = 50, 1000
+    n = n_cities * n_hours
+    df = pd.DataFrame({
+        'timestamp': np.repeat(pd.date_range("2020-01-01", periods=n_hours, freq="h").to_numpy(), n_cities),
+        'city': np.tile(np.array([f"Station_{i:05d}" for i in range(n_cities)], dtype=object), n_hours),
+        'pm2_5': rng.uniform(5, 200, n),
+        'pm10': rng.uniform(10, 300, n),
+        'aqi': rng.integers(1, 6, n)
+    })
+    df = df[rng.random(n) >= 0.05].sample(frac=1, random_state=0)
+    df.loc[df.sample(frac=0.05, random_state=1).index, 'pm2_5'] = np.nan
+    return df
+
+
+def test_positional_lags_match_groupby(sample):
+    result = add_lag_features(sample.copy(), LAG_SOURCE_COLS, freq=None, use_numba=False)
+    pd.testing.assert_frame_equal(result, legacy_lag_features(sample.copy()), check_exact=False, rtol=1e-12)
+
+
+def test_hourly_lags_match_groupby_on_full_grid(sample):
+    # groupby on each city reindexed onto a full hourly grid, read back at the observed hours
+    grid = sample.set_index(['city', 'timestamp']).sort_index()
+    hours = pd.MultiIndex.from_product([grid.index.levels[0], pd.date_range(
+        sample['timestamp'].min(), sample['timestamp'].max(), freq="h")], names=['city', 'timestamp'])
+    reindexed = legacy_lag_features(grid.reindex(hours).reset_index())
+    expected = reindexed.set_index(['city', 'timestamp']).loc[grid.index].reset_index()
+
+    result = add_lag_features(sample.copy(), LAG_SOURCE_COLS, freq="1h", use_numba=False)
+    cols = [c for c in expected.columns if c not in ('city', 'timestamp', *LAG_SOURCE_COLS)]
+    pd.testing.assert_frame_equal(result[cols].reset_index(drop=True), expected[cols], check_exact=False, rtol=1e-12)
+
+    # aqi has no NaNs, so its lags are missing exactly where the observation is
+    for k in (1, 24):
+        flags = result[f'lag_{k}h_missing'].to_numpy(dtype=bool)
+        assert (flags == expected[f'aqi_lag_{k}h'].isna().to_numpy()).all()
+
+
+def test_repeated_collection_keeps_last_row_per_hour(sample):
+    # A second run in the same hour, a few minutes later and with new readings
+    rerun = sample.sample(n=500, random_state=2).assign(timestamp=lambda d: d['timestamp'] + pd.Timedelta(minutes=10))
+    rerun[['pm2_5', 'pm10']] += 1.0
+    result = add_lag_features(pd.concat([sample, rerun]), LAG_SOURCE_COLS, freq="1h", use_numba=False)
+
+    expected = pd.concat([sample.drop(rerun.index), rerun])
+    expected = add_lag_features(expected, LAG_SOURCE_COLS, freq="1h", use_numba=False)
+    assert len(result) == len(sample)
+    pd.testing.assert_frame_equal(result.reset_index(drop=True), expected.reset_index(drop=True))
+
+
+@pytest.mark.skipif(not HAS_NUMBA, reason="numba is not installed")
+@pytest.mark.parametrize("freq", [None, "1h"])
+def test_numba_kernel_matches_numpy(sample, freq):
+    pd.testing.assert_frame_equal(
+        add_lag_features(sample.copy(), LAG_SOURCE_COLS, freq=freq, use_numba=True),
+        add_lag_features(sample.copy(), LAG_SOURCE_COLS, freq=freq, use_numba=False),
+        check_exact=True
+    )
@@ -0,0 +1,49 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from src.live_updates import LiveBroker
+from src.metrics import REQUEST_LATENCY, MetricsMiddleware
+
+
+def test_stream_reserves_its_slot_before_the_body_starts(monkeypatch):
+    from src import api
+
+    monkeypatch.setattr(api, "live_broker", LiveBroker(max_subscribers=1))
+    response = asyncio.run(api.stream_current_aqi("Lahore"))
+    assert api.live_broker.subscribers == 1
+
+    # Another connect before the first body has run is refused
+    with pytest.raises(HTTPException) as refused:
+        asyncio.run(api.stream_current_aqi("Lahore"))
+    assert refused.value.status_code == 503
+
+    # A client that leaves before the body starts still releases the slot, once
+    asyncio.run(response.background())
+    asyncio.run(response.background())
+    assert api.live_broker.subscribers == 0
+    assert not api.live_broker.full
+
+
+def observed(route: str) -> float:
+    return sum(sample.value for metric in REQUEST_LATENCY.collect() for sample in metric.samples
+               if sample.name.endswith("_count") and sample.labels["route"] == route)
+
+
+@pytest.mark.parametrize("path, timed", [("/api/stream", False), ("/api/cities", True)])
+def test_streams_stay_out_of_the_latency_histogram(path, timed):
+    class Route:
+        pass
+
+    async def app(scope, receive, send):
+        scope["route"] = Route()
+        scope["route"].path = path
+        await send({"type": "http.response.start", "status": 200})
+
+    async def send(message):
+        pass
+
+    before = observed(path)
+    asyncio.run(MetricsMiddleware(app)({"type": "http", "method": "GET"}, None, send))
+    assert observed(path) - before == (1 if timed else 0)
@@ -0,0 +1,90 @@
+import contextlib
+import io
+
+import numpy as np
+import pandas as pd
+import pytest
+import xgboost as xgb
+
+from src.feature_builder import FEATURE_COLS
+from src.feature_engineering import FeatureEngineer
+from src.generate_sample_data import generate_chunks
+from src.lag_engine import sort_groups
+from src.model_training import MODEL_PARAMS, ModelTrainer, train_streaming_booster
+from src.param_search import horizon_gap, rolling_origin_splits, search, time_split
+from src.storage import load_frame, save_frame
+from src.training_data import FeatureChunkIter, add_target, streamed_split_time
+
+
+@pytest.fixture(scope="module")
+def features_path(tmp_path_factory):
+    """Processed features for 8 stations over 180 days, with ~1% of observations missing"""
+    path = str(tmp_path_factory.mktemp("features") / "aqi_features")
+    engineer = FeatureEngineer()
+    with contextlib.redirect_stdout(io.StringIO()):
+        for i, chunk in enumerate(generate_chunks(8, 180, end="2024-12-31 23:00", chunk_rows=10_000)):
+            keep = np.random.default_rng(i).random(len(chunk)) > 0.01
+            save_frame(engineer.process_features(chunk[keep]), path, append=(i > 0))
+    return path
+
+
+def rmse(y_true, y_pred) -> float:
+    return float(np.sqrt(np.mean((np.asarray(y_true, dtype=np.float64) - y_pred) ** 2)))
+
+
+@pytest.mark.parametrize("external_memory", [False, True])
+def test_streamed_training_matches_in_memory(features_path, external_memory):
+    train, test = time_split(add_target(sort_groups(load_frame(features_path))))
+    model = xgb.XGBRegressor(**MODEL_PARAMS, tree_method='hist').fit(train[FEATURE_COLS], train['target_aqi'])
+    expected = rmse(test['target_aqi'], model.predict(test[FEATURE_COLS]))
+
+    # Chunks much smaller than the dataset, so several pass through the iterator
+    _, y_test, y_pred = train_streaming_booster(features_path, chunk_rows=5_000, external_memory=external_memory)
+
+    # The same rows are held out, so the streamed metrics compare with prepare_data's
+    np.testing.assert_array_equal(np.sort(y_test), np.sort(test['target_aqi'].to_numpy(dtype=np.float32)))
+    assert abs(rmse(y_test, y_pred) - expected) / expected < 0.02
+
+
+@pytest.mark.parametrize("horizon", [1, 6, 24])
+def test_training_targets_stay_out_of_test_window(features_path, horizon):
+    trainer = ModelTrainer()
+    df = trainer.load_features(features_path)
+    X_train, X_test, _, _ = trainer.prepare_data(df, horizon=horizon)
+
+    last_target = df.loc[X_train.index, 'timestamp'].max() + pd.Timedelta(hours=horizon)
+    assert last_target < df.loc[X_test.index, 'timestamp'].min()
+
+
+def test_cv_folds_keep_targets_out_of_validation_window():
+    timestamps = pd.date_range("2024-01-01", periods=24 * 30, freq="h").to_numpy()
+    for train, val in rolling_origin_splits(timestamps, gap=horizon_gap(12)):
+        assert timestamps[train].max() + pd.Timedelta(hours=12) < timestamps[val].min()
+
+
+def test_streamed_training_rows_match_the_in_memory_split(features_path):
+    train, _ = time_split(add_target(sort_groups(load_frame(features_path))))
+    labels = []
+    train_iter = FeatureChunkIter(features_path, streamed_split_time(features_path), chunk_rows=5_000)
+    while train_iter.next(lambda label, **kwargs: labels.append(label)):
+        pass
+
+    # Training rows stop a gap before the test window, as in prepare_data
+    np.testing.assert_array_equal(np.sort(np.concatenate(labels)), np.sort(train['target_aqi'].to_numpy(dtype=np.float32)))
+
+
+def test_generated_data_does_not_depend_on_chunking():
+    whole = next(generate_chunks(20, 30, seed=7, end="2024-06-30", chunk_rows=10**9))
+    chunks = list(generate_chunks(20, 30, seed=7, end="2024-06-30", chunk_rows=1000))
+    pd.testing.assert_frame_equal(whole, pd.concat(chunks, ignore_index=True))
+
+
+def test_param_search_is_reproducible_across_worker_counts(features_path):
+    train, _ = time_split(add_target(sort_groups(load_frame(features_path))))
+    train = train[train['timestamp'] > train['timestamp'].max() - pd.Timedelta(days=14)]
+
+    def outcome(workers):
+        trials = search(train, n_trials=2, n_workers=workers, nthread=1, seed=3)
+        return sorted((str(t['params']), t['cv_rmse'], t['best_rounds']) for t in trials)
+
+    assert outcome(1) == outcome(2)
@@ -0,0 +1,118 @@
+import contextlib
+import io
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import pandas as pd
+import pytest
+from prometheus_client.parser import text_string_to_metric_families
+
+from src.drift import DRIFT_FEATURES
+from src.metrics import JobMetrics
+from src.monitoring import ModelMonitor
+from src.storage import save_frame
+
+
+def features(n: int, seed: int = 0, shift: float = 0.0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({col: rng.uniform(0, 100, n) + shift for col in DRIFT_FEATURES})
+    df['timestamp'] = pd.date_range("2024-01-01", periods=n, freq="h")
+    df['city'] = "Lahore"
+    return df
+
+
+@pytest.fixture
+def monitor(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monitor = ModelMonitor(window_rows=1000)
+    monitor.reference_data_path = str(tmp_path / "aqi_features")
+    monitor.profile_path = str(tmp_path / "reference_profile.json")
+    with contextlib.redirect_stdout(io.StringIO()):
+        save_frame(features(5000), monitor.reference_data_path)
+    return monitor
+
+
+def test_profile_is_rebuilt_when_the_dataset_gains_files(monitor):
+    with contextlib.redirect_stdout(io.StringIO()):
+        rows = monitor.load_reference_profile().rows
+        # An append only adds files below the partition directories
+        save_frame(features(1000, seed=1), monitor.reference_data_path, append=True)
+        past = os.path.getmtime(monitor.reference_data_path) - 10
+        os.utime(monitor.reference_data_path, (past, past))
+        os.utime(monitor.profile_path, (past + 5, past + 5))
+        assert monitor.load_reference_profile().rows == rows + 1000
+
+
+def test_drift_window_is_bounded_and_restarts_after_a_report(monitor, monkeypatch):
+    reports = []
+    monkeypatch.setattr(monitor, "generate_data_drift_report", lambda sample: reports.append(len(sample)))
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        for seed in range(5):
+            result = monitor.check_drift(features(400, seed=seed + 10))
+            assert result["rows"] <= 1000 + 400 and not result["drifted"]
+
+        # A shift is reported, then scored again from an empty window
+        assert monitor.check_drift(features(400, shift=80))["drifted"]
+        assert len(reports) == 1
+        assert monitor.drift_monitor.rows == 0
+
+
+def test_clean_small_batches_do_not_trigger_the_report(monitor, monkeypatch):
+    reports = []
+    monkeypatch.setattr(monitor, "generate_data_drift_report", lambda sample: reports.append(len(sample)))
+
+    # The CLI's batch size; PSI over ~20 bins of 100 rows crosses 0.2 on clean data
+    with contextlib.redirect_stdout(io.StringIO()):
+        for seed in range(50):
+            monitor.check_drift(features(100, seed=seed + 100))
+    assert reports == []
+
+
+@pytest.fixture
+def job() -> JobMetrics:
+    job = JobMetrics("test_job")
+    with job.stage("load"):
+        time.sleep(0.01)
+    job.count("load", 1234)
+    return job
+
+
+def test_job_metrics_are_written_to_a_textfile(job, tmp_path):
+    path = job.export(pushgateway=None, textfile_dir=str(tmp_path))
+    assert path == str(tmp_path / "test_job.prom")
+
+    with open(path) as f:
+        exported = {(s.name, s.labels.get('stage')): s.value
+                    for family in text_string_to_metric_families(f.read()) for s in family.samples}
+    assert exported[("aqi_job_rows", "load")] == 1234
+    assert exported[("aqi_job_stage_seconds", "load")] >= 0.01
+    assert exported[("aqi_job_last_success_timestamp_seconds", None)] > 0
+
+
+def test_job_metrics_are_pushed_to_a_gateway(job):
+    pushed = []
+
+    class Gateway(BaseHTTPRequestHandler):
+        def do_PUT(self):
+            pushed.append((self.path, self.rfile.read(int(self.headers['Content-Length']))))
+            self.send_response(200)
+            self.end_headers()
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Gateway)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        url = f"http://127.0.0.1:{server.server_port}"
+        assert job.export(pushgateway=url, textfile_dir=None) == url
+    finally:
+        server.shutdown()
+
+    assert len(pushed) == 1
+    path, body = pushed[0]
+    assert path == "/metrics/job/test_job" and b'aqi_job_rows{job="test_job",stage="load"} 1234.0' in body
@@ -0,0 +1,29 @@
+import asyncio
+from datetime import datetime
+
+import pytest
+
+
+def frozen_datetime(month: int):
+    class FrozenDatetime(datetime):
+        @classmethod
+        def now(cls, tz=None):
+            return cls(2024, month, 15, 12, tzinfo=tz)
+
+    return FrozenDatetime
+
+
+def test_cached_prediction_is_not_served_in_another_month(api, monkeypatch):
+    request = api.PredictionRequest(pm2_5=80.0, pm10=120.0, no2=30.0, so2=8.0, o3=40.0, co=250.0,
+                                    city="Lahore", hour=9, day_of_week=2)
+    builder, predictor = api.serving.feature_builder, api.serving.predictor
+
+    for month in (1, 2, 1):
+        monkeypatch.setattr(api, "datetime", frozen_datetime(month))
+        response = asyncio.run(api.predict_health_risk(request))
+        x = builder.build(request.pm2_5, request.pm10, request.no2, request.so2, request.o3, request.co,
+                          request.hour, request.day_of_week, month)
+        assert response["predicted_aqi"] == pytest.approx(predictor.predict_one(x), abs=0.01)
+
+    # One computation per month; the return to January is a hit
+    assert api.prediction_cache.stats()["computes"] == 2
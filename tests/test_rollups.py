@@ -0,0 +1,42 @@
+import asyncio
+import contextlib
+import io
+
+import pandas as pd
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import create_engine
+
+from src.feature_engineering import FeatureEngineer
+from src.rollups import RESOLUTIONS, refresh_start, rollup_table, write_rollups
+
+
+@pytest.fixture(scope="module")
+def features(make_raw_data) -> pd.DataFrame:
+    with contextlib.redirect_stdout(io.StringIO()):
+        return FeatureEngineer().process_features(make_raw_data(24 * 60, n_cities=3))
+
+
+def test_incremental_refresh_matches_full_rebuild(features, tmp_path):
+    cut = features['timestamp'].max() - pd.Timedelta(days=5)
+    full = create_engine(f"sqlite:///{tmp_path}/full.db")
+    incremental = create_engine(f"sqlite:///{tmp_path}/incremental.db")
+    write_rollups(full, features)
+
+    # An incremental pipeline run re-aggregates every bucket the new rows touch
+    write_rollups(incremental, features[features['timestamp'] < cut])
+    new = features[features['timestamp'] >= cut]
+    write_rollups(incremental, features[features['timestamp'] >= refresh_start(new['timestamp'])])
+
+    for resolution in RESOLUTIONS:
+        query = f'SELECT * FROM "{rollup_table(resolution)}" ORDER BY "city", "bucket"'
+        pd.testing.assert_frame_equal(pd.read_sql(query, full), pd.read_sql(query, incremental))
+
+
+def test_history_before_the_first_pipeline_run_is_unavailable(tmp_path, monkeypatch):
+    from src import api
+
+    monkeypatch.setattr(api, "db_engine", create_engine(f"sqlite:///{tmp_path}/empty.db"))
+    with pytest.raises(HTTPException) as unavailable:
+        asyncio.run(api.get_history("City_000", resolution="daily", points=100))
+    assert unavailable.value.status_code == 503